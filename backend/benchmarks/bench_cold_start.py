@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+# one fresh interpreter per run: import the handler (INIT) and serve one request
+COLD_START = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.append('../lambda')
+import lambda_handler
+init_done = time.perf_counter()
+with open(sys.argv[1]) as f:
+    event = json.load(f)
+response = lambda_handler.lambda_handler(event, None)
+invoked = time.perf_counter()
+assert response['statusCode'] == 200, response
+print(json.dumps({
+    'init_ms': (init_done - start) * 1000,
+    'first_invoke_ms': (invoked - init_done) * 1000,
+}))
+'''
+
+
+def build_event(model_path, symbol='SPY', days=100, event_path='/tmp/cold_start_event.json'):
+    sys.path.append('../lambda')
+    from market_store import load_market, to_records
+
+    event = {'data': to_records(load_market(symbol).tail(days)), 'local_model_path': model_path}
+    with open(event_path, 'w') as f:
+        json.dump(event, f)
+    return event_path
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def cold_start(model_path, event_path, warmup, runs):
+    env = {k: v for k, v in os.environ.items() if k not in ('DYNAMODB_TABLE', 'LAMBDA_MEMORY_PROFILE')}
+    env['LAMBDA_PHASE_TIMING'] = '0'
+    if warmup:
+        env['WARMUP_ON_INIT'] = '1'
+        env['LOCAL_MODEL_PATH'] = model_path
+    else:
+        env.pop('WARMUP_ON_INIT', None)
+
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', COLD_START, event_path],
+            capture_output=True, text=True, check=True, env=env
+        )
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main(models=('../models/xgboost_tuned.pkl', '../models/xgboost_tuned.npz'), runs=20):
+    print(f"{'model':<32}{'warmup':>8}{'init p50':>10}{'init p99':>10}{'invoke p50':>12}{'invoke p99':>12}{'total p99':>11}")
+    for model_path in models:
+        event_path = build_event(model_path)
+        for warmup in (False, True):
+            results = cold_start(model_path, event_path, warmup, runs)
+            init = [r['init_ms'] for r in results]
+            invoke = [r['first_invoke_ms'] for r in results]
+            total = [r['init_ms'] + r['first_invoke_ms'] for r in results]
+            print(f"{model_path:<32}{str(warmup):>8}{percentile(init, 0.5):>10.1f}{percentile(init, 0.99):>10.1f}"
+                  f"{percentile(invoke, 0.5):>12.1f}{percentile(invoke, 0.99):>12.1f}{percentile(total, 0.99):>11.1f}")
+
+
+if __name__ == "__main__":
+    main(runs=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,61 @@
+import time
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('../lambda')
+from feature_utils import engineer_features, get_feature_columns
+from market_store import load_market
+
+
+def load_spy():
+    return load_market('SPY')
+
+
+def replicate(df, times):
+    # back to back copies of the history on a synthetic business day index
+    out = pd.concat([df] * times)
+    out.index = pd.bdate_range('1900-01-01', periods=len(out), name='Date')
+    return out
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_backends(df, repeat=5):
+    feature_cols = get_feature_columns()
+    pandas_time = best_time(lambda: engineer_features(df), repeat)
+    numpy_time = best_time(lambda: engineer_features(df, backend='numpy'), repeat)
+
+    expected = engineer_features(df)[feature_cols].values
+    actual = engineer_features(df, backend='numpy')[feature_cols].values
+    mask = ~np.isnan(expected)
+    max_abs = float(np.max(np.abs(actual[mask] - expected[mask])))
+
+    return {
+        'rows': len(df),
+        'pandas_ms': pandas_time * 1000,
+        'numpy_ms': numpy_time * 1000,
+        'speedup': pandas_time / numpy_time,
+        'max_abs_diff': max_abs,
+    }
+
+
+def main():
+    spy = load_spy()
+    cases = [('SPY_raw.csv', spy, 10), ('SPY x100', replicate(spy, 100), 3)]
+
+    print(f"{'input':<14}{'rows':>10}{'pandas ms':>12}{'numpy ms':>12}{'speedup':>10}{'max abs diff':>15}")
+    for name, df, repeat in cases:
+        r = bench_backends(df, repeat)
+        print(f"{name:<14}{r['rows']:>10}{r['pandas_ms']:>12.2f}{r['numpy_ms']:>12.2f}{r['speedup']:>9.2f}x{r['max_abs_diff']:>15.2e}")
+
+
+if __name__ == "__main__":
+    main()
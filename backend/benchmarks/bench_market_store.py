@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('../lambda')
+from market_store import MarketStore, read_csv
+
+
+def replicate(df, times):
+    # back to back copies of the history on a synthetic business day index
+    out = pd.concat([df] * times)
+    out.index = pd.bdate_range('1900-01-01', periods=len(out), name='Date')
+    return out
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_load(df, work_dir, repeat=5):
+    csv_path = os.path.join(work_dir, 'prices.csv')
+    df.to_csv(csv_path)
+    store = MarketStore(os.path.join(work_dir, 'market'))
+    store.write('BENCH', df)
+
+    last_year = df.index[-252]
+    return {
+        'rows': len(df),
+        'csv_ms': best_time(lambda: read_csv(csv_path), repeat) * 1000,
+        # opening maps the files, the sum touches every price so the pages are really read
+        'store_open_ms': best_time(lambda: store.read('BENCH'), repeat) * 1000,
+        'store_scan_ms': best_time(lambda: float(np.sum(store.read('BENCH')['Close'].values)), repeat) * 1000,
+        'store_slice_ms': best_time(lambda: store.read('BENCH', start=last_year), repeat) * 1000,
+        'csv_mb': os.path.getsize(csv_path) / 1e6,
+        'store_mb': sum(os.path.getsize(os.path.join(store.entry('BENCH'), name)) for name in os.listdir(store.entry('BENCH'))) / 1e6,
+    }
+
+
+def main():
+    spy = read_csv('../data/SPY_raw.csv')
+    cases = [('SPY_raw.csv', spy, 10), ('SPY x100', replicate(spy, 100), 3), ('SPY x300', replicate(spy, 300), 1)]
+
+    print(f"{'input':<14}{'rows':>10}{'csv ms':>10}{'open ms':>10}{'scan ms':>10}{'1y slice ms':>13}{'csv mb':>9}{'store mb':>10}")
+    for name, df, repeat in cases:
+        with tempfile.TemporaryDirectory() as work_dir:
+            r = bench_load(df, work_dir, repeat)
+        print(f"{name:<14}{r['rows']:>10}{r['csv_ms']:>10.2f}{r['store_open_ms']:>10.2f}{r['store_scan_ms']:>10.2f}"
+              f"{r['store_slice_ms']:>13.2f}{r['csv_mb']:>9.1f}{r['store_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
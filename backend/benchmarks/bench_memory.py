@@ -0,0 +1,71 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# one fresh interpreter per case so every peak starts from the same baseline. the input frame is
+# built before tracing starts, traced peak is what the features and the model matrix add on top
+MEMORY_CASE = '''
+import json, resource, sys, tempfile, time, tracemalloc
+import numpy as np
+from bench_suite import synthetic_ohlcv
+from feature_chunks import engineer_features_chunked
+from feature_utils import engineer_features, get_feature_columns
+
+rows, backend, dtype = int(sys.argv[1]), sys.argv[2], sys.argv[3]
+df = synthetic_ohlcv(rows)
+tracemalloc.start()
+start = time.perf_counter()
+if backend == 'chunked':
+    with tempfile.TemporaryDirectory() as output_dir:
+        engineer_features_chunked(df, output_dir, dtype=dtype)
+    X = None
+elif dtype == 'float32':
+    features = engineer_features(df, backend=backend, dtype=np.float32, copy=False)
+    X = features[get_feature_columns()].to_numpy()
+else:
+    features = engineer_features(df, backend=backend)
+    X = features[get_feature_columns()].to_numpy()
+seconds = time.perf_counter() - start
+held, peak = tracemalloc.get_traced_memory()
+print(json.dumps({
+    'seconds': seconds,
+    'held_mb': held / 2 ** 20,
+    'peak_mb': peak / 2 ** 20,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'X': 'on disk' if X is None else f"{X.dtype}, {'view' if np.shares_memory(X, features['returns'].to_numpy()) else 'copy'}",
+}))
+'''
+
+# (label, backend, dtype): how main built its training matrix before, the lean modes and
+# feature_chunks.py, which writes its columns to a temporary directory
+CASES = [
+    ('pandas float64 (before)', 'pandas', 'float64'),
+    ('numpy float64', 'numpy', 'float64'),
+    ('numpy float32, copy=False', 'numpy', 'float32'),
+    ('chunked float32', 'chunked', 'float32'),
+]
+
+
+def measure(rows, backend, dtype):
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', MEMORY_CASE, str(rows), backend, dtype],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='peak memory of engineer_features + the model matrix')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, input frame not counted in traced memory")
+    print(f"{'case':<28}{'seconds':>9}{'held mb':>10}{'peak mb':>10}{'max rss mb':>12}  X")
+    for label, backend, dtype in CASES:
+        r = measure(args.rows, backend, dtype)
+        print(f"{label:<28}{r['seconds']:>9.1f}{r['held_mb']:>10.0f}{r['peak_mb']:>10.0f}{r['rss_mb']:>12.0f}  {r['X']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+
+# every run happens in a fresh interpreter so imports and allocations are measured cold.
+# numpy and pandas are imported first, the predictor needs them for features either way
+COLD_START = '''
+import json, resource, sys, time
+import numpy as np
+import pandas as pd
+sys.path.append('../lambda')
+base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+base_modules = len(sys.modules)
+start = time.perf_counter()
+from native_model import is_native_model, manifest_path_for, load_native_model
+from tree_model import is_tree_model, load_tree_model
+path = sys.argv[1]
+if is_tree_model(path):
+    with open(path, 'rb') as f:
+        model = load_tree_model(f.read())
+elif is_native_model(path):
+    with open(path, 'rb') as f:
+        model_bytes = f.read()
+    with open(manifest_path_for(path)) as f:
+        model = load_native_model(model_bytes, f.read())
+else:
+    import pickle
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+loaded = time.perf_counter()
+model.predict_proba(np.zeros((1, 30)))
+predicted = time.perf_counter()
+print(json.dumps({
+    'load_ms': (loaded - start) * 1000,
+    'first_predict_ms': (predicted - loaded) * 1000,
+    'rss_added_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss) / 1024,
+    'modules_added': len(sys.modules) - base_modules,
+}))
+'''
+
+
+def cold_start(model_path, runs=5):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', COLD_START, model_path],
+            capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    # median over runs
+    return {key: sorted(r[key] for r in results)[len(results) // 2] for key in results[0]}
+
+
+def main(models=('../models/xgboost_tuned.pkl', '../models/xgboost_tuned.ubj', '../models/xgboost_tuned.npz')):
+    print(f"{'model':<32}{'load ms':>10}{'predict ms':>12}{'rss added mb':>14}{'modules added':>15}")
+    for model_path in models:
+        r = cold_start(model_path)
+        print(f"{model_path:<32}{r['load_ms']:>10.1f}{r['first_predict_ms']:>12.2f}{r['rss_added_mb']:>14.1f}{r['modules_added']:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('../lambda')
+from feature_utils import engineer_features, get_feature_columns, get_feature_lookback
+from feature_kernels import compute_feature_matrix, compute_panel_matrix, engineer_panel_features
+from tree_model import load_tree_model
+from lambda_handler import score_rows
+
+
+def synthetic_panel(symbols=500, days=2520, seed=0):
+    # geometric random walks with their own volatility per symbol, long format (Symbol, Date) rows
+    rng = np.random.default_rng(seed)
+    vol = rng.uniform(0.005, 0.03, size=(symbols, 1))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1, size=(symbols, days)) * vol, axis=1))
+    spread = np.abs(rng.normal(0, 1, size=(symbols, days))) * vol * close
+    volume = rng.integers(1_000_000, 50_000_000, size=(symbols, days)).astype(np.float64)
+    dates = pd.bdate_range('2015-01-02', periods=days, name='Date')
+
+    long = pd.DataFrame({
+        'Symbol': np.repeat([f'S{i:03d}' for i in range(symbols)], days),
+        'Open': close.ravel(), 'High': (close + spread).ravel(), 'Low': (close - spread).ravel(),
+        'Close': close.ravel(), 'Volume': volume.ravel(),
+    }, index=pd.DatetimeIndex(np.tile(dates.values, symbols), name='Date'))
+    return long, (close + spread, close - spread, close, volume)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(symbols=500, days=2520, loop_symbols=50, model_path='../models/xgboost_tuned.npz'):
+    long, arrays = synthetic_panel(symbols, days)
+    rows = symbols * days
+    print(f"{symbols} symbols x {days} days = {rows} rows")
+
+    _, single_pass_time = timed(lambda: compute_feature_matrix(*arrays))
+    matrix, array_time = timed(lambda: compute_panel_matrix(*arrays))
+    _, long_time = timed(lambda: engineer_panel_features(long))
+
+    # the per symbol baselines on a subset, scaled up to every symbol
+    subset = [long[long['Symbol'] == f'S{i:03d}'].drop(columns='Symbol') for i in range(loop_symbols)]
+    _, numpy_loop_time = timed(lambda: [engineer_features(df, backend='numpy') for df in subset])
+    _, pandas_loop_time = timed(lambda: [engineer_features(df) for df in subset])
+    numpy_loop_time *= symbols / loop_symbols
+    pandas_loop_time *= symbols / loop_symbols
+
+    print(f"\n{'features':<34}{'seconds':>10}{'rows/s':>14}")
+    for name, seconds in (('panel (S, T) arrays', array_time), ('  one pass over all symbols', single_pass_time),
+                          ('panel long format', long_time),
+                          ('numpy backend per symbol', numpy_loop_time), ('pandas backend per symbol', pandas_loop_time)):
+        print(f"{name:<34}{seconds:>10.2f}{rows / seconds:>14,.0f}")
+
+    with open(model_path, 'rb') as f:
+        model = load_tree_model(f.read())
+    first = max(get_feature_lookback().values()) - 1
+    latest = matrix[:, -1]
+    history = matrix[:, first:].reshape(-1, len(get_feature_columns()))
+
+    _, latest_time = timed(lambda: score_rows(model, latest))
+    _, history_time = timed(lambda: score_rows(model, history))
+    print(f"\n{'scoring (' + model_path.rsplit('/', 1)[-1] + ')':<34}{'seconds':>10}{'rows/s':>14}")
+    print(f"{'latest day of every symbol':<34}{latest_time:>10.4f}{len(latest) / latest_time:>14,.0f}")
+    print(f"{'full history of every symbol':<34}{history_time:>10.2f}{len(history) / history_time:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('../lambda')
+sys.path.append('../src')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+from feature_utils import engineer_features, get_feature_columns
+from market_store import load_market
+
+HISTORY_PATH = os.environ.get('BENCH_HISTORY', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json'))
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+# a benchmark whose best time grows by more than this fraction is a regression
+REGRESSION_THRESHOLD = 0.10
+# differences below this many seconds are timer noise whatever the ratio
+NOISE_FLOOR = 50e-6
+# fast benchmarks are repeated until they have run this long, the minimum settles with more samples
+MIN_TIME = 0.5
+MAX_CALLS = 1000
+
+# name -> (setup, repeat, quick). setup builds the inputs and returns the callable that is
+# timed, so loading data and models is never part of a measurement
+BENCHMARKS = {}
+
+
+def benchmark(name, repeat=10, quick=True):
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeat, quick)
+        return setup
+    return register
+
+
+def synthetic_ohlcv(rows, seed=42):
+    # seeded random walk with SPY-like daily moves, on a minute index so a million rows fit in pandas' date range
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.011, rows)))
+    open_ = close * np.exp(rng.normal(0, 0.003, rows))
+    spread = np.abs(rng.normal(0, 0.006, rows)) * close
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Close': close,
+        'Volume': rng.integers(30_000_000, 150_000_000, rows),
+    }, index=pd.date_range('2000-01-01', periods=rows, freq='min', name='Date'))
+
+
+def feature_input(rows):
+    spy = load_market('SPY')
+    if rows <= len(spy):
+        return spy.iloc[len(spy) - rows:]
+    return synthetic_ohlcv(rows)
+
+
+FEATURE_SIZES = {'100': 100, '2768': 2768, '1M': 1_000_000}
+
+for _label, _rows in FEATURE_SIZES.items():
+    for _backend in ('pandas', 'numpy'):
+        def _setup(rows=_rows, backend=_backend):
+            df = feature_input(rows)
+            return lambda: engineer_features(df, backend=backend)
+        benchmark(f'features.{_backend}.{_label}', repeat=3 if _rows > 100_000 else 10, quick=_rows <= 100_000)(_setup)
+
+
+def spy_feature_matrix():
+    df = engineer_features(load_market('SPY'), backend='numpy')
+    return df[get_feature_columns()].dropna().values
+
+
+model_cache = None
+
+
+def model_bytes():
+    # the tracked pickle and tree model, the native booster is exported to a temp dir when
+    # backend/models has none
+    global model_cache
+    if model_cache is not None:
+        return model_cache
+    with open(os.path.join(MODELS_DIR, 'xgboost_tuned.pkl'), 'rb') as f:
+        pickled = f.read()
+    with open(os.path.join(MODELS_DIR, 'xgboost_tuned.npz'), 'rb') as f:
+        trees = f.read()
+
+    native_path = os.path.join(MODELS_DIR, 'xgboost_tuned.ubj')
+    if not os.path.exists(native_path):
+        import pickle
+        from feature_engineering import export_native_model
+        native_path = os.path.join(tempfile.mkdtemp(), 'xgboost_tuned.ubj')
+        X = spy_feature_matrix()
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_native_model(pickle.loads(pickled), get_feature_columns(), X, np.zeros(len(X)), native_path)
+    from native_model import manifest_path_for
+    with open(native_path, 'rb') as f:
+        native = f.read()
+    with open(manifest_path_for(native_path)) as f:
+        manifest = f.read()
+    model_cache = {'pickle': pickled, 'native': (native, manifest), 'trees': trees}
+    return model_cache
+
+
+def load_model(kind, data):
+    if kind == 'pickle':
+        import pickle
+        return pickle.loads(data)
+    if kind == 'native':
+        from native_model import load_native_model
+        return load_native_model(*data)
+    from tree_model import load_tree_model
+    return load_tree_model(data)
+
+
+for _kind in ('pickle', 'native', 'trees'):
+    def _setup_load(kind=_kind):
+        # in process, xgboost is already imported. fresh interpreter numbers are in bench_model_load.py
+        data = model_bytes()[kind]
+        return lambda: load_model(kind, data)
+    benchmark(f'model_load.{_kind}', repeat=20)(_setup_load)
+
+    for _size in ('single', 'batch'):
+        def _setup_predict(kind=_kind, size=_size):
+            model = load_model(kind, model_bytes()[kind])
+            X = spy_feature_matrix()
+            X = X[-1:] if size == 'single' else X
+            return lambda: model.predict_proba(X)
+        benchmark(f'predict.{_kind}.{_size}', repeat=50 if _size == 'single' else 10)(_setup_predict)
+
+
+class PredictionTable:
+    # a predictions table with `items` rows for the reader benchmarks: moto in process, or a
+    # DynamoDB Local style endpoint (BENCH_DYNAMODB_ENDPOINT) where a million items are practical.
+    # SPY holds up to 10k days, the rest is spread over other symbols' partitions
+    def __init__(self, items, endpoint=None):
+        self.items = items
+        self.endpoint = endpoint
+        self.mock = None
+
+    def __enter__(self):
+        import boto3
+        import dynamodb_helper
+
+        if not self.endpoint:
+            from moto import mock_aws
+            self.mock = mock_aws()
+            self.mock.start()
+        dynamodb = boto3.resource('dynamodb', endpoint_url=self.endpoint)
+        dynamodb_helper.dynamodb = dynamodb
+        name = f'BenchPredictions{self.items}'
+        if name in dynamodb.meta.client.list_tables()['TableNames']:
+            self.table = dynamodb.Table(name)
+            return self
+
+        self.table = dynamodb.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': 'symbol', 'KeyType': 'HASH'}, {'AttributeName': 'date', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'symbol', 'AttributeType': 'S'}, {'AttributeName': 'date', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        days = min(self.items, 10_000)
+        dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('1985-01-01', periods=days)]
+        with self.table.batch_writer() as batch:
+            for n in range(self.items):
+                symbol = 'SPY' if n < days else f'S{(n - days) // days:05d}'
+                batch.put_item(Item=dynamodb_helper.build_prediction_item(
+                    dates[n % days], n % 2, 'increase' if n % 2 else 'decrease', 0.5 + (n % 50) / 100,
+                    'medium', {'volatility_20d': 0.15}, symbol
+                ))
+        dynamodb_helper.ensure_accuracy_summary(self.table)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.mock:
+            self.mock.stop()
+
+
+READER_REQUESTS = {
+    'latest': ('/predictions/latest', {}),
+    'all': ('/predictions/all', {'limit': '90'}),
+    'range': ('/predictions/range', {'start': '2000-01-01', 'end': '2000-12-31'}),
+    'accuracy': ('/analytics/accuracy', {}),
+}
+
+for _endpoint, (_path, _params) in READER_REQUESTS.items():
+    def _setup_reader(path=_path, params=_params, context=None):
+        import reader_handler
+        reader_handler.table = context.table
+        event = {'httpMethod': 'GET', 'path': path, 'queryStringParameters': params, 'headers': {}}
+
+        def call():
+            # the uncached path, every call queries the table
+            reader_handler.response_cache.clear()
+            response = reader_handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200, response
+        return call
+    _setup_reader.needs_table = True
+    benchmark(f'reader.{_endpoint}', repeat=20)(_setup_reader)
+
+
+def tuning_data():
+    from feature_engineering import create_target_variable
+    df = create_target_variable(engineer_features(load_market('SPY'), backend='numpy'), horizon=20)
+    df = df.dropna(subset=get_feature_columns())
+    return df[get_feature_columns()].values, df['target'].values
+
+
+@benchmark('training.bayes', repeat=1, quick=False)
+def setup_bayes():
+    from feature_engineering import train_model_with_tuning
+    X, y = tuning_data()
+    return lambda: train_model_with_tuning(X, y, n_iter=3)
+
+
+@benchmark('training.halving', repeat=1, quick=False)
+def setup_halving():
+    from tuning import tune_model
+    X, y = tuning_data()
+    return lambda: tune_model(X, y, n_iter=3, workers=1)
+
+
+def measure(fn, repeat):
+    # one untimed warm-up call, then min and median of at least `repeat` calls and MIN_TIME
+    # seconds. prints from the code under test are swallowed
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+        while len(timings) < repeat or (sum(timings) < MIN_TIME and len(timings) < MAX_CALLS):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': float(np.median(timings)), 'repeat': len(timings)}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def machine():
+    import xgboost
+    return {
+        'node': platform.node(), 'platform': platform.platform(), 'python': platform.python_version(),
+        'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__, 'xgboost': xgboost.__version__,
+    }
+
+
+def read_history(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def write_history(path, history):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def selected(patterns, quick):
+    names = [name for name, (_, _, is_quick) in BENCHMARKS.items() if is_quick or not quick]
+    if patterns:
+        names = [name for name in names if any(fnmatch.fnmatch(name, p) for p in patterns)]
+    return names
+
+
+def run(names, items, endpoint):
+    results = {}
+    needs_table = [name for name in names if getattr(BENCHMARKS[name][0], 'needs_table', False)]
+    with contextlib.ExitStack() as stack:
+        # warnings from the code under test (old pickle, unused xgboost params) would flood the table
+        stack.enter_context(warnings.catch_warnings())
+        warnings.simplefilter('ignore')
+        if needs_table:
+            start = time.perf_counter()
+            context = stack.enter_context(PredictionTable(items, endpoint))
+            print(f"  prediction table with {items} items ready in {time.perf_counter() - start:.1f}s")
+        for name in names:
+            setup, repeat, _ = BENCHMARKS[name]
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn = setup(context=context) if name in needs_table else setup()
+            results[name] = measure(fn, repeat)
+            if name in needs_table:
+                results[name]['items'] = items
+            print(f"  {name:<26}{results[name]['min_s'] * 1000:>12.3f} ms min{results[name]['median_s'] * 1000:>12.3f} ms median")
+    return results
+
+
+def find_run(history, ref):
+    # a run by position (-1 is the latest), commit prefix or label
+    if ref.lstrip('-').isdigit():
+        return history[int(ref)]
+    for record in reversed(history):
+        if (record.get('commit') or '').startswith(ref) or record.get('label') == ref:
+            return record
+    raise SystemExit(f"no run matches {ref}")
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # rows of (name, baseline s, current s, ratio, status) for benchmarks in both runs
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results'] or baseline['results'][name].get('items') != result.get('items'):
+            continue
+        base, new = baseline['results'][name]['min_s'], result['min_s']
+        ratio = new / base
+        if ratio > 1 + threshold and new - base > NOISE_FLOOR:
+            status = 'REGRESSION'
+        elif ratio < 1 - threshold and base - new > NOISE_FLOOR:
+            status = 'faster'
+        else:
+            status = ''
+        rows.append((name, base, new, ratio, status))
+    return rows
+
+
+def describe(record):
+    return f"#{record['id']} {record.get('commit') or '?'} {record.get('label') or ''} ({record['timestamp'][:19]})".replace('  ', ' ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark suite with a json history')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='run benchmarks and append the results to the history')
+    run_parser.add_argument('patterns', nargs='*', help="glob patterns, e.g. 'features.*' 'reader.*'")
+    run_parser.add_argument('--quick', action='store_true', help='skip the million row and training benchmarks')
+    run_parser.add_argument('--items', type=int, default=10_000, help='items in the reader benchmark table')
+    run_parser.add_argument('--endpoint', default=os.environ.get('BENCH_DYNAMODB_ENDPOINT'), help='dynamodb local url instead of moto')
+    run_parser.add_argument('--label')
+    run_parser.add_argument('--history', default=HISTORY_PATH)
+    run_parser.add_argument('--no-save', action='store_true')
+
+    compare_parser = sub.add_parser('compare', help='compare two runs, exits 1 on a regression')
+    compare_parser.add_argument('--baseline', help='run index, commit prefix or label. default: the previous run on this machine')
+    compare_parser.add_argument('--run', default='-1')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    compare_parser.add_argument('--history', default=HISTORY_PATH)
+
+    sub.add_parser('list', help='list the benchmarks')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name, (_, repeat, quick) in BENCHMARKS.items():
+            print(f"{name:<26} repeat {repeat:>3}{'' if quick else '  (full run only)'}")
+        return
+
+    if args.command == 'run':
+        names = selected(args.patterns, args.quick)
+        print(f"Running {len(names)} benchmarks")
+        history = read_history(args.history)
+        record = {
+            'id': (history[-1]['id'] + 1) if history else 0,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'label': args.label,
+            'machine': machine(),
+            'results': run(names, args.items, args.endpoint),
+        }
+        if not args.no_save:
+            history.append(record)
+            write_history(args.history, history)
+            print(f"Saved run #{record['id']} to {args.history}")
+        return
+
+    history = read_history(args.history)
+    current = find_run(history, args.run)
+    if args.baseline:
+        baseline = find_run(history, args.baseline)
+    else:
+        # timings only compare on the same hardware
+        earlier = [r for r in history if r['id'] < current['id'] and r['machine'] == current['machine']]
+        if not earlier:
+            raise SystemExit("no earlier run on this machine to compare with")
+        baseline = earlier[-1]
+
+    rows = compare(baseline, current, args.threshold)
+    print(f"baseline {describe(baseline)}\ncurrent  {describe(current)}\n")
+    print(f"{'benchmark':<26}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name, base, new, ratio, status in rows:
+        print(f"{name:<26}{base * 1000:>14.3f}{new * 1000:>14.3f}{ratio - 1:>+10.1%}  {status}")
+    regressions = [row for row in rows if row[4] == 'REGRESSION']
+    print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import sys
+from dynamodb_helper import (
+    PREDICTION_SYMBOL, CONFIDENCE_LEVELS, get_table, query_predictions, recent_cutoff,
+    empty_accuracy_summary, accuracy_metrics_from_summary, accuracy_summary_key
+)
+
+# rebuilds the accuracy summary item from the predictions, or checks it against them
+#   python accuracy_summary.py check [symbol]
+#   python accuracy_summary.py rebuild [symbol]
+
+def compute_accuracy_summary(items, now=None, symbol=PREDICTION_SYMBOL):
+    summary = empty_accuracy_summary(symbol)
+    verified = sorted((item for item in items if 'is_correct' in item), key=lambda x: x['date'])
+
+    for item in verified:
+        hit = 1 if item['is_correct'] else 0
+        level = item.get('confidence_level')
+        if level not in CONFIDENCE_LEVELS:
+            level = 'low'
+        summary['total'] += 1
+        summary['correct'] += hit
+        summary[f'{level}_total'] += 1
+        summary[f'{level}_correct'] += hit
+
+    # only what the reader still looks at, the accuracy updates keep it that way
+    cutoff = recent_cutoff(now)
+    summary['recent'] = {item['date']: bool(item['is_correct']) for item in verified if item['date'] >= cutoff}
+
+    for item in reversed(verified):
+        if not item['is_correct']:
+            break
+        summary['current_streak'] += 1
+    if verified:
+        summary['latest_verified_date'] = verified[-1]['date']
+
+    return summary
+
+def rebuild_summary(table, symbol=PREDICTION_SYMBOL):
+    summary = compute_accuracy_summary(query_predictions(table, symbol=symbol), symbol=symbol)
+    # replaced whole, the revision goes on from the old item so cached reader responses are dropped
+    previous = table.get_item(Key=accuracy_summary_key(symbol)).get('Item') or {}
+    summary['revision'] = int(previous.get('revision', 0)) + 1
+    table.put_item(Item=summary)
+    print(f"rebuilt accuracy summary from {summary['total']} verified predictions")
+    return summary
+
+def check_summary(table, symbol=PREDICTION_SYMBOL):
+    # compares what the dashboard would show from the stored summary and from a full recompute
+    stored = accuracy_metrics_from_summary(table.get_item(Key=accuracy_summary_key(symbol)).get('Item'))
+    expected = accuracy_metrics_from_summary(compute_accuracy_summary(query_predictions(table, symbol=symbol), symbol=symbol))
+
+    mismatches = {k: (stored[k], expected[k]) for k in expected if stored[k] != expected[k]}
+    for name, (stored_value, expected_value) in mismatches.items():
+        print(f"{name}: summary={stored_value} recomputed={expected_value}")
+    if not mismatches:
+        print("accuracy summary matches the predictions")
+    return not mismatches
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    symbol = sys.argv[2] if len(sys.argv) > 2 else PREDICTION_SYMBOL
+    if command == 'rebuild':
+        rebuild_summary(get_table(), symbol)
+    elif command == 'check':
+        sys.exit(0 if check_summary(get_table(), symbol) else 1)
+    else:
+        sys.exit(f"unknown command: {command} (use check or rebuild)")
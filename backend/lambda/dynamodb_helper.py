@@ -1,27 +1,160 @@
 import boto3
 import os
-from datetime import datetime
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from timing import instrument_client
 
 dynamodb = None
 
+# every symbol's predictions sit in one partition with date as the sort key, so the newest
+# ones come back from a Query in key order instead of a scan. SPY is what the dashboard shows
+PREDICTION_SYMBOL = 'SPY'
+
+def prediction_key(date_str, symbol=PREDICTION_SYMBOL):
+    return {'symbol': symbol, 'date': date_str}
+
+# running accuracy totals live in their own partition so prediction queries never see them
+def accuracy_summary_key(symbol=PREDICTION_SYMBOL):
+    return {'symbol': symbol + '#accuracy', 'date': 'summary'}
+
+ACCURACY_SUMMARY_KEY = accuracy_summary_key()
+# the (symbol, date) keyed table migrate_predictions_table.py creates, the old date-keyed
+# VolatilityPredictions table does not take these keys
+PREDICTIONS_TABLE = 'VolatilityPredictionsBySymbol'
+CONFIDENCE_LEVELS = ['high', 'medium', 'low']
+RECENT_DAYS = 30
+# stale recent dates one accuracy update removes, keeps the expression far below its 4kb limit
+STALE_REMOVE_LIMIT = 100
+
+def get_table():
+    table_name = os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
+    return get_dynamodb_client().Table(table_name)
+
+def query_predictions_page(table, limit=None, ascending=False, start_date=None, end_date=None, fields=None, start_key=None,
+                           symbol=PREDICTION_SYMBOL):
+    # one partition sorted by date, follows LastEvaluatedKey from start_key until limit items (or all of them).
+    # returns (items, key to continue from or None, consumed read capacity units)
+    key_condition = Key('symbol').eq(symbol)
+    if start_date and end_date:
+        key_condition = key_condition & Key('date').between(start_date, end_date)
+
+    kwargs = {'KeyConditionExpression': key_condition, 'ScanIndexForward': ascending, 'ReturnConsumedCapacity': 'TOTAL'}
+    if fields:
+        # placeholders for every name, date and timestamp are reserved words
+        kwargs['ProjectionExpression'] = ', '.join(f'#f{i}' for i in range(len(fields)))
+        kwargs['ExpressionAttributeNames'] = {f'#f{i}': field for i, field in enumerate(fields)}
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+
+    items = []
+    consumed = 0.0
+    while True:
+        if limit:
+            kwargs['Limit'] = limit - len(items)
+        response = table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        consumed += response.get('ConsumedCapacity', {}).get('CapacityUnits', 0.0)
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or (limit and len(items) >= limit):
+            return items, last_key, consumed
+        kwargs['ExclusiveStartKey'] = last_key
+
+def query_predictions(table, **kwargs):
+    return query_predictions_page(table, **kwargs)[0]
+
+def empty_accuracy_summary(symbol=PREDICTION_SYMBOL):
+    summary = {**accuracy_summary_key(symbol), 'total': 0, 'correct': 0, 'current_streak': 0, 'recent': {}, 'revision': 0}
+    for level in CONFIDENCE_LEVELS:
+        summary[f'{level}_total'] = 0
+        summary[f'{level}_correct'] = 0
+    return summary
+
+def recent_cutoff(now=None):
+    # the oldest date recent_30d_accuracy counts
+    return ((now or datetime.now()) - timedelta(days=RECENT_DAYS)).strftime('%Y-%m-%d')
+
+def accuracy_metrics_from_summary(summary, now=None):
+    # same shape the reader used to compute from a full scan
+    summary = summary or empty_accuracy_summary()
+
+    def rate(correct, total):
+        return correct / total if total > 0 else 0.0
+
+    by_confidence = {}
+    for level in CONFIDENCE_LEVELS:
+        level_total = int(summary.get(f'{level}_total', 0))
+        level_correct = int(summary.get(f'{level}_correct', 0))
+        by_confidence[level] = {'total': level_total, 'correct': level_correct, 'rate': rate(level_correct, level_total)}
+
+    thirty_days_ago = recent_cutoff(now)
+    recent = [bool(correct) for date, correct in summary.get('recent', {}).items() if date >= thirty_days_ago]
+
+    total = int(summary.get('total', 0))
+    correct = int(summary.get('correct', 0))
+    return {
+        'total_predictions': total,
+        'correct_predictions': correct,
+        'accuracy_rate': rate(correct, total),
+        'by_confidence': by_confidence,
+        'recent_30d_accuracy': rate(sum(recent), len(recent)),
+        'current_streak': int(summary.get('current_streak', 0))
+    }
+
+def ensure_accuracy_summary(table, symbol=PREDICTION_SYMBOL):
+    # the recent map has to exist before the update can set a date inside it
+    try:
+        table.put_item(Item=empty_accuracy_summary(symbol), ConditionExpression='attribute_not_exists(symbol)')
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def read_summary_state(table, symbol=PREDICTION_SYMBOL, now=None):
+    # (dates in the summary's recent map that aged out of the window, latest_verified_date) for
+    # apply_accuracy_update: the updates remove the stale dates, the date tells them whether the streak moves
+    item = table.get_item(Key=accuracy_summary_key(symbol), ProjectionExpression='recent, latest_verified_date').get('Item') or {}
+    cutoff = recent_cutoff(now)
+    return sorted(date for date in item.get('recent', {}) if date < cutoff), item.get('latest_verified_date')
+
+def summary_revision_update(symbol=PREDICTION_SYMBOL):
+    # the reader's etag includes the summary revision, writes that change what it serves without
+    # a new newest prediction (backfills, verifications, rebuilds) bump it. creates what the
+    # verification updates need if the summary does not exist yet
+    return {
+        'Key': accuracy_summary_key(symbol),
+        'UpdateExpression': 'SET recent = if_not_exists(recent, :empty), current_streak = if_not_exists(current_streak, :zero) ADD revision :one',
+        'ExpressionAttributeValues': {':empty': {}, ':zero': 0, ':one': 1}
+    }
+
+def bump_summary_revision(table, symbol=PREDICTION_SYMBOL):
+    table.update_item(**summary_revision_update(symbol))
+
 def get_dynamodb_client():
     global dynamodb
     if dynamodb is None:
         dynamodb = boto3.resource('dynamodb')
+        # call time and consumed capacity go into the invocation's metrics line
+        instrument_client(dynamodb.meta.client)
     return dynamodb
 
-def save_prediction_to_dynamodb(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features):
-    table_name = os.environ.get('DYNAMODB_TABLE', 'VolatilityPredictions')
-
-    dynamodb = get_dynamodb_client()
-    table = dynamodb.Table(table_name)
+# batch_write_item takes at most 25 puts, batch_get_item 100 keys
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+# fields the accuracy update writes, kept when a prediction is saved again
+VERIFICATION_FIELDS = ['is_correct', 'actual_volatility_20d', 'actual_change', 'verified_at']
 
+def build_prediction_item(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features,
+                          symbol=PREDICTION_SYMBOL):
     # dynamodb needs Decimal not float
     key_features_decimal = {k: Decimal(str(v)) for k, v in key_features.items()}
 
-    item = {
-        'date': date_str,
+    return {
+        **prediction_key(date_str, symbol),
         'prediction': prediction,
         'prediction_text': prediction_text,
         'confidence_score': Decimal(str(confidence_score)),
@@ -30,43 +163,371 @@ def save_prediction_to_dynamodb(date_str, prediction, prediction_text, confidenc
         **key_features_decimal
     }
 
-    table.put_item(Item=item)
-    print(f"saved prediction to dynamodb: {date_str}")
+def save_prediction_to_dynamodb(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features,
+                                symbol=PREDICTION_SYMBOL):
+    table_name = os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
+
+    dynamodb = get_dynamodb_client()
+    table = dynamodb.Table(table_name)
+
+    item = build_prediction_item(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features, symbol)
+
+    # an update instead of a put, so saving a day again keeps its verification and
+    # the accuracy summary does not count it twice. an older date does not change the newest
+    # prediction the reader's version is read from, the summary revision moves in the same transaction
+    fields = [k for k in item if k not in ('symbol', 'date')]
+    dynamodb.meta.client.transact_write_items(TransactItems=[
+        {'Update': {
+            'TableName': table_name,
+            'Key': prediction_key(date_str, symbol),
+            'UpdateExpression': 'SET ' + ', '.join(f'#f{i} = :f{i}' for i in range(len(fields))),
+            'ExpressionAttributeNames': {f'#f{i}': field for i, field in enumerate(fields)},
+            'ExpressionAttributeValues': {f':f{i}': item[field] for i, field in enumerate(fields)}
+        }},
+        {'Update': {'TableName': table_name, **summary_revision_update(symbol)}}
+    ])
+    print(f"saved prediction to dynamodb: {symbol} {date_str}")
 
     return item
 
-def get_prediction(date_str):
-    table_name = os.environ.get('DYNAMODB_TABLE', 'VolatilityPredictions')
+def get_prediction(date_str, symbol=PREDICTION_SYMBOL):
+    table_name = os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
 
     dynamodb = get_dynamodb_client()
     table = dynamodb.Table(table_name)
 
     try:
-        response = table.get_item(Key={'date': date_str})
+        response = table.get_item(Key=prediction_key(date_str, symbol))
         return response.get('Item')
     except Exception as e:
         print(f"error getting prediction for {date_str}: {str(e)}")
         return None
 
-def update_prediction_accuracy(date_str, actual_volatility, actual_change, is_correct):
-    table_name = os.environ.get('DYNAMODB_TABLE', 'VolatilityPredictions')
+def apply_accuracy_update(client, table_name, date_str, actual_volatility, actual_change, is_correct, confidence_level,
+                          symbol=PREDICTION_SYMBOL, stale_dates=(), latest_verified_date=None):
+    # the prediction, the summary counters and the streak change together or not at all, and the
+    # is_correct condition keeps a repeated verification from counting twice.
+    # True when counted, False when the prediction is missing or already verified.
+    # recent only gets dates inside the window, stale_dates are removed from it. the streak only
+    # follows a date newer than the summary's latest_verified_date: the caller's value
+    # (read_summary_state, None for no summary yet) picks the branch, the summary's condition
+    # checks it and a stale guess is tried again the other way
+    if confidence_level not in CONFIDENCE_LEVELS:
+        confidence_level = 'low'
+    prediction_update = {'Update': {
+        'TableName': table_name,
+        'Key': prediction_key(date_str, symbol),
+        'UpdateExpression': 'SET actual_volatility_20d = :vol, actual_change = :change, is_correct = :correct, verified_at = :verified',
+        'ConditionExpression': 'attribute_exists(symbol) AND attribute_not_exists(is_correct)',
+        'ExpressionAttributeValues': {
+            ':vol': Decimal(str(actual_volatility)),
+            ':change': actual_change,
+            ':correct': is_correct,
+            ':verified': datetime.utcnow().isoformat()
+        }
+    }}
+    newer = latest_verified_date is None or date_str > latest_verified_date
+    for attempt in range(3):
+        try:
+            client.transact_write_items(TransactItems=[
+                prediction_update,
+                {'Update': {'TableName': table_name, **summary_accuracy_update(date_str, is_correct, confidence_level, symbol, stale_dates, newer)}}
+            ])
+            return True
+        except ClientError as e:
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if e.response['Error']['Code'] != 'TransactionCanceledException' or attempt == 2:
+                raise
+            if reasons[:1] == ['ConditionalCheckFailed']:
+                return False
+            if reasons[1:2] != ['ConditionalCheckFailed']:
+                raise
+            newer = not newer
+
+def summary_accuracy_update(date_str, is_correct, confidence_level, symbol, stale_dates, newer):
+    # the summary half of apply_accuracy_update
+    update = f'ADD #total :one, correct :hit, {confidence_level}_total :one, {confidence_level}_correct :hit, revision :one'
+    names = {'#total': 'total'}
+    values = {':one': 1, ':hit': 1 if is_correct else 0, ':date': date_str}
+    sets = []
+    if date_str >= recent_cutoff():
+        sets.append('recent.#date = :correct')
+        names['#date'] = date_str
+        values[':correct'] = is_correct
+    if newer:
+        sets.append('latest_verified_date = :date')
+        if is_correct:
+            sets.append('current_streak = if_not_exists(current_streak, :zero) + :one')
+        else:
+            sets.append('current_streak = :zero')
+        values[':zero'] = 0
+        condition = 'attribute_not_exists(latest_verified_date) OR latest_verified_date < :date'
+    else:
+        condition = 'latest_verified_date >= :date'
+    if sets:
+        update += ' SET ' + ', '.join(sets)
+    stale_dates = list(stale_dates)[:STALE_REMOVE_LIMIT]
+    if stale_dates:
+        update += ' REMOVE ' + ', '.join(f'recent.#stale{i}' for i in range(len(stale_dates)))
+        names.update({f'#stale{i}': date for i, date in enumerate(stale_dates)})
+    return {
+        'Key': accuracy_summary_key(symbol),
+        'UpdateExpression': update,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+def is_retryable(error):
+    # throttling is retried inside botocore too, transactions on the summary item conflict with each other
+    code = error.response['Error']['Code']
+    if code == 'TransactionCanceledException':
+        return any(reason.get('Code') == 'TransactionConflict' for reason in error.response.get('CancellationReasons', []))
+    return code in ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded', 'InternalServerError')
+
+def update_prediction_accuracy(date_str, actual_volatility, actual_change, is_correct, confidence_level=None,
+                               symbol=PREDICTION_SYMBOL):
+    table_name = os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
 
     dynamodb = get_dynamodb_client()
     table = dynamodb.Table(table_name)
 
     try:
-        table.update_item(
-            Key={'date': date_str},
-            UpdateExpression='SET actual_volatility_20d = :vol, actual_change = :change, is_correct = :correct, verified_at = :verified',
-            ExpressionAttributeValues={
-                ':vol': Decimal(str(actual_volatility)),
-                ':change': actual_change,
-                ':correct': is_correct,
-                ':verified': datetime.utcnow().isoformat()
-            }
-        )
+        if confidence_level is None:
+            confidence_level = (get_prediction(date_str, symbol) or {}).get('confidence_level', 'low')
+        ensure_accuracy_summary(table, symbol)
+        stale_dates, latest_verified_date = read_summary_state(table, symbol)
+
+        if not apply_accuracy_update(dynamodb.meta.client, table_name, date_str, actual_volatility, actual_change, is_correct,
+                                     confidence_level, symbol, stale_dates, latest_verified_date):
+            print(f"{date_str} is already verified or missing, summary unchanged")
+            return False
+
         print(f"updated accuracy for {date_str}: correct={is_correct}")
         return True
     except Exception as e:
         print(f"error updating accuracy for {date_str}: {str(e)}")
         return False
+
+def failure_label(symbol, date_str):
+    # failed_dates stay plain dates for SPY
+    return date_str if symbol == PREDICTION_SYMBOL else f"{symbol} {date_str}"
+
+class WriteResult:
+    # what a BatchPredictionWriter run did, failed dates are listed so a backfill can be resumed
+
+    def __init__(self):
+        self.written = 0
+        self.failed = 0
+        self.verified = 0
+        self.already_verified = 0
+        self.verify_failed = 0
+        self.retries = 0
+        self.failed_dates = []
+
+    @property
+    def ok(self):
+        return self.failed == 0 and self.verify_failed == 0
+
+    def as_dict(self):
+        return {
+            'written': self.written,
+            'failed': self.failed,
+            'verified': self.verified,
+            'already_verified': self.already_verified,
+            'verify_failed': self.verify_failed,
+            'retries': self.retries,
+            'failed_dates': sorted(self.failed_dates),
+            'ok': self.ok
+        }
+
+class BatchPredictionWriter:
+    # buffers predictions and flushes them with batch_write_item, unprocessed items are sent again
+    # with jittered exponential backoff. accuracy updates run after the puts, a symbol's in date
+    # order since each one moves its summary's counters and streak. with max_workers > 1 the
+    # symbols run on a thread pool. the revision is bumped after each symbol's puts, a crash in
+    # between leaves the reader on its old version until the next write, which bumps it again
+    #
+    #   with BatchPredictionWriter() as writer:
+    #       writer.put_prediction(...)
+    #       writer.verify(...)
+    #   print(writer.result.as_dict())
+
+    def __init__(self, table_name=None, max_workers=1, max_attempts=8, base_delay=0.05, max_delay=5.0, sleep=time.sleep):
+        self.table_name = table_name or os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
+        self.table = get_dynamodb_client().Table(self.table_name)
+        # the resource's client takes plain python values, and clients are safe to share between threads
+        self.client = get_dynamodb_client().meta.client
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        # keyed by (symbol, date), a batch may not hold the same key twice and the last put wins anyway
+        self.pending = {}
+        self.verifications = []
+        self.result = WriteResult()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def backoff(self, attempt):
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def put_prediction(self, date_str, prediction, prediction_text, confidence_score, confidence_level, key_features,
+                       symbol=PREDICTION_SYMBOL):
+        self.put(build_prediction_item(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features, symbol))
+
+    def put(self, item):
+        self.pending[(item['symbol'], item['date'])] = item
+        if len(self.pending) >= BATCH_WRITE_SIZE:
+            self.flush_puts()
+
+    def verify(self, date_str, actual_volatility, actual_change, is_correct, confidence_level=None, symbol=PREDICTION_SYMBOL):
+        self.verifications.append({
+            'date_str': date_str, 'actual_volatility': actual_volatility, 'actual_change': actual_change,
+            'is_correct': is_correct, 'confidence_level': confidence_level, 'symbol': symbol
+        })
+
+    def flush(self):
+        self.flush_puts()
+        self.flush_verifications()
+        return self.result
+
+    def flush_puts(self):
+        if not self.pending:
+            return
+        items = list(self.pending.values())
+        self.pending = {}
+
+        try:
+            self.keep_verification(items)
+        except ClientError as e:
+            # writing now would drop is_correct from days that are already verified
+            print(f"could not read existing predictions, {len(items)} not written: {str(e)}")
+            self.result.failed += len(items)
+            self.result.failed_dates.extend(failure_label(item['symbol'], item['date']) for item in items)
+            return
+        self.write_batch(items)
+        for symbol in sorted({item['symbol'] for item in items}):
+            bump_summary_revision(self.table, symbol)
+
+    def keep_verification(self, items):
+        # batch_write_item replaces whole items, carry over what an earlier accuracy update wrote
+        by_key = {(item['symbol'], item['date']): item for item in items}
+        for key, existing in self.get_predictions(list(by_key), VERIFICATION_FIELDS).items():
+            by_key[key].update({k: v for k, v in existing.items() if k in VERIFICATION_FIELDS})
+
+    def get_predictions(self, keys, fields=None):
+        # {(symbol, date): item} for the keys that exist, batch_get_item in chunks of 100
+        found = {}
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            request = {'Keys': [prediction_key(date, symbol) for symbol, date in keys[i:i + BATCH_GET_SIZE]]}
+            if fields:
+                request['ProjectionExpression'] = ', '.join(['symbol', '#date'] + [f for f in fields if f not in ('symbol', 'date')])
+                request['ExpressionAttributeNames'] = {'#date': 'date'}
+            for attempt in range(self.max_attempts):
+                response = self.client.batch_get_item(RequestItems={self.table_name: request})
+                for existing in response.get('Responses', {}).get(self.table_name, []):
+                    found[(existing['symbol'], existing['date'])] = existing
+
+                unprocessed = response.get('UnprocessedKeys', {}).get(self.table_name)
+                if not unprocessed:
+                    break
+                request = unprocessed
+                self.result.retries += 1
+                self.sleep(self.backoff(attempt))
+            else:
+                raise ClientError({'Error': {'Code': 'UnprocessedKeys', 'Message': 'batch_get_item kept returning unprocessed keys'}}, 'BatchGetItem')
+        return found
+
+    def write_batch(self, items):
+        requests = [{'PutRequest': {'Item': item}} for item in items]
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            except ClientError as e:
+                if not is_retryable(e):
+                    print(f"batch write failed: {str(e)}")
+                    break
+                unprocessed = requests
+
+            self.result.written += len(requests) - len(unprocessed)
+            requests = unprocessed
+            if not requests:
+                return
+            self.result.retries += 1
+            self.sleep(self.backoff(attempt))
+
+        self.result.failed += len(requests)
+        self.result.failed_dates.extend(
+            failure_label(request['PutRequest']['Item']['symbol'], request['PutRequest']['Item']['date']) for request in requests
+        )
+
+    def apply_verification(self, verification):
+        # returns (counted, retries)
+        if verification['confidence_level'] is None:
+            key = prediction_key(verification['date_str'], verification['symbol'])
+            item = self.client.get_item(TableName=self.table_name, Key=key).get('Item', {})
+            verification = {**verification, 'confidence_level': item.get('confidence_level', 'low')}
+
+        for attempt in range(self.max_attempts):
+            try:
+                return apply_accuracy_update(self.client, self.table_name, **verification), attempt
+            except ClientError as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                self.sleep(self.backoff(attempt))
+
+    def verify_symbol(self, verifications):
+        # one symbol's updates in date order, one after another: they all write its summary item
+        # and each moves the streak in its own transaction. returns (verification, counted or
+        # the exception, retries) per update, runs on the pool
+        symbol = verifications[0]['symbol']
+        ensure_accuracy_summary(self.table, symbol)
+        stale, latest = read_summary_state(self.table, symbol)
+        outcomes = []
+        for verification in verifications:
+            # the aged out dates are split over the updates, STALE_REMOVE_LIMIT per update
+            update = {**verification, 'stale_dates': stale[:STALE_REMOVE_LIMIT], 'latest_verified_date': latest}
+            try:
+                applied, retries = self.apply_verification(update)
+            except Exception as e:
+                outcomes.append((verification, e, 0))
+                continue
+            if applied:
+                stale = stale[STALE_REMOVE_LIMIT:]
+                latest = max(latest or verification['date_str'], verification['date_str'])
+            outcomes.append((verification, applied, retries))
+        return outcomes
+
+    def flush_verifications(self):
+        if not self.verifications:
+            return
+        by_symbol = {}
+        for verification in sorted(self.verifications, key=lambda v: (v['symbol'], v['date_str'])):
+            by_symbol.setdefault(verification['symbol'], []).append(verification)
+        self.verifications = []
+
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                outcomes = [outcome for outcomes in pool.map(self.verify_symbol, by_symbol.values()) for outcome in outcomes]
+        else:
+            outcomes = [outcome for verifications in by_symbol.values() for outcome in self.verify_symbol(verifications)]
+
+        for verification, applied, retries in outcomes:
+            if isinstance(applied, Exception):
+                print(f"error updating accuracy for {verification['symbol']} {verification['date_str']}: {str(applied)}")
+                self.result.verify_failed += 1
+                self.result.failed_dates.append(failure_label(verification['symbol'], verification['date_str']))
+                continue
+            self.result.retries += retries
+            if applied:
+                self.result.verified += 1
+            else:
+                self.result.already_verified += 1
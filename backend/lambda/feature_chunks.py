@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import resource
+import time
+import numpy as np
+import pandas as pd
+
+from feature_kernels import FEATURE_COLUMNS, FEATURE_INDEX, EMA_BLOCK, compute_feature_matrix, frame_to_arrays
+from feature_store import TAIL_LOOKBACK, EMA_STATE_COLUMNS
+from market_store import CSV_COLUMNS, DATA_DIR, load_market
+
+CHUNKED_FEATURES_DIR = os.environ.get('CHUNKED_FEATURES_DIR', os.path.join(DATA_DIR, 'chunked_features'))
+# rows computed per step, a multiple of EMA_BLOCK so every step starts on an ema block boundary.
+# a step holds about 45 float64 arrays of this length (input, overlap, temporaries, matrix), ~100mb
+CHUNK_ROWS = 1 << 18
+FEATURE_DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+
+class FeatureColumns:
+    # <output_dir>/ holds dates.i8 (ns timestamps), one raw little endian file per feature
+    # (<feature>.f8 or .f4) and meta.json with the row count and dtype. every step appends its
+    # rows to the end of each file and replaces meta.json last, so a reader (or a crash) never
+    # sees a partly written step
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def meta(self):
+        try:
+            with open(os.path.join(self.output_dir, 'meta.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def path(self, name, dtype):
+        suffix = '.i8' if name == 'dates' else '.f4' if dtype == 'float32' else '.f8'
+        return os.path.join(self.output_dir, name + suffix)
+
+    def write_meta(self, rows, dtype):
+        path = os.path.join(self.output_dir, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'rows': rows, 'dtype': dtype, 'columns': FEATURE_COLUMNS}, f)
+        os.replace(path + '.tmp', path)
+
+    def create(self, dtype):
+        # replaces whatever the directory held
+        os.makedirs(self.output_dir, exist_ok=True)
+        for name in ['dates'] + FEATURE_COLUMNS:
+            open(self.path(name, dtype), 'wb').close()
+        self.write_meta(0, dtype)
+
+    def append(self, dates, matrix, rows, dtype):
+        # rows is the count already written, matrix columns are contiguous (allocate_feature_matrix)
+        with open(self.path('dates', dtype), 'ab') as f:
+            f.write(np.ascontiguousarray(dates, dtype=np.int64).tobytes())
+        for i, name in enumerate(FEATURE_COLUMNS):
+            with open(self.path(name, dtype), 'ab') as f:
+                f.write(np.ascontiguousarray(matrix[:, i], dtype=FEATURE_DTYPES[dtype]).tobytes())
+        self.write_meta(rows + len(dates), dtype)
+
+    def read(self, start=None, end=None, columns=None):
+        # date indexed frame of read only memory maps, start and end (inclusive) are found by
+        # binary search on the dates so a slice of a long history only pages in its own rows
+        meta = self.meta()
+        if meta is None:
+            raise KeyError(f"no chunked features in {self.output_dir}")
+        rows, dtype = meta['rows'], meta['dtype']
+        columns = columns or FEATURE_COLUMNS
+        if rows:
+            dates = np.memmap(self.path('dates', dtype), dtype=np.int64, mode='r', shape=(rows,))
+            data = {name: np.memmap(self.path(name, dtype), dtype=FEATURE_DTYPES[dtype], mode='r', shape=(rows,)) for name in columns}
+        else:
+            dates = np.empty(0, dtype=np.int64)
+            data = {name: np.empty(0, dtype=FEATURE_DTYPES[dtype]) for name in columns}
+
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).as_unit('ns').value, side='left'))
+        hi = rows if end is None else int(np.searchsorted(dates, pd.Timestamp(end).as_unit('ns').value, side='right'))
+        index = pd.DatetimeIndex(np.asarray(dates[lo:hi]).view('datetime64[ns]'), name='Date')
+        return pd.DataFrame({name: values[lo:hi] for name, values in data.items()}, index=index, copy=False)
+
+
+def csv_chunks(path, chunk_rows):
+    # SPY_raw.csv or the alpha vantage layout, oldest row first
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        chunk = chunk.rename(columns=CSV_COLUMNS)
+        chunk['Date'] = pd.to_datetime(chunk['Date'])
+        yield chunk.set_index('Date')
+
+
+def input_chunks(source, chunk_rows):
+    # a csv path, a frame (load_market's is memory mapped, slices are only read when computed)
+    # or any iterable of date ordered frames, whatever their sizes
+    if isinstance(source, str):
+        return csv_chunks(source, chunk_rows)
+    if isinstance(source, pd.DataFrame):
+        return (source.iloc[start:start + chunk_rows] for start in range(0, len(source), chunk_rows))
+    return iter(source)
+
+
+def compute_step(output, buffer, overlap, rows, written, ema_state, dtype):
+    # features of buffer rows overlap..overlap + rows, buffer starts TAIL_LOOKBACK rows (or all
+    # rows, at the start) before them. returns the buffer from the next step's overlap on and the
+    # float64 ema values of the row before it
+    dates, high, low, close, volume = (values[:overlap + rows] for values in buffer)
+    matrix = compute_feature_matrix(high, low, close, volume, ema_initial=ema_state)
+    output.append(dates[overlap:], matrix[overlap:], written, dtype)
+
+    cut = overlap + rows - TAIL_LOOKBACK
+    state = {name: float(matrix[cut - 1, FEATURE_INDEX[name]]) for name in EMA_STATE_COLUMNS} if cut > 0 else None
+    return tuple(values[cut:].copy() for values in buffer), state
+
+
+def engineer_features_chunked(source, output_dir, chunk_rows=CHUNK_ROWS, dtype='float64'):
+    # engineer_features(df, backend='numpy') for input that does not fit in memory, written to
+    # FeatureColumns in output_dir. rows are computed chunk_rows at a time with the TAIL_LOOKBACK
+    # rows before them, which covers every window (volatility_60d needs 61 bars) and starts on an
+    # ema block boundary, the emas continue from the float64 values of the row before that. the
+    # feature store's append repeated, every row gets the bits of the in-memory run
+    if chunk_rows % EMA_BLOCK or chunk_rows < TAIL_LOOKBACK:
+        raise ValueError(f"chunk_rows must be a multiple of {EMA_BLOCK} and at least {TAIL_LOOKBACK}, got {chunk_rows}")
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"unknown feature dtype {dtype}, expected one of {', '.join(FEATURE_DTYPES)}")
+    output = FeatureColumns(output_dir)
+    output.create(dtype)
+
+    # dates and ohlcv from the start of the overlap to the last row read
+    buffer = None
+    written = 0
+    ema_state = None
+    for chunk in input_chunks(source, chunk_rows):
+        if not len(chunk):
+            continue
+        arrays = (pd.DatetimeIndex(chunk.index).as_unit('ns').asi8,) + frame_to_arrays(chunk)
+        last = buffer[0][-1] if buffer is not None and len(buffer[0]) else None
+        if np.any(np.diff(arrays[0]) <= 0) or (last is not None and arrays[0][0] <= last):
+            raise ValueError(f"input rows must be in increasing date order, out of order after row {written}")
+        buffer = arrays if buffer is None else tuple(np.concatenate(pair) for pair in zip(buffer, arrays))
+
+        overlap = min(written, TAIL_LOOKBACK)
+        while len(buffer[0]) - overlap >= chunk_rows:
+            buffer, ema_state = compute_step(output, buffer, overlap, chunk_rows, written, ema_state, dtype)
+            written += chunk_rows
+            overlap = TAIL_LOOKBACK
+
+    overlap = min(written, TAIL_LOOKBACK)
+    if buffer is not None and len(buffer[0]) > overlap:
+        compute_step(output, buffer, overlap, len(buffer[0]) - overlap, written, ema_state, dtype)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='features of a long history in fixed size chunks, written column by column')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help='ohlcv csv in date order, e.g. years of minute bars')
+    source.add_argument('--symbol', help='a symbol of the market store')
+    parser.add_argument('--output', help='defaults to backend/data/chunked_features/<csv name or symbol>')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--dtype', choices=list(FEATURE_DTYPES), default='float64')
+    args = parser.parse_args()
+
+    name = args.symbol or os.path.splitext(os.path.basename(args.csv))[0]
+    output_dir = args.output or os.path.join(CHUNKED_FEATURES_DIR, name)
+    start = time.perf_counter()
+    output = engineer_features_chunked(args.csv or load_market(args.symbol), output_dir, args.chunk_rows, args.dtype)
+    seconds = time.perf_counter() - start
+    rows = output.meta()['rows']
+    print(f"{rows} rows of {name} in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s), "
+          f"{args.dtype} columns in {output_dir}, peak rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} mb")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from feature_utils import get_feature_columns, join_features
+
+FEATURE_COLUMNS = get_feature_columns()
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+# rolling windows are evaluated in row blocks so the strided temporaries stay around 8mb
+BLOCK_ELEMENTS = 1 << 20
+# panels are computed this many values (symbols x rows) at a time
+PANEL_BLOCK_ELEMENTS = 1 << 16
+# ema is evaluated as a blocked linear recurrence, blocks are aligned to absolute row positions
+EMA_BLOCK = 32
+# features are always computed in float64, a float32 matrix rounds every result once, so a stored
+# value is off by at most half a float32 ulp relative to the float64 one (nan and 0 stay exact).
+# xgboost casts its input to float32 itself, a model scores either matrix the same
+FLOAT32_MAX_RELATIVE_ERROR = 2.0 ** -24
+
+
+def _rows_per_block(batch, window):
+    return max(window, BLOCK_ELEMENTS // max(batch * window, 1))
+
+
+def pct_change(x, periods, out):
+    # x / x.shift(periods) - 1 along the last axis
+    out[..., :periods] = np.nan
+    out[..., periods:] = x[..., periods:] / x[..., :-periods] - 1
+    return out
+
+
+def rolling_sum(x, window):
+    # window sums for positions window-1.. built from power-of-two partial sums, every
+    # value only depends on its own window so the result does not depend on where the
+    # array starts (the chunked pipeline relies on this)
+    m = x.shape[-1] - window + 1
+    if m <= 0:
+        return np.empty(x.shape[:-1] + (0,))
+    total = None
+    offset = 0
+    size = 1
+    partial = x
+    while window:
+        if window & 1:
+            part = partial[..., offset:offset + m]
+            total = part.copy() if total is None else total + part
+            offset += size
+        window >>= 1
+        if window:
+            partial = partial[..., :-size] + partial[..., size:]
+            size *= 2
+    return total
+
+
+def rolling_mean(x, window, out):
+    out[..., :window - 1] = np.nan
+    out[..., window - 1:] = rolling_sum(x, window) / window
+    return out
+
+
+def rolling_std(x, window, out):
+    # two pass std inside every window, used for price series where the mean is far from zero
+    n = x.shape[-1]
+    out[..., :window - 1] = np.nan
+    step = _rows_per_block(x[..., 0].size, window)
+    for start in range(window - 1, n, step):
+        stop = min(start + step, n)
+        view = sliding_window_view(x[..., start - window + 1:stop], window, axis=-1)
+        dev = view - (view.sum(axis=-1) / window)[..., None]
+        out[..., start:stop] = np.sqrt(np.einsum('...k,...k->...', dev, dev) / (window - 1))
+    return out
+
+
+def rolling_std_centered(x, window, out, sq=None):
+    # std from window sums of x and x**2, only accurate for series centered near zero (returns)
+    if sq is None:
+        sq = x * x
+    out[..., :window - 1] = np.nan
+    mean = rolling_sum(x, window) / window
+    mean_sq = rolling_sum(sq, window) / window
+    var = (mean_sq - mean * mean) * (window / (window - 1))
+    out[..., window - 1:] = np.sqrt(np.maximum(var, 0.0))
+    return out
+
+
+def _ema_weights(span):
+    alpha = 2.0 / (span + 1)
+    decay = 1 - alpha
+    lags = np.arange(EMA_BLOCK)[:, None] - np.arange(EMA_BLOCK)[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    powers = decay ** np.arange(1, EMA_BLOCK + 1)
+    return weights, powers
+
+
+def ema(x, span, out=None, initial=None):
+    # same recursion as ewm(span=span, adjust=False).mean(): y0 = x0, y = (1 - a) * y + a * x
+    # inside a block every value is a fixed weighted sum of the block, only the carry
+    # between blocks is sequential. initial is the ema value right before x[..., 0]
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    batch_shape = x.shape[:-1]
+    if out is None:
+        out = np.empty(x.shape, dtype=np.float64)
+    if n == 0:
+        return out
+
+    weights, powers = _ema_weights(span)
+    n_blocks = -(-n // EMA_BLOCK)
+    flat = x.reshape(-1, n)
+    padded = np.zeros((flat.shape[0], n_blocks * EMA_BLOCK))
+    padded[:, :n] = flat
+    blocks = padded.reshape(flat.shape[0], n_blocks, EMA_BLOCK)
+
+    # einsum sums every output in a fixed order, so a block gives the same bits wherever it sits
+    partial = np.einsum('...k,jk->...j', blocks, weights)
+    del padded, blocks
+
+    if initial is None:
+        carry = flat[:, 0].copy()
+    else:
+        carry = np.broadcast_to(np.asarray(initial, dtype=np.float64), batch_shape).reshape(-1).copy()
+
+    block_decay = powers[-1]
+    carries = np.empty((flat.shape[0], n_blocks))
+    last = partial[:, :, -1]
+    if flat.shape[0] == 1:
+        c = float(carry[0])
+        row = carries[0]
+        for b, value in enumerate(last[0].tolist()):
+            row[b] = c
+            c = value + c * block_decay
+    else:
+        for b in range(n_blocks):
+            carries[:, b] = carry
+            carry = last[:, b] + carry * block_decay
+
+    partial += carries[..., None] * powers
+    out[...] = partial.reshape(flat.shape[0], -1)[:, :n].reshape(x.shape)
+    return out
+
+
+def true_range(high, low, close):
+    prev_close = np.empty_like(close)
+    prev_close[..., 0] = np.nan
+    prev_close[..., 1:] = close[..., :-1]
+    # fmax skips the missing previous close on the first bar like DataFrame.max does
+    return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+
+def allocate_feature_matrix(shape, dtype=np.float64):
+    # (..., n_rows, n_features) matrix with every feature stored contiguously, for 1-d input
+    # that is a fortran ordered matrix which pandas wraps without copying
+    block = np.empty((len(FEATURE_COLUMNS),) + tuple(shape), dtype=dtype)
+    return np.moveaxis(block, 0, -1)
+
+
+def compute_feature_matrix(high, low, close, volume, out=None, dtype=np.float64, ema_initial=None):
+    # full feature matrix from ohlcv arrays shaped (..., n_rows), the result is shaped
+    # (..., n_rows, n_features) with columns in get_feature_columns() order. ema_initial
+    # continues a series: ema_12, ema_26 and macd_signal values of the row before the input
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+
+    if out is None:
+        out = allocate_feature_matrix(close.shape, dtype)
+    col = {name: out[..., i] for name, i in FEATURE_INDEX.items()}
+    # the math is float64 whatever the dtype of out, every full length temporary is dropped
+    # once the columns that need it are written so only a few are alive at a time
+    scratch = np.empty(close.shape)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = pct_change(close, 1, np.empty(close.shape))
+        col['returns'][...] = returns
+        pct_change(close, 5, col['returns_5d'])
+        pct_change(close, 10, col['returns_10d'])
+        pct_change(close, 20, col['returns_20d'])
+
+        returns_sq = returns * returns
+        for window in (5, 10, 20, 60):
+            rolling_std_centered(returns, window, col[f'volatility_{window}d'], returns_sq)
+        del returns, returns_sq
+
+        for window in (5, 10, 50):
+            rolling_mean(close, window, col[f'sma_{window}'])
+
+        initial = ema_initial or {}
+        ema_12 = ema(close, 12, initial=initial.get('ema_12'))
+        ema_26 = ema(close, 26, initial=initial.get('ema_26'))
+        col['ema_12'][...] = ema_12
+        col['ema_26'][...] = ema_26
+        macd = ema_12 - ema_26
+        del ema_12, ema_26
+        macd_signal = ema(macd, 9, initial=initial.get('macd_signal'))
+        col['macd'][...] = macd
+        col['macd_signal'][...] = macd_signal
+        col['macd_histogram'][...] = macd - macd_signal
+        del macd, macd_signal
+
+        delta = np.zeros(close.shape)
+        delta[..., 1:] = close[..., 1:] - close[..., :-1]
+        gain = rolling_mean(np.where(delta > 0, delta, 0.0), 14, np.empty(close.shape))
+        loss = rolling_mean(np.where(delta < 0, -delta, 0.0), 14, scratch)
+        del delta
+        col['rsi'][...] = 100 - (100 / (1 + gain / loss))
+        del gain
+
+        rolling_mean(true_range(high, low, close), 14, col['atr'])
+
+        volume_sma = rolling_mean(volume, 20, scratch)
+        col['volume_sma_20'][...] = volume_sma
+        col['volume_ratio'][...] = volume / volume_sma
+        pct_change(volume, 1, col['volume_change'])
+
+        for periods in (5, 10):
+            col[f'momentum_{periods}'][..., :periods] = np.nan
+            col[f'momentum_{periods}'][..., periods:] = close[..., periods:] - close[..., :-periods]
+            col[f'roc_{periods}'][..., :periods] = np.nan
+            col[f'roc_{periods}'][..., periods:] = ((close[..., periods:] - close[..., :-periods]) / close[..., :-periods]) * 100
+
+        bb_middle = rolling_mean(close, 20, np.empty(close.shape))
+        band = rolling_std(close, 20, scratch)
+        band *= 2
+        bb_upper = bb_middle + band
+        bb_lower = np.subtract(bb_middle, band, out=band)
+        col['sma_20'][...] = bb_middle
+        col['bb_middle'][...] = bb_middle
+        col['bb_upper'][...] = bb_upper
+        col['bb_lower'][...] = bb_lower
+        col['bb_width'][...] = (bb_upper - bb_lower) / bb_middle
+
+    return out
+
+
+def frame_to_arrays(df):
+    return tuple(
+        np.ascontiguousarray(df[name].to_numpy(dtype=np.float64))
+        for name in ('High', 'Low', 'Close', 'Volume')
+    )
+
+
+def engineer_features_numpy(df, dtype=np.float64):
+    # the input columns are only read, the feature matrix becomes the frame's block without a copy
+    return join_features(df, compute_feature_matrix(*frame_to_arrays(df), dtype=dtype))
+
+
+def panel_arrays(df, symbol_column='Symbol'):
+    # long format (symbol, date) rows to (S, T) ohlcv arrays. every symbol's rows are packed
+    # from position 0 in date order, so windows only ever see the symbol's own rows (gaps in its
+    # history are skipped the way a groupby rolling skips them) and its emas start on its own
+    # first row. positions past a symbol's last row are zero, they never reach earlier rows
+    frame = df.reset_index()
+    codes, symbols = pd.factorize(frame[symbol_column], sort=True)
+    # integer sort on (symbol code, date), much cheaper than sorting the strings
+    order = np.lexsort((frame['Date'].to_numpy(), codes))
+    frame = frame.take(order)
+    codes = codes[order]
+    lengths = np.bincount(codes, minlength=len(symbols))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    positions = np.arange(len(frame)) - starts[codes]
+
+    shape = (len(symbols), int(lengths.max()) if len(lengths) else 0)
+    arrays = []
+    for name in ('High', 'Low', 'Close', 'Volume'):
+        values = np.zeros(shape)
+        values[codes, positions] = frame[name].to_numpy(dtype=np.float64)
+        arrays.append(values)
+    return {
+        'symbols': list(symbols), 'lengths': lengths, 'codes': codes, 'positions': positions,
+        'frame': frame, 'arrays': tuple(arrays)
+    }
+
+
+def compute_panel_matrix(high, low, close, volume, out=None, dtype=np.float64):
+    # compute_feature_matrix over (S, T) arrays a few symbols at a time, the scratch arrays of a
+    # chunk stay in cache, which is faster than one pass over the whole panel
+    close = np.asarray(close, dtype=np.float64)
+    if out is None:
+        out = allocate_feature_matrix(close.shape, dtype)
+    step = max(1, PANEL_BLOCK_ELEMENTS // max(close.shape[-1], 1))
+    for start in range(0, close.shape[0], step):
+        chunk = slice(start, start + step)
+        compute_feature_matrix(high[chunk], low[chunk], close[chunk], volume[chunk], out=out[chunk])
+    return out
+
+
+def engineer_panel_features(df, symbol_column='Symbol'):
+    # features for many symbols in one pass over (S, T) arrays, the rows match
+    # engineer_features(rows of one symbol, backend='numpy') bit for bit. returns the input rows
+    # sorted by (symbol, date) with a (symbol, Date) index and the feature columns added
+    panel = panel_arrays(df, symbol_column)
+    matrix = compute_panel_matrix(*panel['arrays'])
+    frame = panel['frame'].set_index([symbol_column, 'Date'])
+    features = pd.DataFrame(matrix[panel['codes'], panel['positions']], index=frame.index, columns=FEATURE_COLUMNS, copy=False)
+    return pd.concat([frame, features], axis=1)
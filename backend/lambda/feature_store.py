@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from feature_kernels import FEATURE_COLUMNS, EMA_BLOCK, compute_feature_matrix, frame_to_arrays
+from feature_utils import join_features
+
+FEATURE_STORE_DIR = os.environ.get(
+    'FEATURE_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'feature_store')
+)
+RAW_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# rows recomputed in front of an appended tail, covers the longest window (volatility_60d
+# needs 61 bars) and is a whole number of ema blocks so the tail blocks line up with a full run
+TAIL_LOOKBACK = 2 * EMA_BLOCK
+EMA_STATE_COLUMNS = ('ema_12', 'ema_26', 'macd_signal')
+
+
+def code_version():
+    # any change to the feature code invalidates every stored matrix
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('feature_utils.py', 'feature_kernels.py'):
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def raw_arrays(df):
+    dates = np.ascontiguousarray(pd.DatetimeIndex(df.index).as_unit('ns').asi8)
+    values = np.ascontiguousarray(df[RAW_COLUMNS].to_numpy(dtype=np.float64))
+    return dates, values
+
+
+def fingerprint(dates, values):
+    digest = hashlib.sha256()
+    digest.update(dates.tobytes())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    # one matrix per name: features.f64 holds (rows, n_features) float64 in row order so new
+    # days are appended at the end of the file, dates.i8 the matching ns timestamps and
+    # manifest.json the row count, fingerprint of the raw rows and feature code version
+
+    def __init__(self, store_dir=FEATURE_STORE_DIR):
+        self.store_dir = store_dir
+        self.version = code_version()
+
+    def paths(self, name):
+        entry = os.path.join(self.store_dir, name)
+        return {
+            'dir': entry,
+            'manifest': os.path.join(entry, 'manifest.json'),
+            'features': os.path.join(entry, 'features.f64'),
+            'dates': os.path.join(entry, 'dates.i8'),
+        }
+
+    def read_manifest(self, name):
+        try:
+            with open(self.paths(name)['manifest']) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get('version') != self.version or manifest.get('columns') != FEATURE_COLUMNS:
+            return None
+        return manifest
+
+    def open_matrix(self, name, rows):
+        # read only memory map, nothing is read until a column is used
+        if rows == 0:
+            return np.empty((0, len(FEATURE_COLUMNS)))
+        return np.memmap(self.paths(name)['features'], dtype=np.float64, mode='r', shape=(rows, len(FEATURE_COLUMNS)))
+
+    def write_manifest(self, name, rows, digest):
+        # replaced last, a crash before this leaves the previous row count in charge and the
+        # extra bytes at the end of the data files are overwritten by the next write
+        path = self.paths(name)['manifest']
+        manifest = {'version': self.version, 'columns': FEATURE_COLUMNS, 'rows': rows, 'fingerprint': digest}
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def write_rows(self, name, start, matrix, dates):
+        # appended rows go after the stored ones, which frames from load() may still map. a
+        # rebuild writes new files and replaces the old ones, open maps keep the old inode
+        paths = self.paths(name)
+        for path, data, row_bytes in ((paths['features'], matrix, len(FEATURE_COLUMNS) * 8), (paths['dates'], dates, 8)):
+            if start and os.path.exists(path):
+                with open(path, 'r+b') as f:
+                    f.seek(start * row_bytes)
+                    f.write(np.ascontiguousarray(data).tobytes())
+                    f.truncate()
+            else:
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(np.ascontiguousarray(data).tobytes())
+                os.replace(path + '.tmp', path)
+
+    def rebuild(self, name, df, dates, values):
+        os.makedirs(self.paths(name)['dir'], exist_ok=True)
+        matrix = compute_feature_matrix(*frame_to_arrays(df))
+        self.write_rows(name, 0, matrix, dates)
+        self.write_manifest(name, len(df), fingerprint(dates, values))
+        print(f"feature store: computed {len(df)} rows for {name}")
+
+    def append(self, name, df, dates, values, rows):
+        # only the new rows are written. the computation restarts at the last ema block
+        # boundary before them, TAIL_LOOKBACK rows earlier, with the stored ema values of the
+        # row before that, which gives the same bits as computing the whole series again
+        start = (rows // EMA_BLOCK) * EMA_BLOCK - TAIL_LOOKBACK
+        stored = self.open_matrix(name, rows)
+        ema_initial = {column: float(stored[start - 1, FEATURE_COLUMNS.index(column)]) for column in EMA_STATE_COLUMNS}
+        del stored
+
+        matrix = compute_feature_matrix(*frame_to_arrays(df.iloc[start:]), ema_initial=ema_initial)
+        self.write_rows(name, rows, matrix[rows - start:], dates[rows:])
+        self.write_manifest(name, len(df), fingerprint(dates, values))
+        print(f"feature store: appended {len(df) - rows} rows to {name}")
+
+    def load(self, df, name='SPY'):
+        # same layout as engineer_features(df, backend='numpy'), the feature columns are backed
+        # by the memory mapped matrix
+        dates, values = raw_arrays(df)
+        manifest = self.read_manifest(name)
+        rows = manifest['rows'] if manifest else 0
+
+        if manifest and rows == len(df) and manifest['fingerprint'] == fingerprint(dates, values):
+            print(f"feature store: {rows} rows for {name} from {self.paths(name)['dir']}")
+        elif (manifest and len(df) > rows and (rows // EMA_BLOCK) * EMA_BLOCK > TAIL_LOOKBACK
+              and manifest['fingerprint'] == fingerprint(dates[:rows], values[:rows])):
+            self.append(name, df, dates, values, rows)
+        else:
+            self.rebuild(name, df, dates, values)
+
+        return join_features(df, self.open_matrix(name, len(df)))
+
+
+def load_features(df, name='SPY', store_dir=FEATURE_STORE_DIR):
+    return FeatureStore(store_dir).load(df, name)
@@ -0,0 +1,295 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from feature_utils import get_feature_columns
+
+SNAPSHOT_VERSION = 1
+
+# closes kept for the longest shift-based feature (returns_20d)
+CLOSE_HISTORY = 21
+
+
+def divide(a, b):
+    # float64 division like the batch path: x / 0 is +-inf and 0 / 0 is nan, not ZeroDivisionError
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.divide(a, b))
+
+
+class RollingWindow:
+    # fixed size window with running sums, values are stored relative to an anchor
+    # and the sums are recomputed from scratch once per window length to stop drift
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque(maxlen=size)
+        for value in values:
+            self.values.append(float('nan') if value is None else float(value))
+        self.resync()
+
+    def resync(self):
+        valid = [v for v in self.values if not math.isnan(v)]
+        self.anchor = valid[-1] if valid else 0.0
+        self.total = math.fsum(v - self.anchor for v in valid)
+        self.total_sq = math.fsum((v - self.anchor) ** 2 for v in valid)
+        self.nan_count = len(self.values) - len(valid)
+        self.since_resync = 0
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old - self.anchor
+                self.total_sq -= (old - self.anchor) ** 2
+
+        self.values.append(value)
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            self.total += value - self.anchor
+            self.total_sq += (value - self.anchor) ** 2
+
+        self.since_resync += 1
+        if self.since_resync >= self.size:
+            self.resync()
+
+    def ready(self):
+        return len(self.values) == self.size and self.nan_count == 0
+
+    def mean(self):
+        if not self.ready():
+            return float('nan')
+        return self.anchor + self.total / self.size
+
+    def std(self):
+        if not self.ready():
+            return float('nan')
+        var = (self.total_sq - self.total * self.total / self.size) / (self.size - 1)
+        return math.sqrt(max(var, 0.0))
+
+
+class EMA:
+    # recursive ema matching pandas ewm(span=..., adjust=False)
+
+    def __init__(self, span, value=None):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = value
+
+    def update(self, x):
+        if math.isnan(x):
+            return float('nan') if self.value is None else self.value
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+
+class StreamingFeatureEngine:
+    # incremental version of feature_utils.engineer_features
+    # every update is O(1) per indicator and only the bounded windows are kept as state
+
+    def __init__(self):
+        self.bars = 0
+        self.closes = deque(maxlen=CLOSE_HISTORY)
+        self.prev_volume = None
+
+        self.windows = {
+            'returns_5': RollingWindow(5),
+            'returns_10': RollingWindow(10),
+            'returns_20': RollingWindow(20),
+            'returns_60': RollingWindow(60),
+            'close_5': RollingWindow(5),
+            'close_10': RollingWindow(10),
+            'close_20': RollingWindow(20),
+            'close_50': RollingWindow(50),
+            'gain_14': RollingWindow(14),
+            'loss_14': RollingWindow(14),
+            'true_range_14': RollingWindow(14),
+            'volume_20': RollingWindow(20),
+        }
+        self.emas = {
+            'ema_12': EMA(12),
+            'ema_26': EMA(26),
+            'macd_signal': EMA(9),
+        }
+
+        self.last_date = None
+        self.last_bar = None
+        self.last_features = None
+
+    def _close_ago(self, n):
+        if len(self.closes) <= n:
+            return float('nan')
+        return self.closes[-1 - n]
+
+    def update(self, bar, date=None):
+        open_ = float(bar['Open'])
+        high = float(bar['High'])
+        low = float(bar['Low'])
+        close = float(bar['Close'])
+        volume = float(bar['Volume'])
+
+        prev_close = self._close_ago(0)
+        self.closes.append(close)
+        w = self.windows
+
+        returns = divide(close, prev_close) - 1
+        if self.bars > 0:
+            for size in (5, 10, 20, 60):
+                w[f'returns_{size}'].push(returns)
+
+        for size in (5, 10, 20, 50):
+            w[f'close_{size}'].push(close)
+
+        # first bar has no delta, pandas treats it as zero gain and zero loss
+        delta = close - prev_close if self.bars > 0 else 0.0
+        w['gain_14'].push(delta if delta > 0 else 0.0)
+        w['loss_14'].push(-delta if delta < 0 else 0.0)
+
+        true_range = high - low
+        if self.bars > 0:
+            true_range = max(true_range, abs(high - prev_close), abs(low - prev_close))
+        w['true_range_14'].push(true_range)
+
+        w['volume_20'].push(volume)
+        volume_change = float('nan') if self.prev_volume is None else divide(volume, self.prev_volume) - 1
+        self.prev_volume = volume
+
+        ema_12 = self.emas['ema_12'].update(close)
+        ema_26 = self.emas['ema_26'].update(close)
+        macd = ema_12 - ema_26
+        macd_signal = self.emas['macd_signal'].update(macd)
+
+        gain = w['gain_14'].mean()
+        loss = w['loss_14'].mean()
+        if math.isnan(gain) or math.isnan(loss) or (gain == 0 and loss == 0):
+            rsi = float('nan')
+        elif loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + gain / loss))
+
+        volume_sma_20 = w['volume_20'].mean()
+        close_5 = self._close_ago(5)
+        close_10 = self._close_ago(10)
+
+        bb_middle = w['close_20'].mean()
+        bb_std = w['close_20'].std()
+        bb_upper = bb_middle + (bb_std * 2)
+        bb_lower = bb_middle - (bb_std * 2)
+
+        features = {
+            'returns': returns,
+            'returns_5d': divide(close, close_5) - 1,
+            'returns_10d': divide(close, close_10) - 1,
+            'returns_20d': divide(close, self._close_ago(20)) - 1,
+            'volatility_5d': w['returns_5'].std(),
+            'volatility_10d': w['returns_10'].std(),
+            'volatility_20d': w['returns_20'].std(),
+            'volatility_60d': w['returns_60'].std(),
+            'sma_5': w['close_5'].mean(),
+            'sma_10': w['close_10'].mean(),
+            'sma_20': bb_middle,
+            'sma_50': w['close_50'].mean(),
+            'ema_12': ema_12,
+            'ema_26': ema_26,
+            'rsi': rsi,
+            'atr': w['true_range_14'].mean(),
+            'volume_sma_20': volume_sma_20,
+            'volume_ratio': divide(volume, volume_sma_20),
+            'volume_change': volume_change,
+            'momentum_5': close - close_5,
+            'momentum_10': close - close_10,
+            'roc_5': divide(close - close_5, close_5) * 100,
+            'roc_10': divide(close - close_10, close_10) * 100,
+            'bb_middle': bb_middle,
+            'bb_upper': bb_upper,
+            'bb_lower': bb_lower,
+            'bb_width': divide(bb_upper - bb_lower, bb_middle),
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_histogram': macd - macd_signal,
+        }
+
+        self.bars += 1
+        self.last_date = date
+        self.last_bar = {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}
+        self.last_features = features
+        return features
+
+    def update_frame(self, df, include_previous=False):
+        # push every row of an ohlcv frame, returns the same layout as engineer_features
+        previous = None
+        if include_previous and self.last_features is not None:
+            previous = {**self.last_bar, **self.last_features}
+            previous_date = pd.Timestamp(self.last_date) if self.last_date is not None else None
+
+        # rows dated on or before the last pushed bar were already counted (a retried push, or
+        # overlap with the restored feature_state), only the newer ones go in
+        dates = pd.to_datetime(df.index)
+        if self.last_date is not None:
+            df = df[dates > pd.Timestamp(self.last_date)]
+            dates = pd.to_datetime(df.index)
+        if not dates.is_monotonic_increasing or not dates.is_unique:
+            raise ValueError("streaming rows must be in increasing date order without duplicates")
+
+        rows = []
+        for date, bar in zip(df.index, df[['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False)):
+            date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+            features = self.update(bar._asdict(), date=date_str)
+            rows.append(features)
+
+        df_features = pd.concat([df, pd.DataFrame(rows, index=df.index, columns=get_feature_columns())], axis=1)
+        if previous is not None:
+            previous_row = pd.DataFrame([previous], index=pd.Index([previous_date], name=df.index.name))
+            df_features = pd.concat([previous_row[df_features.columns.intersection(previous_row.columns)], df_features])
+        return df_features
+
+    def snapshot(self):
+        def clean(value):
+            return None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+        return {
+            'version': SNAPSHOT_VERSION,
+            'bars': self.bars,
+            'closes': list(self.closes),
+            'prev_volume': self.prev_volume,
+            'windows': {name: [clean(v) for v in window.values] for name, window in self.windows.items()},
+            'ema': {name: ema.value for name, ema in self.emas.items()},
+            'last_date': self.last_date,
+            'last_bar': self.last_bar,
+            'last_features': {k: clean(v) for k, v in self.last_features.items()} if self.last_features else None,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        if state.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported feature state version: {state.get('version')}")
+
+        engine = cls()
+        engine.bars = state['bars']
+        engine.closes.extend(state['closes'])
+        engine.prev_volume = state['prev_volume']
+        for name, values in state['windows'].items():
+            engine.windows[name] = RollingWindow(engine.windows[name].size, values)
+        for name, value in state['ema'].items():
+            engine.emas[name].value = value
+
+        engine.last_date = state.get('last_date')
+        engine.last_bar = state.get('last_bar')
+        last_features = state.get('last_features')
+        if last_features is not None:
+            engine.last_features = {k: float('nan') if v is None else v for k, v in last_features.items()}
+        return engine
+
+
+def stream_features(df, state=None):
+    engine = StreamingFeatureEngine.from_snapshot(state) if state else StreamingFeatureEngine()
+    df_features = engine.update_frame(df)
+    return df_features, engine.snapshot()
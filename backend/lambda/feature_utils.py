@@ -1,6 +1,31 @@
+import math
 import pandas as pd
 import numpy as np
 
+# bars of history (including the row itself) a windowed feature needs to match the full computation
+WINDOW_LOOKBACK = {
+    'returns': 2, 'returns_5d': 6, 'returns_10d': 11, 'returns_20d': 21,
+    'volatility_5d': 6, 'volatility_10d': 11, 'volatility_20d': 21, 'volatility_60d': 61,
+    'sma_5': 5, 'sma_10': 10, 'sma_20': 20, 'sma_50': 50,
+    'rsi': 15, 'atr': 15,
+    'volume_sma_20': 20, 'volume_ratio': 20, 'volume_change': 2,
+    'momentum_5': 6, 'momentum_10': 11,
+    'roc_5': 6, 'roc_10': 11,
+    'bb_middle': 20, 'bb_upper': 20, 'bb_lower': 20, 'bb_width': 20,
+}
+
+# emas never fully forget the start of the series, require enough bars that the
+# starting value weighs less than this
+EMA_WARMUP_TOLERANCE = 0.01
+
+
+class InsufficientHistoryError(ValueError):
+    def __init__(self, missing, available):
+        self.missing = missing
+        self.available = available
+        details = ', '.join(f"{name} (+{bars})" for name, bars in missing.items())
+        super().__init__(f"not enough history ({available} bars), missing lookback: {details}")
+
 def calculate_returns(df):
     df['returns'] = df['Close'].pct_change()
     df['returns_5d'] = df['Close'].pct_change(5)
@@ -72,17 +97,119 @@ def calculate_macd(df):
     df['macd_histogram'] = df['macd'] - df['macd_signal']
     return df
 
-def engineer_features(df):
-    df = df.copy()
-    df = calculate_returns(df)
-    df = calculate_volatility(df)
-    df = calculate_moving_averages(df)
-    df = calculate_rsi(df)
-    df = calculate_atr(df)
-    df = calculate_volume_indicators(df)
-    df = calculate_price_momentum(df)
-    df = calculate_bollinger_bands(df)
-    df = calculate_macd(df)
+def ema_warmup(span, tolerance=EMA_WARMUP_TOLERANCE):
+    decay = 1 - 2 / (span + 1)
+    return math.ceil(math.log(tolerance) / math.log(decay))
+
+def get_feature_lookback(tolerance=EMA_WARMUP_TOLERANCE):
+    lookback = dict(WINDOW_LOOKBACK)
+    lookback['ema_12'] = ema_warmup(12, tolerance) + 1
+    lookback['ema_26'] = ema_warmup(26, tolerance) + 1
+    lookback['macd'] = max(lookback['ema_12'], lookback['ema_26'])
+    lookback['macd_signal'] = lookback['macd'] + ema_warmup(9, tolerance)
+    lookback['macd_histogram'] = lookback['macd_signal']
+    return {feature: lookback[feature] for feature in get_feature_columns()}
+
+def check_lookback(n_rows, tail=1, tolerance=EMA_WARMUP_TOLERANCE):
+    # the oldest requested row has n_rows - tail + 1 bars of history
+    available = n_rows - tail + 1
+    missing = {
+        feature: bars - available
+        for feature, bars in get_feature_lookback(tolerance).items()
+        if bars > available
+    }
+    if missing:
+        raise InsufficientHistoryError(missing, max(available, 0))
+
+def calculate_ema_features(close):
+    # ema and macd columns over the whole close series
+    ema_12 = close.ewm(span=12, adjust=False).mean()
+    ema_26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema_12 - ema_26
+    macd_signal = macd.ewm(span=9, adjust=False).mean()
+    return pd.DataFrame({
+        'ema_12': ema_12,
+        'ema_26': ema_26,
+        'macd': macd,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd - macd_signal,
+    })
+
+def engineer_tail_features(df, tail, backend='pandas', tolerance=EMA_WARMUP_TOLERANCE):
+    # only the last `tail` rows, windowed features are computed over just the lookback they need
+    if tail < 1:
+        raise ValueError(f"tail must be at least 1, got {tail}")
+    check_lookback(len(df), tail, tolerance)
+
+    window = max(WINDOW_LOOKBACK.values())
+    df_tail = engineer_features(df.iloc[-(tail + window - 1):], backend=backend)
+
+    # the ema recursion depends on every earlier bar, run it over the full close series
+    ema_features = calculate_ema_features(df['Close']).iloc[-len(df_tail):]
+    df_tail[list(ema_features.columns)] = ema_features.values
+    return df_tail.iloc[-tail:]
+
+FEATURE_STEPS = [
+    calculate_returns, calculate_volatility, calculate_moving_averages, calculate_rsi, calculate_atr,
+    calculate_volume_indicators, calculate_price_momentum, calculate_bollinger_bands, calculate_macd
+]
+
+def join_features(df, matrix):
+    # df's columns followed by a (rows, features) matrix as one block. pd.concat copies the block
+    # on pandas 2 unless copy=False (deprecated in pandas 3), insert keeps it as is
+    feature_cols = get_feature_columns()
+    joined = pd.DataFrame(matrix, index=df.index, columns=feature_cols, copy=False)
+    for i, name in enumerate(name for name in df.columns if name not in feature_cols):
+        joined.insert(i, name, df[name])
+    return joined
+
+def downcast_features(df, dtype):
+    # the feature columns moved into one preallocated block of dtype, the layout of the numpy backend
+    from feature_kernels import allocate_feature_matrix
+    feature_cols = get_feature_columns()
+    matrix = allocate_feature_matrix((len(df),), dtype)
+    for i, name in enumerate(feature_cols):
+        matrix[:, i] = df[name].to_numpy()
+    return join_features(df, matrix)
+
+def engineer_features_downcast(df, dtype):
+    # the pandas backend into a block of dtype, df is left alone. every step's columns are moved
+    # into the block and dropped right away, only a few float64 columns exist at a time
+    from feature_kernels import allocate_feature_matrix, FEATURE_INDEX
+    matrix = allocate_feature_matrix((len(df),), dtype)
+    work = df[['High', 'Low', 'Close', 'Volume']].copy(deep=False)
+    for step in FEATURE_STEPS:
+        work = step(work)
+        features = [name for name in work.columns if name in FEATURE_INDEX]
+        for name in features:
+            matrix[:, FEATURE_INDEX[name]] = work[name].to_numpy()
+        # calculate_volatility is the one step that reads an earlier step's column
+        work = work.drop(columns=[name for name in features if not (name == 'returns' and step is calculate_returns)])
+    return join_features(df, matrix)
+
+def engineer_features(df, backend='pandas', tail=None, dtype=None, copy=True):
+    # backend='numpy' computes the whole matrix from ohlcv arrays in feature_kernels
+    # tail=n only computes the last n rows and raises InsufficientHistoryError when
+    # the frame is too short for them
+    # dtype=np.float32 stores the features in one float32 block, the numpy backend writes its
+    # float64 results straight into it (error bound: feature_kernels.FLOAT32_MAX_RELATIVE_ERROR)
+    # copy=False lets the float64 pandas backend add its columns to df instead of a copy of it,
+    # with a dtype df is never written to
+    if tail is not None:
+        df = engineer_tail_features(df, tail, backend=backend)
+        return df if dtype is None else downcast_features(df, dtype)
+    if backend == 'numpy':
+        from feature_kernels import engineer_features_numpy
+        return engineer_features_numpy(df, dtype=dtype or np.float64)
+    if backend != 'pandas':
+        raise ValueError(f"unknown feature backend: {backend}")
+
+    if dtype is not None:
+        return engineer_features_downcast(df, dtype)
+    if copy:
+        df = df.copy()
+    for step in FEATURE_STEPS:
+        df = step(df)
     return df
 
 def get_feature_columns():
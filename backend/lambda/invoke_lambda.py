@@ -1,46 +1,43 @@
 import json
 import boto3
-import requests
 import os
 from datetime import datetime
 
-def fetch_spy_data_alpha_vantage(api_key, days=100):
-    url = f"https://www.alphavantage.co/query"
-    params = {
-        'function': 'TIME_SERIES_DAILY',
-        'symbol': 'SPY',
-        'outputsize': 'compact',  # free tier: last 100 days
-        'apikey': api_key
-    }
-
-    print(f"fetching {days} days of SPY data from Alpha Vantage...")
-    response = requests.get(url, params=params)
-    data = response.json()
-
-    if 'Time Series (Daily)' not in data:
-        print(f"API Response: {data}")
-        error_msg = data.get('Note', data.get('Error Message', data.get('Information', str(data))))
-        raise ValueError(f"Failed to fetch data: {error_msg}")
-
-    time_series = data['Time Series (Daily)']
-
-    spy_data = []
-    for date_str, values in sorted(time_series.items(), reverse=True)[:days]:
-        spy_data.append({
-            'Date': date_str,
-            'Open': float(values['1. open']),
-            'High': float(values['2. high']),
-            'Low': float(values['3. low']),
-            'Close': float(values['4. close']),
-            'Volume': float(values['5. volume'])
-        })
-
-    spy_data.reverse()
+def fetch_daily_rows(api_key, symbols, days=100):
+    # every symbol at once through market_fetcher (rate limited, retried, cached), a symbol that
+    # still fails is left out
+    import pandas as pd
+    from market_fetcher import fetch_daily_frames, COMPACT_DAYS
+    from market_store import to_records
+
+    print(f"fetching {days} days of {', '.join(symbols)} from Alpha Vantage...")
+    # a start date further back than the compact window makes the fetcher ask for the full history
+    start = None if days <= COMPACT_DAYS else pd.Timestamp.today().normalize() - pd.tseries.offsets.BDay(days + 10)
+    rows = {}
+    for (symbol, _, _), df in fetch_daily_frames(api_key, [(symbol, start, None) for symbol in symbols]).items():
+        if isinstance(df, Exception):
+            print(f"failed to fetch {symbol}: {str(df)}")
+            continue
+        if df.empty:
+            print(f"no data for {symbol} in the last {days} days")
+            continue
+        rows[symbol] = to_records(df.tail(days))
+        print(f"fetched {len(rows[symbol])} days of {symbol}, {rows[symbol][0]['Date']} to {rows[symbol][-1]['Date']}"
+              + (" (stale cache copy, alpha vantage did not answer)" if df.attrs.get('stale') else ""))
+    return rows
+
+def fetch_daily_alpha_vantage(api_key, symbol, days=100):
+    rows = fetch_daily_rows(api_key, [symbol], days)
+    if symbol not in rows:
+        raise ValueError(f"Failed to fetch {symbol} data")
+    return rows[symbol]
 
-    print(f"fetched {len(spy_data)} days of data")
-    print(f"date range: {spy_data[0]['Date']} to {spy_data[-1]['Date']}")
+def fetch_spy_data_alpha_vantage(api_key, days=100):
+    return fetch_daily_alpha_vantage(api_key, 'SPY', days)
 
-    return spy_data
+def build_panel_data(rows_by_symbol):
+    # panel mode payload: every row tagged with its symbol
+    return [{'Symbol': symbol, **row} for symbol, rows in rows_by_symbol.items() for row in rows]
 
 def invoke_lambda_function(function_name, spy_data, s3_bucket, s3_model_key):
     lambda_client = boto3.client('lambda')
@@ -62,17 +59,40 @@ def invoke_lambda_function(function_name, spy_data, s3_bucket, s3_model_key):
 
     return result
 
+def print_panel_result(result):
+    body = json.loads(result.get('body', '{}'))
+    if result.get('statusCode') != 200:
+        print(f"\n=== PANEL PREDICTION FAILED ===")
+        print(f"Status: {result.get('statusCode')}")
+        print(f"Error: {body.get('error', 'Unknown error')}")
+        return
+
+    print(f"\n=== PANEL PREDICTION SUCCESSFUL ({body['count']} symbols) ===")
+    for prediction in body['predictions']:
+        print(f"{prediction['symbol']:<8}{prediction['date']}  {prediction['prediction_text']:<26}"
+              f"{prediction['confidence_level']} ({prediction['confidence_score']:.2%})")
+    if body.get('skipped'):
+        print(f"Skipped (not enough history): {', '.join(body['skipped'])}")
+
 def main():
     alpha_vantage_api_key = os.environ.get('ALPHA_VANTAGE_API_KEY')
     lambda_function_name = os.environ.get('LAMBDA_FUNCTION_NAME', 'VolatilityPredictor')
     s3_bucket = os.environ.get('S3_BUCKET', 'volatility-trading-models-1767821459')
-    s3_model_key = os.environ.get('S3_MODEL_KEY', 'models/xgboost_tuned.pkl')
+    s3_model_key = os.environ.get('S3_MODEL_KEY', 'models/xgboost_tuned.npz')
 
     if not alpha_vantage_api_key:
         raise ValueError("ALPHA_VANTAGE_API_KEY environment variable not set")
 
-    spy_data = fetch_spy_data_alpha_vantage(alpha_vantage_api_key, days=100)
-    result = invoke_lambda_function(lambda_function_name, spy_data, s3_bucket, s3_model_key)
+    # SYMBOLS=SPY,QQQ,IWM runs the model over several tickers in one panel invocation
+    symbols = [symbol.strip().upper() for symbol in os.environ.get('SYMBOLS', 'SPY').split(',') if symbol.strip()]
+    if len(symbols) > 1:
+        data = build_panel_data(fetch_daily_rows(alpha_vantage_api_key, symbols, days=100))
+        result = invoke_lambda_function(lambda_function_name, data, s3_bucket, s3_model_key)
+        print_panel_result(result)
+        return
+
+    data = fetch_daily_alpha_vantage(alpha_vantage_api_key, symbols[0], days=100)
+    result = invoke_lambda_function(lambda_function_name, data, s3_bucket, s3_model_key)
     if result.get('statusCode') == 200:
         body = json.loads(result['body'])
         print("\n=== PREDICTION SUCCESSFUL ===")
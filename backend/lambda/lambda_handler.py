@@ -1,166 +1,501 @@
+import time
+init_start = time.perf_counter()
+
 import json
-import pickle
-import pandas as pd
-import boto3
 import os
-from io import BytesIO
-from feature_utils import engineer_features, get_feature_columns
-from dynamodb_helper import save_prediction_to_dynamodb, get_prediction, update_prediction_accuracy
-from datetime import datetime, timedelta
+from timing import PhaseTimer, instrument_client
 
-# cache model in memory for container reuse
-model = None
-s3_client = None
+# pandas, numpy, boto3, xgboost and the feature modules are imported inside the functions that
+# use them, import_runtime_modules pulls in what a request needs before the timed phases start
 
-def load_model_from_s3(bucket_name, model_key):
-    global model, s3_client
+# models are cached per (bucket, key, etag) for container reuse, see model_registry.py
+model_registry = None
+s3_client = None
 
-    if model is not None:
-        return model
+# timings of the INIT phase, reported with the first invocation of the container
+init_timer = PhaseTimer()
+cold_start = True
+
+def import_model_modules(model_path):
+    import tree_model
+    import native_model
+    if not tree_model.is_tree_model(model_path):
+        # pickled and native models both need xgboost
+        import xgboost
+
+def import_runtime_modules(event):
+    import numpy
+    import pandas
+    import feature_utils
+    if 'feature_state' in event or event.get('return_feature_state'):
+        import feature_stream
+    import_model_modules(event.get('local_model_path') or event.get('s3_model_key') or '')
+    if 'local_model_path' not in event:
+        import boto3
+    if os.environ.get('DYNAMODB_TABLE'):
+        import dynamodb_helper
+
+def deserialize_model(model_path, model_bytes, read_sidecar):
+    # .npz runs on the numpy tree evaluator without xgboost, .ubj/.json load a bare booster
+    # with its manifest, anything else is the pickled XGBClassifier
+    from tree_model import is_tree_model, load_tree_model
+    from native_model import is_native_model, manifest_path_for, load_native_model
+
+    if is_tree_model(model_path):
+        return load_tree_model(model_bytes)
+    if is_native_model(model_path):
+        return load_native_model(model_bytes, read_sidecar(manifest_path_for(model_path)))
+
+    import pickle
+    return pickle.loads(model_bytes)
+
+def get_s3_client():
+    global s3_client
 
     if s3_client is None:
-        s3_client = boto3.client('s3')
+        import boto3
+        s3_client = instrument_client(boto3.client('s3'))
+    return s3_client
 
-    print(f"loading model from s3://{bucket_name}/{model_key}")
+def get_model_registry():
+    global model_registry
 
-    response = s3_client.get_object(Bucket=bucket_name, Key=model_key)
-    model_bytes = response['Body'].read()
-    model = pickle.loads(model_bytes)
+    if model_registry is None:
+        from model_registry import ModelRegistry
+        model_registry = ModelRegistry(deserialize_model, get_s3_client)
+    return model_registry
 
-    print("model loaded")
-    return model
+def load_model_from_s3(bucket_name, model_key):
+    # revalidated against the s3 etag, a new object under the same key is picked up without a cold start
+    return get_model_registry().get_s3(bucket_name, model_key)
 
 def load_model_from_local(model_path):
-    global model
+    return get_model_registry().get_local(model_path)
+
+KEY_FEATURE_NAMES = ['volatility_20d', 'rsi', 'bb_width', 'macd', 'volume_ratio']
+
+# native models carry their own thresholds in the manifest
+DEFAULT_THRESHOLDS = {'decision': 0.5, 'high': 0.70, 'medium': 0.55}
+
+def format_date(date):
+    return date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+
+def get_confidence_level(confidence_score, thresholds=DEFAULT_THRESHOLDS):
+    # map to low/medium/high
+    if confidence_score >= thresholds['high']:
+        return "high"
+    elif confidence_score >= thresholds['medium']:
+        return "medium"
+    return "low"
+
+def get_model_thresholds(model):
+    return getattr(model, 'thresholds', DEFAULT_THRESHOLDS)
+
+def score_rows(model, X):
+    # one predict_proba call for every row
+    return classify_probabilities(model, model.predict_proba(X))
+
+def classify_probabilities(model, probabilities):
+    # the class is the same 0.5 cut XGBClassifier.predict uses
+    predictions = (probabilities[:, 1] > get_model_thresholds(model)['decision']).astype(int)
+    confidence_scores = probabilities.max(axis=1)
+    return predictions, confidence_scores
+
+def build_prediction(date_str, prediction, confidence_score, x_row, feature_cols, thresholds=DEFAULT_THRESHOLDS):
+    prediction = int(prediction)
+    confidence_score = float(confidence_score)
+
+    # pull out key features for output
+    key_features = {}
+    for feat in KEY_FEATURE_NAMES:
+        if feat in feature_cols:
+            key_features[feat] = float(x_row[feature_cols.index(feat)])
+
+    return {
+        'prediction': prediction,
+        'prediction_text': "volatility will increase" if prediction == 1 else "volatility will decrease",
+        'confidence_score': confidence_score,
+        'confidence_level': get_confidence_level(confidence_score, thresholds),
+        'date': date_str,
+        'key_features': key_features
+    }
 
-    if model is not None:
-        return model
+def save_prediction(result):
+    from dynamodb_helper import save_prediction_to_dynamodb
 
-    print(f"loading model from {model_path}")
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    save_prediction_to_dynamodb(
+        result['date'], result['prediction'], result['prediction_text'],
+        result['confidence_score'], result['confidence_level'], result['key_features']
+    )
 
-    print("model loaded")
-    return model
+def evaluate_prediction(previous_row, current_row, predicted_change):
+    # the prediction made on previous_row is checked against the change to current_row
+    current_vol = float(current_row['volatility_20d'])
+    previous_vol = float(previous_row['volatility_20d'])
+
+    actual_change = 1 if current_vol > previous_vol else 0
+    return current_vol, actual_change, actual_change == predicted_change
+
+def verify_prediction(previous_row, current_row):
+    from dynamodb_helper import get_prediction, update_prediction_accuracy
 
-def lambda_handler(event, context):
     try:
-        if isinstance(event, str):
-            event = json.loads(event)
+        previous_str = format_date(previous_row.name)
+        previous_pred = get_prediction(previous_str)
 
-        data = event.get('data')
-        if not data:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'missing data field'})
-            }
+        if previous_pred and 'is_correct' not in previous_pred:
+            predicted_change = previous_pred['prediction']
+            current_vol, actual_change, is_correct = evaluate_prediction(previous_row, current_row, predicted_change)
 
-        # load model from s3 or local
-        if 'local_model_path' in event:
-            model = load_model_from_local(event['local_model_path'])
-        else:
-            bucket = event.get('s3_bucket')
-            model_key = event.get('s3_model_key')
-            if not bucket or not model_key:
-                return {
-                    'statusCode': 400,
-                    'body': json.dumps({'error': 'missing s3_bucket or s3_model_key'})
-                }
-            model = load_model_from_s3(bucket, model_key)
+            update_prediction_accuracy(previous_str, current_vol, actual_change, is_correct, previous_pred.get('confidence_level'))
+            print(f"updated {previous_str}: predicted={predicted_change}, actual={actual_change}, correct={is_correct}")
+    except Exception as e:
+        print(f"error updating {format_date(previous_row.name)} accuracy: {str(e)}")
+
+def insufficient_history_response(e):
+    return {
+        'statusCode': 400,
+        'body': json.dumps({
+            'error': 'not enough historical data',
+            'available_bars': e.available,
+            'missing_lookback': e.missing
+        })
+    }
+
+def no_new_bars_response(engine):
+    # nothing is predicted or saved, the state goes back unchanged
+    return {
+        'statusCode': 409,
+        'body': json.dumps({
+            'error': 'no new bars',
+            'last_date': engine.last_date,
+            'feature_state': engine.snapshot()
+        })
+    }
+
+def select_batch_positions(index, event):
+    # row positions for an explicit list of dates or an inclusive start/end range,
+    # and the requested dates that have no row in the data
+    import numpy as np
+    import pandas as pd
+
+    dates = pd.DatetimeIndex(index)
+    missing = []
+    if event.get('dates'):
+        wanted = pd.to_datetime(event['dates'])
+        mask = dates.isin(wanted)
+        missing = list(dict.fromkeys(format_date(date) for date in wanted[~wanted.isin(dates)]))
+    else:
+        mask = np.ones(len(dates), dtype=bool)
+        if event.get('start_date'):
+            mask &= dates >= pd.Timestamp(event['start_date'])
+        if event.get('end_date'):
+            mask &= dates <= pd.Timestamp(event['end_date'])
+    return [int(p) for p in np.flatnonzero(mask)], missing
+
+def predict_batch(model, df, event, timer):
+    from feature_utils import engineer_features, get_feature_columns, get_feature_lookback
+
+    positions, missing = select_batch_positions(df.index, event)
+
+    # rows without enough history in front of them and dates not in the data are reported instead of scored
+    first_eligible = max(get_feature_lookback().values()) - 1
+    eligible = [p for p in positions if p >= first_eligible]
+    skipped = [{'date': format_date(df.index[p]), 'reason': 'not enough history'} for p in positions if p < first_eligible]
+    skipped += [{'date': date, 'reason': 'not in data'} for date in missing]
+
+    if not eligible:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'no requested dates with enough history', 'skipped': skipped})
+        }
+
+    persist = bool(os.environ.get('DYNAMODB_TABLE'))
+    start = eligible[0] - 1 if persist and eligible[0] - 1 >= first_eligible else eligible[0]
 
-        df = pd.DataFrame(data)
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'])
-            df = df.set_index('Date')
+    with timer.phase('features'):
+        print(f"engineering features for {len(df) - start} rows...")
+        df_features = engineer_features(df, backend='numpy', tail=len(df) - start)
+        feature_cols = get_feature_columns()
+
+        rows = df_features.iloc[[p - start for p in eligible]]
+        X = rows[feature_cols].values
 
-        print("engineering features...")
-        df_features = engineer_features(df)
+    with timer.phase('predict'):
+        print(f"scoring {len(X)} rows...")
+        predictions, confidence_scores = score_rows(model, X)
+        results = [
+            build_prediction(format_date(date), prediction, confidence_score, x_row, feature_cols, get_model_thresholds(model))
+            for date, prediction, confidence_score, x_row in zip(rows.index, predictions, confidence_scores, X)
+        ]
+
+    body = {
+        'predictions': results,
+        'count': len(results),
+        'skipped': skipped
+    }
+    if persist:
+        with timer.phase('persist'):
+            body['persisted'] = persist_batch(df_features, start, eligible, results)
+
+    print(f"batch prediction successful: {len(results)} rows, {len(skipped)} skipped")
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body)
+    }
 
-        latest = df_features.iloc[-1]
+def persist_batch(df_features, start, eligible, results):
+    # batched puts and pooled accuracy updates instead of two round trips per day
+    from dynamodb_helper import BatchPredictionWriter, get_prediction
+
+    writer = BatchPredictionWriter()
+    by_position = dict(zip(eligible, results))
+    for i, (p, result) in enumerate(zip(eligible, results)):
+        if p - 1 >= start:
+            previous_str = format_date(df_features.index[p - 1 - start])
+            # the day before the batch has to come from the table, everything else was just scored
+            previous_pred = by_position.get(p - 1) or get_prediction(previous_str)
+            if previous_pred and 'is_correct' not in previous_pred:
+                current_vol, actual_change, is_correct = evaluate_prediction(
+                    df_features.iloc[p - 1 - start], df_features.iloc[p - start], previous_pred['prediction']
+                )
+                writer.verify(previous_str, current_vol, actual_change, is_correct, previous_pred.get('confidence_level'))
+
+        if i == len(results) - 1:
+            # the newest day goes in after everything else, the reader caches on its timestamp
+            writer.flush()
+        writer.put_prediction(
+            result['date'], result['prediction'], result['prediction_text'],
+            result['confidence_score'], result['confidence_level'], result['key_features']
+        )
+
+    write_result = writer.flush().as_dict()
+    print(f"persisted batch: {json.dumps(write_result)}")
+    return write_result
+
+def predict_panel(model, df, timer):
+    # panel mode: data rows carry a Symbol, the newest row of every symbol is scored in one call
+    import numpy as np
+    import pandas as pd
+    from feature_utils import get_feature_columns, get_feature_lookback
+    from feature_kernels import panel_arrays, compute_panel_matrix
+
+    with timer.phase('features'):
+        panel = panel_arrays(df)
+        print(f"engineering features for {len(panel['symbols'])} symbols, {len(df)} rows...")
+        # (symbols, dates, features), every symbol only sees its own rows
+        matrix = compute_panel_matrix(*panel['arrays'])
         feature_cols = get_feature_columns()
-        X = latest[feature_cols].values.reshape(1, -1)
 
-        # make sure no nans in the data
-        if pd.isna(X).any():
+        lengths = panel['lengths']
+        has_history = lengths >= max(get_feature_lookback().values())
+        eligible = np.flatnonzero(has_history)
+        skipped = [panel['symbols'][s] for s in np.flatnonzero(~has_history)]
+        if not len(eligible):
             return {
                 'statusCode': 400,
-                'body': json.dumps({
-                    'error': 'nan values in features - need more historical data',
-                    'nan_features': [feature_cols[i] for i in range(len(feature_cols)) if pd.isna(X[0, i])]
-                })
+                'body': json.dumps({'error': 'no symbols with enough history', 'skipped': skipped})
             }
 
-        print("making prediction...")
-        prediction = int(model.predict(X)[0])
-
-        probabilities = model.predict_proba(X)[0]
-        confidence_score = float(max(probabilities))
-
-        # map to low/medium/high
-        if confidence_score >= 0.70:
-            confidence_level = "high"
-        elif confidence_score >= 0.55:
-            confidence_level = "medium"
-        else:
-            confidence_level = "low"
+        last = lengths[eligible] - 1
+        X = matrix[eligible, last]
+        # the sorted frame holds every symbol's rows back to back
+        first_row = np.concatenate([[0], np.cumsum(lengths)[:-1]])[eligible]
+        dates = pd.DatetimeIndex(panel['frame']['Date'].to_numpy())
+
+    with timer.phase('predict'):
+        print(f"scoring {len(X)} symbols...")
+        predictions, confidence_scores = score_rows(model, X)
+        thresholds = get_model_thresholds(model)
+        results = [
+            {'symbol': panel['symbols'][s], **build_prediction(format_date(dates[row + p]), prediction, confidence_score, x_row, feature_cols, thresholds)}
+            for s, row, p, prediction, confidence_score, x_row in zip(eligible, first_row, last, predictions, confidence_scores, X)
+        ]
 
-        prediction_text = "volatility will increase" if prediction == 1 else "volatility will decrease"
+    body = {'predictions': results, 'count': len(results), 'skipped': skipped}
+    if os.environ.get('DYNAMODB_TABLE'):
+        with timer.phase('persist'):
+            volatility = matrix[..., feature_cols.index('volatility_20d')]
+            # (symbol, previous date, its volatility_20d, today's) to verify yesterday's predictions
+            previous = [
+                (panel['symbols'][s], format_date(dates[row + p - 1]), float(volatility[s, p - 1]), float(volatility[s, p]))
+                for s, row, p in zip(eligible, first_row, last)
+            ]
+            body['persisted'] = persist_panel(results, previous)
+
+    print(f"panel prediction successful: {len(results)} symbols, {len(skipped)} skipped")
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body)
+    }
 
-        # pull out key features for output
-        key_feature_names = ['volatility_20d', 'rsi', 'bb_width', 'macd', 'volume_ratio']
-        key_features = {}
-        for feat in key_feature_names:
-            if feat in feature_cols:
-                idx = feature_cols.index(feat)
-                key_features[feat] = float(X[0, idx])
+def persist_panel(results, previous):
+    # one batch_get for every symbol's previous day, then batched puts and accuracy updates
+    from dynamodb_helper import BatchPredictionWriter
+
+    writer = BatchPredictionWriter()
+    stored = writer.get_predictions([(symbol, date) for symbol, date, _, _ in previous], ['prediction', 'confidence_level', 'is_correct'])
+    for symbol, previous_str, previous_vol, current_vol in previous:
+        previous_pred = stored.get((symbol, previous_str))
+        if previous_pred and 'is_correct' not in previous_pred:
+            _, actual_change, is_correct = evaluate_prediction(
+                {'volatility_20d': previous_vol}, {'volatility_20d': current_vol}, previous_pred['prediction']
+            )
+            writer.verify(previous_str, current_vol, actual_change, is_correct, previous_pred.get('confidence_level'), symbol)
+
+    for result in results:
+        writer.put_prediction(
+            result['date'], result['prediction'], result['prediction_text'],
+            result['confidence_score'], result['confidence_level'], result['key_features'], result['symbol']
+        )
+
+    write_result = writer.flush().as_dict()
+    print(f"persisted panel: {json.dumps(write_result)}")
+    return write_result
 
-        date_str = df_features.index[-1].strftime('%Y-%m-%d') if hasattr(df_features.index[-1], 'strftime') else str(df_features.index[-1])
+def lambda_handler(event, context):
+    # every invocation logs one metrics line, see timing.py
+    global cold_start
 
-        if os.environ.get('DYNAMODB_TABLE'):
-            save_prediction_to_dynamodb(date_str, prediction, prediction_text, confidence_score, confidence_level, key_features)
+    timer = PhaseTimer().activate()
+    response = None
+    try:
+        response = handle_event(event, timer)
+        return response
+    finally:
+        timer.properties['status_code'] = response['statusCode'] if response else 500
+        if context is not None and hasattr(context, 'aws_request_id'):
+            timer.properties['request_id'] = context.aws_request_id
+        if cold_start:
+            timer.report('predictor', cold_start=True, init_ms={k: round(v, 3) for k, v in init_timer.phases.items()})
+        else:
+            timer.report('predictor', cold_start=False)
+        cold_start = False
 
-            try:
-                if len(df_features) >= 2:
-                    yesterday_date = df_features.index[-2]
-                    yesterday_str = yesterday_date.strftime('%Y-%m-%d') if hasattr(yesterday_date, 'strftime') else str(yesterday_date)
+def handle_event(event, timer):
+    timer.dimensions['mode'] = 'single'
+    try:
+        if isinstance(event, str):
+            event = json.loads(event)
 
-                    yesterday_pred = get_prediction(yesterday_str)
+        data = event.get('data')
+        timer.properties['rows'] = len(data) if data else 0
+        if not data:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'missing data field'})
+            }
 
-                    if yesterday_pred and 'is_correct' not in yesterday_pred:
-                        today_vol_idx = feature_cols.index('volatility_20d')
-                        today_vol = float(X[0, today_vol_idx])
+        with timer.phase('import'):
+            import_runtime_modules(event)
 
-                        yesterday_row = df_features.iloc[-2]
-                        X_yesterday = yesterday_row[feature_cols].values.reshape(1, -1)
-                        yesterday_vol = float(X_yesterday[0, today_vol_idx])
+        import pandas as pd
+        from feature_utils import engineer_features, get_feature_columns, check_lookback, InsufficientHistoryError
 
-                        actual_change = 1 if today_vol > yesterday_vol else 0
+        # load model from s3 or local
+        with timer.phase('model_load'):
+            if 'local_model_path' in event:
+                model = load_model_from_local(event['local_model_path'])
+            else:
+                bucket = event.get('s3_bucket')
+                model_key = event.get('s3_model_key')
+                if not bucket or not model_key:
+                    return {
+                        'statusCode': 400,
+                        'body': json.dumps({'error': 'missing s3_bucket or s3_model_key'})
+                    }
+                model = load_model_from_s3(bucket, model_key)
+
+        with timer.phase('features'):
+            df = pd.DataFrame(data)
+            if 'Date' in df.columns:
+                df['Date'] = pd.to_datetime(df['Date'])
+                df = df.set_index('Date')
+
+        # panel mode: rows for many symbols, one prediction per symbol
+        if 'Symbol' in df.columns:
+            if 'Date' not in df.index.names:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'panel mode needs a Date field in data'})
+                }
+            timer.dimensions['mode'] = 'panel'
+            return predict_panel(model, df, timer)
 
-                        predicted_change = yesterday_pred['prediction']
-                        is_correct = (actual_change == predicted_change)
+        # batch mode: score every requested date in one call
+        if event.get('dates') or event.get('start_date') or event.get('end_date'):
+            if 'Date' not in df.index.names:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'batch mode needs a Date field in data'})
+                }
+            timer.dimensions['mode'] = 'batch'
+            try:
+                return predict_batch(model, df, event, timer)
+            except InsufficientHistoryError as e:
+                return insufficient_history_response(e)
+
+        feature_state = None
+        # yesterday's row is only needed to verify its prediction
+        tail = 2 if os.environ.get('DYNAMODB_TABLE') else 1
+        try:
+            with timer.phase('features'):
+                # streaming mode: restore the engine state from the last run and only push the new bars
+                if 'feature_state' in event or event.get('return_feature_state'):
+                    from feature_stream import StreamingFeatureEngine
+                    timer.dimensions['mode'] = 'stream'
+
+                    print("updating streaming features...")
+                    if event.get('feature_state'):
+                        engine = StreamingFeatureEngine.from_snapshot(event['feature_state'])
+                    else:
+                        engine = StreamingFeatureEngine()
+                    bars = engine.bars
+                    df_features = engine.update_frame(df, include_previous=True)
+                    if engine.bars == bars:
+                        # a retried push, every row is already in the state
+                        return no_new_bars_response(engine)
+                    check_lookback(engine.bars)
+                    feature_state = engine.snapshot()
+                else:
+                    print("engineering features...")
+                    # the numpy kernels give the same bits for a row whatever slice it is computed
+                    # from, which keeps this path identical to batch mode
+                    df_features = engineer_features(df, backend='numpy', tail=tail)
+        except InsufficientHistoryError as e:
+            return insufficient_history_response(e)
+
+        with timer.phase('predict'):
+            feature_cols = get_feature_columns()
+            X = df_features[feature_cols].values[-1:]
+
+            print("making prediction...")
+            predictions, confidence_scores = score_rows(model, X)
+            body = build_prediction(
+                format_date(df_features.index[-1]), predictions[0], confidence_scores[0], X[0], feature_cols,
+                get_model_thresholds(model)
+            )
 
-                        update_prediction_accuracy(yesterday_str, today_vol, actual_change, is_correct)
-                        print(f"updated {yesterday_str}: predicted={predicted_change}, actual={actual_change}, correct={is_correct}")
-            except Exception as e:
-                print(f"error updating yesterday's accuracy: {str(e)}")
+        if os.environ.get('DYNAMODB_TABLE'):
+            with timer.phase('persist'):
+                # verify before saving, the newest timestamp is what the reader caches on
+                if len(df_features) >= 2:
+                    verify_prediction(df_features.iloc[-2], df_features.iloc[-1])
+                save_prediction(body)
 
         # build response
+        if feature_state is not None:
+            body['feature_state'] = feature_state
+
         response = {
             'statusCode': 200,
-            'body': json.dumps({
-                'prediction': prediction,
-                'prediction_text': prediction_text,
-                'confidence_score': confidence_score,
-                'confidence_level': confidence_level,
-                'date': date_str,
-                'key_features': key_features
-            })
+            'body': json.dumps(body)
         }
 
         print(f"prediction successful!")
-        print(f"date: {date_str}")
-        print(f"prediction: {prediction_text}")
-        print(f"confidence: {confidence_level} ({confidence_score:.2%})")
+        print(f"date: {body['date']}")
+        print(f"prediction: {body['prediction_text']}")
+        print(f"confidence: {body['confidence_level']} ({body['confidence_score']:.2%})")
         return response
 
     except Exception as e:
@@ -176,12 +511,58 @@ def lambda_handler(event, context):
             })
         }
 
+
+def warm_up():
+    # INIT phase warm-up: import everything, load the model named by S3_BUCKET/S3_MODEL_KEY
+    # (or LOCAL_MODEL_PATH) and run one dummy feature pass and prediction
+    if os.environ.get('LOCAL_MODEL_PATH'):
+        event = {'local_model_path': os.environ['LOCAL_MODEL_PATH']}
+    else:
+        event = {'s3_bucket': os.environ.get('S3_BUCKET'), 's3_model_key': os.environ.get('S3_MODEL_KEY')}
+        if not event['s3_bucket'] or not event['s3_model_key']:
+            print("warm-up skipped: no LOCAL_MODEL_PATH or S3_BUCKET/S3_MODEL_KEY")
+            return
+
+    try:
+        with init_timer.phase('import'):
+            import_runtime_modules(event)
+
+        import numpy as np
+        import pandas as pd
+        from feature_utils import engineer_features, get_feature_columns, get_feature_lookback
+
+        with init_timer.phase('model_load'):
+            if 'local_model_path' in event:
+                warm_model = load_model_from_local(event['local_model_path'])
+            else:
+                warm_model = load_model_from_s3(event['s3_bucket'], event['s3_model_key'])
+
+        with init_timer.phase('warmup'):
+            bars = max(get_feature_lookback().values())
+            close = np.linspace(100.0, 101.0, bars)
+            df = pd.DataFrame(
+                {'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close, 'Volume': np.full(bars, 1e6)},
+                index=pd.bdate_range('2000-01-03', periods=bars, name='Date')
+            )
+            engineer_features(df, backend='numpy', tail=1)
+            warm_model.predict_proba(np.zeros((1, len(get_feature_columns()))))
+        print(f"warm-up done: {json.dumps({k: round(v, 1) for k, v in init_timer.phases.items()})}")
+    except Exception as e:
+        # a failed warm-up only costs the first request the lazy load
+        print(f"warm-up failed: {str(e)}")
+
+init_timer.add('module_import', (time.perf_counter() - init_start) * 1000)
+
+if os.environ.get('WARMUP_ON_INIT', '').lower() in ('1', 'true', 'yes'):
+    warm_up()
+
 if __name__ == "__main__":
+    from market_store import load_market, to_records
+
+    # the compiled trees the deployed function serves, over enough history for every feature
     test_event = {
-        "local_model_path": "../models/xgboost_final.pkl",
-        "data": [
-            {"Date": "2024-01-01", "Open": 100, "High": 102, "Low": 99, "Close": 101, "Volume": 1000000}
-        ]
+        "local_model_path": "../models/xgboost_tuned.npz",
+        "data": to_records(load_market('SPY').tail(100))
     }
 
     result = lambda_handler(test_event, None)
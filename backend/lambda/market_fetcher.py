@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import pandas as pd
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+# free tier quota, a paid key raises it
+ALPHA_VANTAGE_CALLS_PER_MINUTE = float(os.environ.get('ALPHA_VANTAGE_CALLS_PER_MINUTE', '5'))
+FETCH_CACHE_DIR = os.environ.get(
+    'FETCH_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'http_cache')
+)
+# a cached response is served without asking the provider for this long
+FETCH_CACHE_SECONDS = float(os.environ.get('FETCH_CACHE_SECONDS', str(6 * 3600)))
+# compact only has the last 100 trading days, older windows need the full history
+COMPACT_DAYS = 100
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# what alpha vantage's quota messages say, other Note/Information answers (premium endpoints,
+# invalid calls, the demo key) never succeed on a retry
+THROTTLE_WORDING = ('rate limit', 'call frequency', 'calls per minute', 'requests per day', 'calls per day')
+
+
+class RateLimited(Exception):
+    # alpha vantage answers an exhausted quota with a 200 and a Note/Information message
+    pass
+
+
+class FetchError(Exception):
+    # a query that failed for good, the message never carries the api key
+    pass
+
+
+class TokenBucket:
+    # `rate` tokens per second up to `capacity`, acquire waits for one. waiters are served in order
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=asyncio.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await self.sleep((1 - self.tokens) / self.rate)
+
+
+def cache_key(url, params):
+    # the api key never ends up on disk
+    public = sorted((k, str(v)) for k, v in params.items() if k != 'apikey')
+    return hashlib.sha256(json.dumps([url, public]).encode()).hexdigest()[:32]
+
+
+def provider_message(data):
+    # the Note / Information / Error Message of an answer without a time series, or None
+    if not isinstance(data, dict) or any(k.startswith('Time Series') for k in data):
+        return None
+    return data.get('Note') or data.get('Information') or data.get('Error Message')
+
+
+def is_throttle_message(data):
+    message = provider_message(data)
+    return message is not None and any(wording in message.lower() for wording in THROTTLE_WORDING)
+
+
+def describe_error(e):
+    # aiohttp puts the request url, api key included, into its messages
+    if hasattr(e, 'status'):
+        return f"http {e.status}"
+    return f"{type(e).__name__} {str(e)}"
+
+
+def parse_daily(data):
+    # TIME_SERIES_DAILY json to a date indexed ohlcv frame, oldest first
+    if 'Time Series (Daily)' not in data:
+        error_msg = data.get('Note', data.get('Error Message', data.get('Information', str(data))))
+        raise ValueError(f"Failed to fetch data: {error_msg}")
+    series = data['Time Series (Daily)']
+    df = pd.DataFrame.from_dict(series, orient='index').rename(columns={
+        '1. open': 'Open', '2. high': 'High', '3. low': 'Low', '4. close': 'Close', '5. volume': 'Volume'
+    })[['Open', 'High', 'Low', 'Close', 'Volume']].astype(float)
+    df.index = pd.to_datetime(df.index)
+    df.index.name = 'Date'
+    df['Volume'] = df['Volume'].astype('int64')
+    return df.sort_index()
+
+
+class MarketDataFetcher:
+    # asyncio client for the alpha vantage daily series. one aiohttp session (connection pool) for
+    # every request, a token bucket sized to the quota, retries with jittered exponential backoff
+    # and an on-disk cache: fresh entries are served without a request, stale ones are refreshed
+    # with If-None-Match / If-Modified-Since when the server sent validators. identical requests
+    # that are in flight at the same time share one response
+    #
+    #   async with MarketDataFetcher(api_key) as fetcher:
+    #       frames = await fetcher.fetch_many([('SPY', '2024-01-01', None), ('QQQ', None, None)])
+
+    def __init__(self, api_key, base_url=ALPHA_VANTAGE_URL, calls_per_minute=ALPHA_VANTAGE_CALLS_PER_MINUTE,
+                 max_connections=4, cache_dir=FETCH_CACHE_DIR, max_age=FETCH_CACHE_SECONDS,
+                 max_attempts=5, base_delay=1.0, max_delay=60.0, timeout=30.0, sleep=asyncio.sleep, clock=time.monotonic):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.sleep = sleep
+        # a burst of a full minute's quota, then one call every 60 / calls_per_minute seconds
+        self.bucket = TokenBucket(calls_per_minute / 60.0, max(1.0, calls_per_minute), clock=clock, sleep=sleep)
+        self.session = None
+        self.in_flight = {}
+        self.counters = {'requests': 0, 'cache_hits': 0, 'not_modified': 0, 'retries': 0, 'coalesced': 0, 'stale': 0}
+        # cache keys answered with an expired copy after every attempt failed, fetch_daily flags their frames
+        self.stale = set()
+
+    async def __aenter__(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def read_cache(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, key + '.json')) as f:
+                meta = json.load(f)
+            with open(os.path.join(self.cache_dir, key + '.body'), 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if hashlib.sha256(body).hexdigest() != meta.get('sha256'):
+            return None
+        return meta, body
+
+    def write_cache(self, key, meta, body):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # body first, the meta file is what makes an entry visible
+            path = os.path.join(self.cache_dir, key)
+            with open(path + '.body.tmp', 'wb') as f:
+                f.write(body)
+            os.replace(path + '.body.tmp', path + '.body')
+            with open(path + '.json.tmp', 'w') as f:
+                json.dump({**meta, 'sha256': hashlib.sha256(body).hexdigest()}, f)
+            os.replace(path + '.json.tmp', path + '.json')
+        except OSError as e:
+            print(f"could not cache response: {str(e)}")
+
+    async def get(self, params, max_age=None):
+        # response body of one query, through the cache
+        key = cache_key(self.base_url, params)
+        if key in self.in_flight:
+            self.counters['coalesced'] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        task = asyncio.ensure_future(self.get_uncoalesced(key, params, self.max_age if max_age is None else max_age))
+        self.in_flight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def get_uncoalesced(self, key, params, max_age):
+        import aiohttp
+
+        cached = self.read_cache(key)
+        if cached and time.time() - cached[0]['fetched_at'] < max_age:
+            self.counters['cache_hits'] += 1
+            return cached[1]
+
+        headers = {}
+        if cached and cached[0].get('etag'):
+            headers['If-None-Match'] = cached[0]['etag']
+        if cached and cached[0].get('last_modified'):
+            headers['If-Modified-Since'] = cached[0]['last_modified']
+
+        name = params.get('symbol', key)
+        for attempt in range(self.max_attempts):
+            await self.bucket.acquire()
+            self.counters['requests'] += 1
+            retry_after = None
+            try:
+                async with self.session.get(self.base_url, params={**params, 'apikey': self.api_key}, headers=headers) as response:
+                    if response.status == 304 and cached:
+                        self.counters['not_modified'] += 1
+                        self.write_cache(key, {**cached[0], 'fetched_at': time.time()}, cached[1])
+                        return cached[1]
+                    if response.status in RETRY_STATUSES:
+                        retry_after = response.headers.get('Retry-After')
+                        raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+                    response.raise_for_status()
+                    body = await response.read()
+                    data = json.loads(body)
+                    if is_throttle_message(data):
+                        raise RateLimited(provider_message(data))
+                    if provider_message(data):
+                        # not cached, the next run asks again
+                        raise FetchError(f"{name}: {provider_message(data)}")
+                    meta = {
+                        'params': {k: v for k, v in params.items() if k != 'apikey'},
+                        'fetched_at': time.time(),
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')
+                    }
+            except (aiohttp.ClientResponseError, RateLimited, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                status = getattr(e, 'status', None)
+                if isinstance(e, aiohttp.ClientResponseError) and status not in RETRY_STATUSES:
+                    raise FetchError(f"{name}: {describe_error(e)}") from None
+                if attempt == self.max_attempts - 1:
+                    if cached:
+                        # a stale copy beats no data, the next run tries again
+                        age = (time.time() - cached[0]['fetched_at']) / 3600
+                        print(f"warning: serving {name} from a cache entry {age:.1f}h old after {self.max_attempts} attempts: {describe_error(e)}")
+                        self.counters['stale'] += 1
+                        self.stale.add(key)
+                        return cached[1]
+                    raise FetchError(f"{name}: {describe_error(e)} after {self.max_attempts} attempts") from None
+                self.counters['retries'] += 1
+                delay = self.backoff(attempt, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                print(f"retrying {name} in {delay:.1f}s: {describe_error(e)}")
+                await self.sleep(delay)
+                continue
+
+            self.write_cache(key, meta, body)
+            return body
+
+    async def fetch_daily(self, symbol, start=None, end=None, outputsize=None):
+        # daily ohlcv between start and end (inclusive), compact unless the window reaches further
+        # back than its 100 days
+        if outputsize is None:
+            oldest_compact = pd.Timestamp.today().normalize() - pd.tseries.offsets.BDay(COMPACT_DAYS)
+            outputsize = 'full' if start is not None and pd.Timestamp(start) < oldest_compact else 'compact'
+        params = {'function': 'TIME_SERIES_DAILY', 'symbol': symbol, 'outputsize': outputsize}
+        body = await self.get(params)
+        df = parse_daily(json.loads(body))
+        df = df.loc[start:end] if start is not None or end is not None else df
+        # True when the provider could not be reached and an expired cache entry was used
+        df.attrs['stale'] = cache_key(self.base_url, params) in self.stale
+        return df
+
+    async def fetch_many(self, queries):
+        # {(symbol, start, end): frame or the exception it raised} for symbols or (symbol, start, end)
+        # tuples, every query runs concurrently and the token bucket spaces out the requests
+        keys = [tuple(query) if isinstance(query, (tuple, list)) else (query, None, None) for query in queries]
+        results = await asyncio.gather(*(self.fetch_daily(*key) for key in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+
+def fetch_daily_frames(api_key, queries, **kwargs):
+    # blocking entry point for the scripts, see MarketDataFetcher.fetch_many
+    async def run():
+        async with MarketDataFetcher(api_key, **kwargs) as fetcher:
+            results = await fetcher.fetch_many(queries)
+            print(f"fetch: {json.dumps(fetcher.counters)}")
+            return results
+
+    return asyncio.run(run())
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+MARKET_STORE_DIR = os.environ.get('MARKET_STORE_DIR', os.path.join(DATA_DIR, 'market'))
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+# one file per column, dates are int32 days since 1970-01-01
+COLUMN_FILES = {'Date': 'date.i4', 'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume.i8'}
+PRICE_DTYPES = {'float64': np.float64, 'float32': np.float32}
+# alpha vantage csv downloads use lowercase names and a timestamp column
+CSV_COLUMNS = {'timestamp': 'Date', 'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+
+def source_csv(symbol):
+    return os.path.join(DATA_DIR, f'{symbol}_raw.csv')
+
+
+def read_csv(path):
+    df = pd.read_csv(path)
+    df = df.rename(columns=CSV_COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.set_index('Date').sort_index()
+
+
+def to_days(index):
+    return pd.DatetimeIndex(index).values.astype('datetime64[D]').astype(np.int32)
+
+
+def to_records(df):
+    # the event 'data' layout the predictor lambda takes, same as invoke_lambda.py sends
+    records = df.reset_index()
+    records['Date'] = records['Date'].dt.strftime('%Y-%m-%d')
+    return records.to_dict('records')
+
+
+def source_stat(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def volume_column(symbol, volume):
+    # volume is stored as int64, a float column (csv with a missing value, a provider sending
+    # 1.5e6) is only cast when every value is a whole finite number, nothing is written otherwise
+    values = volume.to_numpy()
+    if values.dtype.kind == 'f':
+        bad = ~np.isfinite(values) | (values != np.round(values))
+        if bad.any():
+            raise ValueError(f"volume for {symbol} is not a whole number on {format_days(volume.index[bad])}")
+    return values
+
+
+def format_days(index, limit=5):
+    dates = [date.strftime('%Y-%m-%d') for date in index[:limit]]
+    return ', '.join(dates) + (f" and {len(index) - limit} more" if len(index) > limit else '')
+
+
+class MarketStore:
+    # <store_dir>/<symbol>/ holds one raw little endian file per column and meta.json with the
+    # row count and the price dtype. rows are only ever added after the last stored date
+
+    def __init__(self, store_dir=MARKET_STORE_DIR):
+        self.store_dir = store_dir
+
+    def entry(self, symbol):
+        return os.path.join(self.store_dir, symbol)
+
+    def meta(self, symbol):
+        try:
+            with open(os.path.join(self.entry(symbol), 'meta.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def dtypes(self, meta):
+        price = PRICE_DTYPES[meta['price_dtype']]
+        return {'Date': np.int32, 'Volume': np.int64, **{name: price for name in PRICE_COLUMNS}}
+
+    def column_path(self, symbol, name, meta):
+        filename = COLUMN_FILES[name]
+        if name in PRICE_COLUMNS:
+            filename += '.f4' if meta['price_dtype'] == 'float32' else '.f8'
+        return os.path.join(self.entry(symbol), filename)
+
+    def columns(self, symbol, start=None, end=None):
+        # read only memory maps of every column, start and end (inclusive) are found by binary
+        # search on the dates, the slices are views so nothing is read until it is used
+        meta = self.meta(symbol)
+        if meta is None:
+            raise KeyError(f"no market data stored for {symbol}")
+        dtypes = self.dtypes(meta)
+        rows = meta['rows']
+        columns = {}
+        for name in COLUMN_FILES:
+            if rows:
+                columns[name] = np.memmap(self.column_path(symbol, name, meta), dtype=dtypes[name], mode='r', shape=(rows,))
+            else:
+                columns[name] = np.empty(0, dtype=dtypes[name])
+
+        lo = 0 if start is None else int(np.searchsorted(columns['Date'], to_days([start])[0], side='left'))
+        hi = rows if end is None else int(np.searchsorted(columns['Date'], to_days([end])[0], side='right'))
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def read(self, symbol, start=None, end=None):
+        columns = self.columns(symbol, start, end)
+        index = pd.DatetimeIndex(columns.pop('Date').astype('datetime64[D]').astype('datetime64[ns]'), name='Date')
+        # copy=False keeps every column on its memory map
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def write_meta(self, symbol, rows, price_dtype, source=None):
+        # replaced last, a crash before this leaves the previous row count in charge and the
+        # extra bytes at the end of the column files are overwritten by the next write
+        path = os.path.join(self.entry(symbol), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'symbol': symbol, 'rows': rows, 'price_dtype': price_dtype, 'source': source}, f)
+        os.replace(path + '.tmp', path)
+
+    def write_columns(self, symbol, meta, start, df):
+        # appends go after the stored rows, which frames handed out by read() may still map. a
+        # full rewrite goes to new files that replace the old ones, open maps keep the old inode
+        dtypes = self.dtypes(meta)
+        values = {'Date': to_days(df.index), **{name: df[name].to_numpy() for name in PRICE_COLUMNS}}
+        values['Volume'] = volume_column(symbol, df['Volume'])
+        for name in COLUMN_FILES:
+            path = self.column_path(symbol, name, meta)
+            data = np.ascontiguousarray(values[name], dtype=dtypes[name]).tobytes()
+            if start and os.path.exists(path):
+                with open(path, 'r+b') as f:
+                    f.seek(start * np.dtype(dtypes[name]).itemsize)
+                    f.write(data)
+                    f.truncate()
+            else:
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+
+    def write(self, symbol, df, price_dtype='float64', source=None):
+        # replaces everything stored for the symbol
+        df = df.sort_index()
+        if not df.index.is_unique:
+            raise ValueError(f"duplicate dates in market data for {symbol}")
+        os.makedirs(self.entry(symbol), exist_ok=True)
+        meta = {'rows': 0, 'price_dtype': price_dtype}
+        self.write_columns(symbol, meta, 0, df)
+        self.write_meta(symbol, len(df), price_dtype, source)
+        return len(df)
+
+    def append(self, symbol, df, source=None):
+        # daily update: rows after the last stored date are added, older rows are ignored
+        meta = self.meta(symbol)
+        if meta is None:
+            return self.write(symbol, df, source=source)
+        stored = self.columns(symbol)['Date']
+        last = int(stored[-1]) if len(stored) else np.iinfo(np.int32).min
+        new = df.sort_index()
+        new = new[to_days(new.index) > last]
+        if len(new):
+            self.write_columns(symbol, meta, meta['rows'], new)
+        self.write_meta(symbol, meta['rows'] + len(new), meta['price_dtype'], source if source is not None else meta.get('source'))
+        return len(new)
+
+    def sync_csv(self, symbol, csv_path):
+        # the csv stays the editable copy, it is only parsed again when its mtime or size changed.
+        # new trailing rows are appended, a csv whose stored part changed replaces the store
+        meta = self.meta(symbol)
+        stat = source_stat(csv_path)
+        if meta is not None and meta.get('source') == stat:
+            return 0
+        df = read_csv(csv_path)
+        if meta is None:
+            added = self.write(symbol, df, source=stat)
+            print(f"market store: imported {added} rows of {symbol} from {csv_path}")
+            return added
+
+        stored = self.columns(symbol)
+        rows = meta['rows']
+        dtypes = self.dtypes(meta)
+        head = df.iloc[:rows]
+        unchanged = len(head) == rows and np.array_equal(to_days(head.index), stored['Date']) and all(
+            np.array_equal(head[name].to_numpy().astype(dtypes[name]), stored[name]) for name in PRICE_COLUMNS + ['Volume']
+        )
+        del stored
+        if not unchanged:
+            added = self.write(symbol, df, meta['price_dtype'], source=stat)
+            print(f"market store: {csv_path} changed, re-imported {added} rows of {symbol}")
+            return added
+        added = self.append(symbol, df.iloc[rows:], source=stat)
+        print(f"market store: appended {added} rows of {symbol} from {csv_path}")
+        return added
+
+
+def load_market(symbol='SPY', start=None, end=None, store_dir=MARKET_STORE_DIR, csv_path=None):
+    # date indexed ohlcv frame backed by the memory mapped columns, <symbol>_raw.csv in
+    # backend/data is picked up when it is new or has changed since the last import
+    store = MarketStore(store_dir)
+    csv_path = csv_path or source_csv(symbol)
+    if os.path.exists(csv_path):
+        store.sync_csv(symbol, csv_path)
+    return store.read(symbol, start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='columnar market data store')
+    parser.add_argument('command', choices=['import', 'export', 'info'])
+    parser.add_argument('--symbol', default='SPY')
+    parser.add_argument('--csv', help='defaults to backend/data/<symbol>_raw.csv')
+    parser.add_argument('--price-dtype', choices=list(PRICE_DTYPES), default='float64')
+    args = parser.parse_args()
+
+    store = MarketStore()
+    csv_path = args.csv or source_csv(args.symbol)
+    if args.command == 'import':
+        rows = store.write(args.symbol, read_csv(csv_path), args.price_dtype, source=source_stat(csv_path))
+        print(f"imported {rows} rows of {args.symbol} from {csv_path}")
+    elif args.command == 'export':
+        store.read(args.symbol).to_csv(csv_path)
+        store.write_meta(args.symbol, store.meta(args.symbol)['rows'], store.meta(args.symbol)['price_dtype'], source_stat(csv_path))
+        print(f"exported {args.symbol} to {csv_path}")
+    else:
+        df = store.read(args.symbol)
+        meta = store.meta(args.symbol)
+        print(f"{args.symbol}: {len(df)} rows from {df.index[0].date()} to {df.index[-1].date()}, prices {meta['price_dtype']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import json
+import sys
+
+# the metrics lines the lambdas print (timing.py), read back from saved logs. a line can carry a
+# cloudwatch prefix (timestamp, request id, level) in front of the json:
+#   aws logs filter-log-events --log-group-name /aws/lambda/volatility-predictor \
+#       --filter-pattern '{ $.function = "predictor" }' --query 'events[].message' --output text > predictor.log
+#   python metrics_report.py predictor.log
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def parse_line(line):
+    start = line.find('{')
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and '_aws' in record else None
+
+
+def read_records(lines):
+    return [record for record in map(parse_line, lines) if record]
+
+
+def metric_names(record):
+    return [metric['Name'] for directive in record['_aws']['CloudWatchMetrics'] for metric in directive['Metrics']]
+
+
+def group_key(record, by):
+    return tuple(str(record.get(name, '-')) for name in by)
+
+
+def percentile(values, q):
+    # nearest rank
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def aggregate(records, by=('function', 'mode', 'endpoint')):
+    # {group: {metric: {'count', 'p50', 'p95', 'p99', 'max'}}}, a metric only counts the
+    # invocations that reported it (persist only exists when a table is set)
+    by = [name for name in by if any(name in record for record in records)]
+    values = {}
+    for record in records:
+        group = values.setdefault(group_key(record, by), {})
+        for name in metric_names(record):
+            if isinstance(record.get(name), (int, float)):
+                group.setdefault(name, []).append(record[name])
+
+    summary = {}
+    for group, metrics in values.items():
+        summary[group] = {}
+        for name, series in metrics.items():
+            row = {'count': len(series), 'max': max(series)}
+            for q in PERCENTILES:
+                row[f'p{int(q * 100)}'] = percentile(series, q)
+            summary[group][name] = row
+    return by, summary
+
+
+def print_summary(by, summary, metrics=None):
+    for group, rows in sorted(summary.items()):
+        print(', '.join(f"{name}={value}" for name, value in zip(by, group)) or 'all')
+        print(f"  {'metric':<34}{'count':>7}{'p50':>11}{'p95':>11}{'p99':>11}{'max':>11}")
+        # total first, then the timings in the order they first showed up, then the counters
+        for name, row in sorted(rows.items(), key=lambda item: (not item[0].endswith('_ms'), item[0] != 'total_ms')):
+            if metrics and not any(m in name for m in metrics):
+                continue
+            print(f"  {name:<34}{row['count']:>7}{row['p50']:>11.2f}{row['p95']:>11.2f}{row['p99']:>11.2f}{row['max']:>11.2f}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='p50/p95/p99 per phase from saved lambda metrics lines')
+    parser.add_argument('logs', nargs='*', help='log files, stdin when empty')
+    parser.add_argument('--by', default='function,mode,endpoint', help='comma separated fields to group by')
+    parser.add_argument('--metric', action='append', help='only metrics containing this, can be repeated')
+    parser.add_argument('--json', action='store_true', help='print the summary as json')
+    args = parser.parse_args()
+
+    lines = []
+    if args.logs:
+        for path in args.logs:
+            with open(path) as f:
+                lines.extend(f)
+    else:
+        lines = sys.stdin.readlines()
+
+    records = read_records(lines)
+    if not records:
+        print("no metrics lines found")
+        return
+    by, summary = aggregate(records, tuple(args.by.split(',')))
+    if args.json:
+        print(json.dumps({'|'.join(group): rows for group, rows in summary.items()}, indent=2))
+        return
+    print(f"{len(records)} invocations\n")
+    print_summary(by, summary, args.metric)
+
+
+if __name__ == "__main__":
+    main()
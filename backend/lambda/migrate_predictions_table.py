@@ -0,0 +1,58 @@
+import os
+import boto3
+from dynamodb_helper import PREDICTIONS_TABLE, PREDICTION_SYMBOL
+from accuracy_summary import rebuild_summary
+
+# copies the date-keyed table into the (symbol, date) layout the reader queries.
+# LEGACY_TABLE is read, DYNAMODB_TABLE is created if missing and filled, items already there are overwritten
+
+def create_predictions_table(dynamodb, table_name):
+    existing = [t.name for t in dynamodb.tables.all()]
+    if table_name in existing:
+        print(f"table {table_name} exists")
+        return dynamodb.Table(table_name)
+
+    print(f"creating table {table_name}...")
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {'AttributeName': 'symbol', 'KeyType': 'HASH'},
+            {'AttributeName': 'date', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'symbol', 'AttributeType': 'S'},
+            {'AttributeName': 'date', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.wait_until_exists()
+    return table
+
+def migrate(legacy_table_name, table_name, symbol=PREDICTION_SYMBOL):
+    dynamodb = boto3.resource('dynamodb')
+    legacy_table = dynamodb.Table(legacy_table_name)
+    table = create_predictions_table(dynamodb, table_name)
+
+    copied = 0
+    kwargs = {}
+    with table.batch_writer() as batch:
+        while True:
+            response = legacy_table.scan(**kwargs)
+            for item in response.get('Items', []):
+                batch.put_item(Item={**item, 'symbol': symbol})
+                copied += 1
+
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+
+    print(f"copied {copied} predictions from {legacy_table_name} to {table_name}")
+    rebuild_summary(table)
+    return copied
+
+if __name__ == "__main__":
+    migrate(
+        os.environ.get('LEGACY_TABLE', 'VolatilityPredictions'),
+        os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
+    )
@@ -0,0 +1,212 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+# loaded models kept per container, older versions stay until evicted
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', '2'))
+# a cached s3 model is served this long before its etag is checked again
+MODEL_REVALIDATE_SECONDS = float(os.environ.get('MODEL_REVALIDATE_SECONDS', '60'))
+# artifacts survive here across handler re-inits on the same sandbox, empty disables it
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', '/tmp/model_cache')
+
+
+def is_not_modified(error):
+    # botocore raises a 304 from a conditional get as a ClientError
+    response = getattr(error, 'response', None) or {}
+    return (response.get('Error', {}).get('Code') in ('304', 'NotModified')
+            or response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304)
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def verify_s3_body(body, response):
+    # prefer the sha256 checksum s3 stores when the object was uploaded with one, otherwise a
+    # single part etag is the md5 of the body (multipart and kms etags are not)
+    checksum = response.get('ChecksumSHA256')
+    if checksum:
+        if base64.b64encode(hashlib.sha256(body).digest()).decode() != checksum:
+            raise ValueError("model download does not match its sha256 checksum")
+        return
+    etag = response.get('ETag', '').strip('"')
+    if len(etag) == 32 and '-' not in etag and response.get('ServerSideEncryption') != 'aws:kms':
+        if hashlib.md5(body).hexdigest() != etag:
+            raise ValueError("model download does not match its etag")
+
+
+class ModelRegistry:
+    # models keyed by (bucket, key, etag) for s3 and (None, path, mtime-size) for local files
+
+    def __init__(self, deserialize, get_s3_client, max_models=MODEL_CACHE_SIZE,
+                 revalidate_seconds=MODEL_REVALIDATE_SECONDS, cache_dir=MODEL_CACHE_DIR):
+        self.deserialize = deserialize
+        self.get_s3_client = get_s3_client
+        self.max_models = max_models
+        self.revalidate_seconds = revalidate_seconds
+        self.cache_dir = cache_dir
+        # most recently used last
+        self.models = OrderedDict()
+        # (bucket, key) -> (current version, monotonic time of the last check)
+        self.versions = {}
+        self.counters = {
+            'hits': 0, 'misses': 0, 'revalidations': 0, 'not_modified': 0,
+            'swaps': 0, 'disk_hits': 0, 'evictions': 0, 'checksum_failures': 0
+        }
+
+    def log(self, event, bucket, key, version):
+        source = f"s3://{bucket}/{key}" if bucket else key
+        print(json.dumps({'model_cache': event, 'model': source, 'version': version, **self.counters}))
+
+    def hit(self, bucket, key, version):
+        self.counters['hits'] += 1
+        self.models.move_to_end((bucket, key, version))
+        self.log('hit', bucket, key, version)
+        return self.models[(bucket, key, version)]
+
+    def store(self, bucket, key, version, model, event):
+        self.models[(bucket, key, version)] = model
+        self.models.move_to_end((bucket, key, version))
+        self.versions[(bucket, key)] = (version, time.monotonic())
+        while len(self.models) > self.max_models:
+            self.models.popitem(last=False)
+            self.counters['evictions'] += 1
+        self.log(event, bucket, key, version)
+        return model
+
+    def get_object(self, bucket, key, etag=None):
+        # None when the object still has this etag
+        kwargs = {'Bucket': bucket, 'Key': key, 'ChecksumMode': 'ENABLED'}
+        if etag:
+            kwargs['IfNoneMatch'] = etag
+        try:
+            return self.get_s3_client().get_object(**kwargs)
+        except Exception as e:
+            if etag and is_not_modified(e):
+                return None
+            raise
+
+    def get_s3(self, bucket, key):
+        current = self.versions.get((bucket, key))
+        if current is not None and (bucket, key, current[0]) in self.models:
+            etag, checked = current
+            if time.monotonic() - checked < self.revalidate_seconds:
+                return self.hit(bucket, key, etag)
+
+            self.counters['revalidations'] += 1
+            response = self.get_object(bucket, key, etag)
+            if response is None:
+                self.counters['not_modified'] += 1
+                self.versions[(bucket, key)] = (etag, time.monotonic())
+                return self.hit(bucket, key, etag)
+            # the key points at a new object, load it next to the old one
+            self.counters['swaps'] += 1
+            return self.load_s3(bucket, key, response, 'swap')
+
+        cached = self.read_disk(bucket, key)
+        response = self.get_object(bucket, key, cached['etag'] if cached else None)
+        if response is None:
+            self.counters['disk_hits'] += 1
+            print(f"loading model from {self.entry_dir(bucket, key)}")
+            model = self.deserialize(key, cached['body'], cached['sidecars'].__getitem__)
+            return self.store(bucket, key, cached['etag'], model, 'disk_hit')
+        return self.load_s3(bucket, key, response, 'miss')
+
+    def load_s3(self, bucket, key, response, event):
+        self.counters['misses'] += 1
+        print(f"loading model from s3://{bucket}/{key}")
+        body = response['Body'].read()
+        try:
+            verify_s3_body(body, response)
+        except ValueError:
+            self.counters['checksum_failures'] += 1
+            raise
+
+        # native models read their manifest through this, it is cached on disk with the model
+        sidecars = {}
+
+        def read_sidecar(sidecar_key):
+            sidecars[sidecar_key] = self.get_s3_client().get_object(Bucket=bucket, Key=sidecar_key)['Body'].read()
+            return sidecars[sidecar_key]
+
+        model = self.deserialize(key, body, read_sidecar)
+        self.write_disk(bucket, key, response['ETag'], body, sidecars)
+        print("model loaded")
+        return self.store(bucket, key, response['ETag'], model, event)
+
+    def get_local(self, path):
+        stat = os.stat(path)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}"
+        if (None, path, version) in self.models:
+            return self.hit(None, path, version)
+
+        self.counters['misses'] += 1
+        print(f"loading model from {path}")
+        with open(path, 'rb') as f:
+            model_bytes = f.read()
+
+        def read_local(sidecar_path):
+            with open(sidecar_path, 'rb') as f:
+                return f.read()
+
+        model = self.deserialize(path, model_bytes, read_local)
+        print("model loaded")
+        return self.store(None, path, version, model, 'miss')
+
+    def entry_dir(self, bucket, key):
+        return os.path.join(self.cache_dir, sha256_hex(f"{bucket}/{key}".encode())[:24])
+
+    def read_disk(self, bucket, key):
+        if not self.cache_dir:
+            return None
+        entry = self.entry_dir(bucket, key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            with open(os.path.join(entry, 'model.bin'), 'rb') as f:
+                body = f.read()
+            sidecars = {}
+            for i, (sidecar_key, checksum) in enumerate(meta['sidecars']):
+                with open(os.path.join(entry, f'sidecar_{i}.bin'), 'rb') as f:
+                    sidecars[sidecar_key] = f.read()
+                if sha256_hex(sidecars[sidecar_key]) != checksum:
+                    raise ValueError(f"sidecar {sidecar_key} does not match its checksum")
+            if sha256_hex(body) != meta['sha256']:
+                raise ValueError("model file does not match its checksum")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            # a torn or corrupt entry is dropped and downloaded again
+            self.counters['checksum_failures'] += 1
+            print(f"ignoring disk cache for s3://{bucket}/{key}: {str(e)}")
+            return None
+        return {'etag': meta['etag'], 'body': body, 'sidecars': sidecars}
+
+    def write_disk(self, bucket, key, etag, body, sidecars):
+        if not self.cache_dir:
+            return
+        entry = self.entry_dir(bucket, key)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            # meta.json is replaced last, so a reader never pairs it with half written files
+            meta_path = os.path.join(entry, 'meta.json')
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            files = [('model.bin', body)] + [(f'sidecar_{i}.bin', data) for i, data in enumerate(sidecars.values())]
+            for name, data in files:
+                with open(os.path.join(entry, name + '.tmp'), 'wb') as f:
+                    f.write(data)
+                os.replace(os.path.join(entry, name + '.tmp'), os.path.join(entry, name))
+            meta = {
+                'bucket': bucket, 'key': key, 'etag': etag, 'sha256': sha256_hex(body),
+                'sidecars': [[sidecar_key, sha256_hex(data)] for sidecar_key, data in sidecars.items()]
+            }
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + '.tmp', meta_path)
+        except OSError as e:
+            # /tmp full or read only, the in-memory cache still works
+            print(f"could not cache model on disk: {str(e)}")
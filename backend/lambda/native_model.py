@@ -0,0 +1,53 @@
+import json
+import os
+import numpy as np
+
+NATIVE_MODEL_EXTENSIONS = ('.ubj', '.json')
+
+
+def is_native_model(path):
+    return path.endswith(NATIVE_MODEL_EXTENSIONS)
+
+
+def manifest_path_for(model_path):
+    # same naming as feature_engineering.export_native_model, works for s3 keys too
+    return os.path.splitext(model_path)[0] + '.manifest.json'
+
+
+class NativeModel:
+    # bare xgboost booster behind the predict_proba interface the handler uses
+
+    def __init__(self, booster, manifest):
+        self.booster = booster
+        self.manifest = manifest
+        self.feature_names = manifest['feature_names']
+        self.thresholds = manifest['thresholds']
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.feature_names))
+        class_one = self.booster.inplace_predict(X)
+        return np.column_stack([1.0 - class_one, class_one])
+
+
+def validate_manifest(manifest):
+    # feature_utils pulls in pandas, keep it off the import path of this module
+    from feature_utils import get_feature_columns
+
+    feature_cols = get_feature_columns()
+    if manifest.get('feature_names') != feature_cols:
+        raise ValueError("model manifest feature order does not match get_feature_columns()")
+    if manifest.get('objective') != 'binary:logistic':
+        raise ValueError(f"unsupported model objective: {manifest.get('objective')}")
+
+
+def load_native_model(model_bytes, manifest):
+    if isinstance(manifest, (bytes, str)):
+        manifest = json.loads(manifest)
+    validate_manifest(manifest)
+
+    # only xgboost itself is needed here, not the sklearn wrapper
+    import xgboost
+
+    booster = xgboost.Booster()
+    booster.load_model(bytearray(model_bytes))
+    return NativeModel(booster, manifest)
@@ -0,0 +1,199 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'profiles')
+)
+PROFILE_MODES = ('cprofile', 'sample')
+# the summary ranks every function of these files plus the target builder of feature_engineering.py
+INDICATOR_FILES = ('feature_utils.py', 'feature_kernels.py')
+INDICATOR_FUNCTIONS = ('create_target_variable',)
+SAMPLE_INTERVAL = 0.001
+# stacks below this many microseconds are left out of a collapsed file made from cProfile
+MIN_STACK_US = 1
+
+
+def profile_mode(mode=None):
+    # explicit mode, else FEATURE_PROFILE from the environment, None means no profiling
+    mode = mode or os.environ.get('FEATURE_PROFILE') or None
+    if mode is not None and mode not in PROFILE_MODES:
+        raise ValueError(f"unknown profile mode {mode}, expected one of {', '.join(PROFILE_MODES)}")
+    return mode
+
+
+def frame_label(filename, name):
+    if filename == '~':
+        # builtins, e.g. <method 'reduce' of 'numpy.ufunc' objects>
+        return name
+    return f"{os.path.basename(filename)}:{name}"
+
+
+def is_indicator(filename, name):
+    return os.path.basename(filename) in INDICATOR_FILES or name in INDICATOR_FUNCTIONS
+
+
+class StackSampler:
+    # statistical profiler: a daemon thread records the stack of the profiled thread every
+    # `interval` seconds. counts are exact stacks, so the collapsed output needs no guessing,
+    # the time per function is its share of the samples
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.running = False
+
+    def start(self):
+        self.target = threading.get_ident()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                # root first
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        return {';'.join(frame_label(*frame) for frame in stack): count for stack, count in self.stacks.items()}
+
+    def inclusive(self):
+        # {(file, name): (samples with it anywhere on the stack, samples with it on top)}
+        totals = {}
+        for stack, count in self.stacks.items():
+            for frame in set(stack):
+                total, own = totals.get(frame, (0, 0))
+                totals[frame] = (total + count, own + (count if frame == stack[-1] else 0))
+        return totals
+
+
+def pstats_collapsed(stats):
+    # collapsed stacks in microseconds from cProfile's caller graph. cProfile keeps edges, not
+    # stacks, so a function called from several places splits its time over them in proportion
+    # to the edge times, the same approximation flameprof and gprof2dot make
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge[3]
+    roots = [func for func, entry in stats.items() if not entry[4]]
+    collapsed = {}
+
+    def visit(func, path, share):
+        _, _, tt, ct, _ = stats[func]
+        path = path + [frame_label(func[0], func[2])]
+        self_us = int(tt * share * 1e6)
+        if self_us >= MIN_STACK_US:
+            key = ';'.join(path)
+            collapsed[key] = collapsed.get(key, 0) + self_us
+        for callee, edge_ct in callees.get(func, {}).items():
+            callee_ct = stats[callee][3]
+            if callee_ct <= 0 or frame_label(callee[0], callee[2]) in path:
+                continue
+            child_share = edge_ct * share / callee_ct
+            if edge_ct * share * 1e6 >= MIN_STACK_US:
+                visit(callee, path, child_share)
+
+    for root in roots:
+        visit(root, [], 1.0)
+    return collapsed
+
+
+def indicator_rows(costs, rows, wall_ms):
+    # costs: {(file, name): (calls, total ms, self ms)}, ranked by total
+    ranked = []
+    for (filename, name), (calls, total_ms, self_ms) in costs.items():
+        if is_indicator(filename, name):
+            ranked.append({
+                'function': name, 'calls': calls, 'total_ms': total_ms, 'self_ms': self_ms,
+                'ms_per_1k_rows': total_ms / rows * 1000 if rows else 0.0,
+                'share': total_ms / wall_ms if wall_ms else 0.0,
+            })
+    return sorted(ranked, key=lambda r: -r['total_ms'])
+
+
+def format_summary(name, mode, rows, wall_ms, ranked, extra=''):
+    lines = [f"profile {name} ({mode}): {rows} rows in {wall_ms:.1f} ms{extra}"]
+    lines.append(f"  {'function':<32}{'calls':>8}{'total ms':>11}{'self ms':>10}{'ms/1k rows':>12}{'share':>8}")
+    for r in ranked:
+        calls = '-' if r['calls'] is None else r['calls']
+        lines.append(f"  {r['function']:<32}{calls:>8}{r['total_ms']:>11.2f}{r['self_ms']:>10.2f}{r['ms_per_1k_rows']:>12.3f}{r['share']:>8.1%}")
+    return '\n'.join(lines)
+
+
+def write_collapsed(path, collapsed):
+    with open(path, 'w') as f:
+        for stack, count in sorted(collapsed.items()):
+            f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(name, rows, mode=None, output_dir=PROFILE_DIR):
+    # profiles the block when a mode is given or FEATURE_PROFILE is set, otherwise does nothing.
+    # writes <name>-<time>.collapsed (flamegraph.pl / speedscope input), .pstats with cprofile and
+    # .txt with the ranking of the feature functions, which is also printed. the yielded dict
+    # gets the files and the ranking after the block
+    mode = profile_mode(mode)
+    result = {}
+    if mode is None:
+        yield result
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    profiler = cProfile.Profile() if mode == 'cprofile' else StackSampler()
+    start = time.perf_counter()
+    if mode == 'cprofile':
+        profiler.enable()
+    else:
+        profiler.start()
+    try:
+        yield result
+    finally:
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        if mode == 'cprofile':
+            result['pstats'] = base + '.pstats'
+            profiler.dump_stats(result['pstats'])
+            stats = pstats.Stats(profiler).stats
+            collapsed = pstats_collapsed(stats)
+            costs = {(func[0], func[2]): (entry[1], entry[3] * 1000, entry[2] * 1000) for func, entry in stats.items()}
+            extra = ''
+        else:
+            collapsed = profiler.collapsed()
+            ms_per_sample = wall_ms / max(profiler.samples, 1)
+            costs = {frame: (None, total * ms_per_sample, own * ms_per_sample) for frame, (total, own) in profiler.inclusive().items()}
+            extra = f", {profiler.samples} samples"
+
+        result['collapsed'] = base + '.collapsed'
+        write_collapsed(result['collapsed'], collapsed)
+        result['ranking'] = indicator_rows(costs, rows, wall_ms)
+        result['wall_ms'] = wall_ms
+        summary = format_summary(name, mode, rows, wall_ms, result['ranking'], extra)
+        result['summary'] = base + '.txt'
+        with open(result['summary'], 'w') as f:
+            f.write(summary + '\n')
+        print(summary)
+        print(f"profile written to {base}.*")
@@ -1,15 +1,42 @@
+import base64
+import hashlib
 import json
+import re
 import os
-from datetime import datetime, timedelta
+import time
+from collections import OrderedDict
 from decimal import Decimal
 import boto3
-from boto3.dynamodb.conditions import Key
+from dynamodb_helper import ACCURACY_SUMMARY_KEY, PREDICTIONS_TABLE, PREDICTION_SYMBOL, query_predictions_page, accuracy_metrics_from_summary
+from timing import PhaseTimer, instrument_client
 
-# dynamodb client
+# dynamodb client, its calls are timed into the metrics line of each request
 dynamodb = boto3.resource('dynamodb')
-table_name = os.environ.get('DYNAMODB_TABLE', 'VolatilityPredictions')
+instrument_client(dynamodb.meta.client)
+table_name = os.environ.get('DYNAMODB_TABLE', PREDICTIONS_TABLE)
 table = dynamodb.Table(table_name)
 
+# rendered responses per container, keyed by path + query params. an entry is reused while the
+# newest prediction is unchanged and it is younger than RESPONSE_CACHE_SECONDS
+RESPONSE_CACHE_SECONDS = int(os.environ.get('RESPONSE_CACHE_SECONDS', '300'))
+RESPONSE_CACHE_SIZE = 128
+# the data version itself is reused this long, requests inside it skip dynamodb entirely and a
+# write shows up at most this late
+VERSION_CACHE_SECONDS = float(os.environ.get('VERSION_CACHE_SECONDS', '5'))
+# metric dimension per route, anything else is counted as 'other'
+ENDPOINTS = ('/predictions/latest', '/predictions/range', '/predictions/all', '/analytics/accuracy')
+cold_start = True
+# what api gateway and the browser may cache without asking again
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', '60'))
+
+response_cache = OrderedDict()
+version_cache = {}
+
+FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+class BadRequest(ValueError):
+    pass
+
 def decimal_to_float(obj):
     if isinstance(obj, list):
         return [decimal_to_float(i) for i in obj]
@@ -20,7 +47,18 @@ def decimal_to_float(obj):
     else:
         return obj
 
-def transform_prediction(item):
+def transform_prediction(item, fields=None):
+    # a projected item (fields=...) only gets the attributes it has normalized, nothing is filled in
+    if fields is not None:
+        transformed = dict(item)
+        if 'prediction' in item:
+            transformed['prediction'] = int(item['prediction'])
+        if 'confidence_score' in item:
+            transformed['confidence_score'] = float(item['confidence_score'])
+        if isinstance(item.get('prediction_text'), str):
+            transformed['prediction_text'] = item['prediction_text'].lower()
+        return transformed
+
     confidence = float(item.get('confidence_score', item.get('confidence', 0)))
     prediction = int(item.get('prediction', 0))
 
@@ -48,7 +86,120 @@ def transform_prediction(item):
 
     return transformed
 
+def get_data_version():
+    # the prediction lambda saves the new day last, so its date + timestamp change once per finished
+    # run. the summary revision covers every other write: verifications, backfills and rebuilds
+    items, _, consumed = query_predictions_page(table, limit=1, fields=['date', 'timestamp'])
+    response = table.get_item(Key=ACCURACY_SUMMARY_KEY, ProjectionExpression='revision', ReturnConsumedCapacity='TOTAL')
+    consumed += response.get('ConsumedCapacity', {}).get('CapacityUnits', 0.0)
+    revision = response.get('Item', {}).get('revision', 0)
+    if not items:
+        return f"empty|{revision}", consumed
+    return f"{items[0]['date']}|{items[0].get('timestamp', '')}|{revision}", consumed
+
+def get_cached_data_version():
+    # (version, consumed read units), 0 units when the cached version is still fresh
+    if version_cache and time.monotonic() - version_cache['stored'] < VERSION_CACHE_SECONDS:
+        return version_cache['version'], 0.0
+    version, consumed = get_data_version()
+    version_cache.update(version=version, stored=time.monotonic())
+    return version, consumed
+
+def encode_cursor(last_key):
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True).encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise BadRequest('invalid cursor')
+    if not isinstance(last_key, dict) or last_key.get('symbol') != PREDICTION_SYMBOL or not isinstance(last_key.get('date'), str):
+        raise BadRequest('invalid cursor')
+    return {'symbol': last_key['symbol'], 'date': last_key['date']}
+
+def parse_fields(value):
+    # comma separated attribute names, date is always included so pages stay ordered client side
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not all(FIELD_NAME.match(field) for field in fields):
+        raise BadRequest('invalid fields')
+    return ['date'] + [field for field in dict.fromkeys(fields) if field != 'date']
+
+def parse_limit(value, default):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest('invalid limit')
+    if limit < 1:
+        raise BadRequest('invalid limit')
+    return limit
+
+def make_etag(version, cache_key):
+    return '"' + hashlib.sha1(repr((version, cache_key)).encode()).hexdigest()[:20] + '"'
+
+def get_request_header(event, name):
+    # api gateway passes headers as sent, browsers and proxies differ in case
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def render(path, query_params, headers):
+    # returns (json body, next cursor, consumed read units), or an error response that is never cached
+    next_key = None
+    if path.endswith('/predictions/latest'):
+        result, consumed = get_latest_prediction()
+    elif path.endswith('/predictions/range'):
+        start_date = query_params.get('start')
+        end_date = query_params.get('end')
+        if not start_date or not end_date:
+            return error_response('missing start or end date', 400, headers)
+        result, next_key, consumed = get_predictions_range(
+            start_date, end_date, parse_limit(query_params.get('limit'), None),
+            parse_fields(query_params.get('fields')), decode_cursor(query_params.get('cursor'))
+        )
+    elif path.endswith('/predictions/all'):
+        result, next_key, consumed = get_all_predictions(
+            parse_limit(query_params.get('limit'), 90),
+            parse_fields(query_params.get('fields')), decode_cursor(query_params.get('cursor'))
+        )
+    elif path.endswith('/analytics/accuracy'):
+        result, consumed = get_accuracy_metrics()
+    else:
+        return error_response('not found', 404, headers)
+
+    return json.dumps(decimal_to_float(result)), encode_cursor(next_key), consumed
+
+def endpoint_name(http_method, path):
+    if http_method == 'OPTIONS':
+        return 'options'
+    return next((endpoint.strip('/') for endpoint in ENDPOINTS if path.endswith(endpoint)), 'other')
+
 def lambda_handler(event, context):
+    # every request logs one metrics line, see timing.py
+    global cold_start
+
+    timer = PhaseTimer().activate()
+    response = None
+    try:
+        response = handle_request(event, timer)
+        return response
+    finally:
+        timer.dimensions['endpoint'] = endpoint_name(event.get('httpMethod', ''), event.get('path', ''))
+        timer.properties['status_code'] = response['statusCode'] if response else 500
+        if context is not None and hasattr(context, 'aws_request_id'):
+            timer.properties['request_id'] = context.aws_request_id
+        timer.report('reader', cold_start=cold_start)
+        cold_start = False
+
+def handle_request(event, timer):
     http_method = event.get('httpMethod', '')
     path = event.get('path', '')
     query_params = event.get('queryStringParameters') or {}
@@ -56,8 +207,9 @@ def lambda_handler(event, context):
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,X-Api-Key',
-        'Access-Control-Allow-Methods': 'GET,OPTIONS'
+        'Access-Control-Allow-Headers': 'Content-Type,X-Api-Key,If-None-Match',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag,X-Next-Cursor,X-Consumed-Capacity'
     }
 
     if http_method == 'OPTIONS':
@@ -68,117 +220,78 @@ def lambda_handler(event, context):
         }
 
     try:
-        if path.endswith('/predictions/latest'):
-            result = get_latest_prediction()
-        elif path.endswith('/predictions/range'):
-            start_date = query_params.get('start')
-            end_date = query_params.get('end')
-            if not start_date or not end_date:
-                return error_response('missing start or end date', 400, headers)
-            result = get_predictions_range(start_date, end_date)
-        elif path.endswith('/predictions/all'):
-            limit = int(query_params.get('limit', 90))
-            result = get_all_predictions(limit)
-        elif path.endswith('/analytics/accuracy'):
-            result = get_accuracy_metrics()
+        cache_key = (path, tuple(sorted(query_params.items())))
+        with timer.phase('version'):
+            version, consumed = get_cached_data_version()
+        etag = make_etag(version, cache_key)
+        cache_headers = {**headers, 'ETag': etag, 'Cache-Control': f'public, max-age={CACHE_MAX_AGE}'}
+
+        if get_request_header(event, 'If-None-Match') == etag:
+            return {
+                'statusCode': 304,
+                'headers': cache_headers,
+                'body': ''
+            }
+
+        cached = response_cache.get(cache_key)
+        if cached and cached['version'] == version and time.monotonic() - cached['stored'] < RESPONSE_CACHE_SECONDS:
+            response_cache.move_to_end(cache_key)
+            body, next_cursor = cached['body'], cached['next_cursor']
+            cache_headers['X-Cache'] = 'hit'
         else:
-            return error_response('not found', 404, headers)
+            with timer.phase('render'):
+                rendered = render(path, query_params, headers)
+            if isinstance(rendered, dict):
+                return rendered
+            body, next_cursor, render_consumed = rendered
+            consumed += render_consumed
+            response_cache[cache_key] = {'version': version, 'stored': time.monotonic(), 'body': body, 'next_cursor': next_cursor}
+            response_cache.move_to_end(cache_key)
+            while len(response_cache) > RESPONSE_CACHE_SIZE:
+                response_cache.popitem(last=False)
+            cache_headers['X-Cache'] = 'miss'
+        timer.properties['cache'] = cache_headers['X-Cache']
+
+        # read units this call used, including the version check
+        cache_headers['X-Consumed-Capacity'] = f'{consumed:g}'
+        if next_cursor:
+            cache_headers['X-Next-Cursor'] = next_cursor
 
         return {
             'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(decimal_to_float(result))
+            'headers': cache_headers,
+            'body': body
         }
 
+    except BadRequest as e:
+        return error_response(str(e), 400, headers)
     except Exception as e:
         print(f"error: {str(e)}")
         return error_response(str(e), 500, headers)
 
 def get_latest_prediction():
-    response = table.scan()
-    items = response.get('Items', [])
+    items, _, consumed = query_predictions_page(table, limit=1)
 
     if not items:
         raise Exception('no predictions found')
 
-    items.sort(key=lambda x: x['date'], reverse=True)
-    return transform_prediction(items[0])
+    return transform_prediction(items[0]), consumed
 
-def get_predictions_range(start_date, end_date):
-    response = table.scan(
-        FilterExpression=Key('date').between(start_date, end_date)
+def get_predictions_range(start_date, end_date, limit=None, fields=None, start_key=None):
+    items, next_key, consumed = query_predictions_page(
+        table, limit=limit, ascending=True, start_date=start_date, end_date=end_date, fields=fields, start_key=start_key
     )
+    return [transform_prediction(item, fields) for item in items], next_key, consumed
 
-    items = response.get('Items', [])
-    items.sort(key=lambda x: x['date'])
-
-    return [transform_prediction(item) for item in items]
-
-def get_all_predictions(limit=90):
-    response = table.scan()
-    items = response.get('Items', [])
-
-    items.sort(key=lambda x: x['date'], reverse=True)
-
-    return [transform_prediction(item) for item in items[:limit]]
+def get_all_predictions(limit=90, fields=None, start_key=None):
+    items, next_key, consumed = query_predictions_page(table, limit=limit, fields=fields, start_key=start_key)
+    return [transform_prediction(item, fields) for item in items], next_key, consumed
 
 def get_accuracy_metrics():
-    response = table.scan()
-    items = response.get('Items', [])
-
-    verified = [item for item in items if 'is_correct' in item]
-
-    if not verified:
-        return {
-            'total_predictions': 0,
-            'correct_predictions': 0,
-            'accuracy_rate': 0.0,
-            'by_confidence': {
-                'high': {'total': 0, 'correct': 0, 'rate': 0.0},
-                'medium': {'total': 0, 'correct': 0, 'rate': 0.0},
-                'low': {'total': 0, 'correct': 0, 'rate': 0.0}
-            },
-            'recent_30d_accuracy': 0.0,
-            'current_streak': 0
-        }
-
-    total = len(verified)
-    correct = sum(1 for item in verified if item['is_correct'])
-    accuracy_rate = correct / total if total > 0 else 0.0
-
-    by_confidence = {}
-    for level in ['high', 'medium', 'low']:
-        level_items = [item for item in verified if item.get('confidence_level') == level]
-        level_correct = sum(1 for item in level_items if item['is_correct'])
-        level_total = len(level_items)
-        by_confidence[level] = {
-            'total': level_total,
-            'correct': level_correct,
-            'rate': level_correct / level_total if level_total > 0 else 0.0
-        }
-
-    thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    recent = [item for item in verified if item['date'] >= thirty_days_ago]
-    recent_correct = sum(1 for item in recent if item['is_correct'])
-    recent_total = len(recent)
-    recent_accuracy = recent_correct / recent_total if recent_total > 0 else 0.0
-
-    sorted_items = sorted(verified, key=lambda x: x['date'], reverse=True)
-    current_streak = 0
-    for item in sorted_items:
-        if item['is_correct']:
-            current_streak += 1
-        else:
-            break
-
-    return {
-        'total_predictions': total,
-        'correct_predictions': correct,
-        'accuracy_rate': accuracy_rate,
-        'by_confidence': by_confidence,
-        'recent_30d_accuracy': recent_accuracy,
-        'current_streak': current_streak
-    }
+    # kept up to date by dynamodb_helper.update_prediction_accuracy, one read however many predictions there are
+    response = table.get_item(Key=ACCURACY_SUMMARY_KEY, ReturnConsumedCapacity='TOTAL')
+    consumed = response.get('ConsumedCapacity', {}).get('CapacityUnits', 0.0)
+    return accuracy_metrics_from_summary(response.get('Item')), consumed
 
 def error_response(message, status_code, headers):
     return {
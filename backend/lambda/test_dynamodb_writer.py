@@ -0,0 +1,171 @@
+import os
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import json
+import boto3
+import pandas as pd
+from moto import mock_aws
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+import dynamodb_helper
+from dynamodb_helper import BatchPredictionWriter, query_predictions, recent_cutoff, update_prediction_accuracy, ACCURACY_SUMMARY_KEY
+from accuracy_summary import check_summary
+from migrate_predictions_table import create_predictions_table
+from market_store import load_market, to_records
+
+
+class FlakyClient:
+    # hands back part of every batch as unprocessed, like a throttled table
+    def __init__(self, client, keep=7):
+        self.client = client
+        self.keep = keep
+        self.calls = 0
+
+    def batch_write_item(self, RequestItems):
+        self.calls += 1
+        (table_name, requests), = RequestItems.items()
+        self.client.batch_write_item(RequestItems={table_name: requests[:self.keep]})
+        rest = requests[self.keep:]
+        return {'UnprocessedItems': {table_name: rest} if rest else {}}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class FailingDateClient:
+    # refuses the accuracy transaction of one date, like a table that went away mid batch
+    def __init__(self, client, date):
+        self.client = client
+        self.date = date
+
+    def transact_write_items(self, TransactItems):
+        if TransactItems[0]['Update']['Key']['date'] == self.date:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'refused'}}, 'TransactWriteItems')
+        return self.client.transact_write_items(TransactItems=TransactItems)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def write_days(writer, dates, outcomes):
+    for i, date in enumerate(dates):
+        writer.put_prediction(date, 1, 'volatility will increase', 0.6, ['high', 'medium', 'low'][i % 3], {'rsi': 50.0})
+    for date, correct in zip(dates[:-1], outcomes):
+        writer.verify(date, 0.1, 1 if correct else 0, correct, None)
+    return writer.flush()
+
+
+def test_batch_writer_flushes_and_retries(n_dates=60, table_name='VolatilityPredictionsBySymbol'):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=n_dates)]
+    outcomes = [i % 5 != 0 for i in range(n_dates - 1)]
+
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        table = create_predictions_table(boto3.resource('dynamodb'), table_name)
+
+        delays = []
+        writer = BatchPredictionWriter(sleep=delays.append)
+        writer.client = FlakyClient(writer.client)
+        result = write_days(writer, dates, outcomes)
+
+        assert result.ok and result.written == n_dates and result.verified == n_dates - 1
+        # 25 + 25 + 10 puts, 7 at a time
+        assert writer.client.calls == 4 + 4 + 2 and result.retries == len(delays) == 7
+        assert [item['date'] for item in query_predictions(table, ascending=True)] == dates
+        assert check_summary(table)
+
+        # saving and verifying the same days again changes nothing
+        summary = table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']
+        again = write_days(BatchPredictionWriter(sleep=delays.append), dates, outcomes)
+        assert again.ok and again.verified == 0 and again.already_verified == n_dates - 1
+        # only the revision moves, the predictions were written again
+        after = table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']
+        assert after.pop('revision') > summary.pop('revision') and after == summary
+        assert all('is_correct' in item for item in query_predictions(table)[1:])
+
+
+def test_batch_mode_persists_through_writer(symbol='SPY', model_path='../models/xgboost_tuned.npz',
+                                            start_date='2024-10-01', end_date='2024-12-31', table_name='VolatilityPredictionsBySymbol'):
+    from lambda_handler import lambda_handler
+
+    data = to_records(load_market(symbol))
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        table = create_predictions_table(boto3.resource('dynamodb'), table_name)
+
+        result = lambda_handler({
+            'local_model_path': model_path,
+            'data': data,
+            'start_date': start_date,
+            'end_date': end_date
+        }, None)
+        body = json.loads(result['body'])
+
+        assert result['statusCode'] == 200 and body['persisted']['ok']
+        assert body['persisted']['written'] == body['count']
+        assert body['persisted']['verified'] == body['count'] - 1
+        assert [item['date'] for item in query_predictions(table, ascending=True)] == [p['date'] for p in body['predictions']]
+        assert check_summary(table)
+
+
+def test_recent_keeps_only_the_window(table_name='VolatilityPredictionsBySymbol'):
+    # a summary grown by an old backfill, then a backfill of history and the last 60 days
+    history = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2019-01-01', periods=250)]
+    latest = [d.strftime('%Y-%m-%d') for d in pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=60)]
+    cutoff = recent_cutoff()
+
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        table = create_predictions_table(boto3.resource('dynamodb'), table_name)
+        table.put_item(Item={**dynamodb_helper.empty_accuracy_summary(), 'recent': {date: True for date in history}})
+
+        outcomes = [i % 4 != 0 for i in range(len(latest))]
+        result = write_days(BatchPredictionWriter(), history[:50] + latest, [True] * 50 + outcomes)
+        assert result.ok and result.verified == 50 + len(latest) - 1
+
+        # the 250 stale dates went out 100 per update, nothing before the cutoff came in
+        recent = table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']['recent']
+        assert set(recent) == {date for date in latest[:-1] if date >= cutoff}
+        assert check_summary(table)
+
+        # a single update removes what aged out as well
+        table.update_item(Key=ACCURACY_SUMMARY_KEY, UpdateExpression='SET recent.#old = :t',
+                          ExpressionAttributeNames={'#old': history[0]}, ExpressionAttributeValues={':t': True})
+        assert update_prediction_accuracy(latest[-1], 0.1, 1, True, 'low')
+        recent = table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']['recent']
+        assert set(recent) == {date for date in latest if date >= cutoff}
+
+
+def test_streak_moves_with_the_counters(n_dates=12, table_name='VolatilityPredictionsBySymbol'):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=n_dates)]
+    outcomes = [i % 4 != 0 for i in range(n_dates - 1)]
+
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        table = create_predictions_table(boto3.resource('dynamodb'), table_name)
+
+        # the newest verification fails: neither its count nor its streak step lands
+        writer = BatchPredictionWriter()
+        writer.client = FailingDateClient(writer.client, dates[-2])
+        result = write_days(writer, dates, outcomes)
+        assert not result.ok and result.verify_failed == 1 and result.verified == n_dates - 2
+        summary = table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']
+        assert summary['latest_verified_date'] == dates[-3] and summary['total'] == n_dates - 2
+        assert check_summary(table)
+
+        # verified later, out of order with older dates again, the streak catches up
+        writer = BatchPredictionWriter()
+        for date, correct in reversed(list(zip(dates[:-1], outcomes))):
+            writer.verify(date, 0.1, 1 if correct else 0, correct, None)
+        result = writer.flush()
+        assert result.ok and result.verified == 1 and result.already_verified == n_dates - 2
+        assert table.get_item(Key=ACCURACY_SUMMARY_KEY)['Item']['latest_verified_date'] == dates[-2]
+        assert check_summary(table)
+
+
+if __name__ == "__main__":
+    test_batch_writer_flushes_and_retries()
+    test_recent_keeps_only_the_window()
+    test_streak_moves_with_the_counters()
+    test_batch_mode_persists_through_writer()
+    print("batch writer ok")
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from feature_chunks import engineer_features_chunked, FeatureColumns
+from feature_utils import engineer_features, get_feature_columns
+from market_store import load_market
+
+
+def minute_bars(chunks, rows=4096, seed=7):
+    # random walk minute bars generated chunk by chunk, the whole history never exists at once
+    rng = np.random.default_rng(seed)
+    last = 100.0
+    for i in range(chunks):
+        close = last * np.exp(np.cumsum(rng.normal(0, 0.0005, rows)))
+        last = close[-1]
+        yield pd.DataFrame({
+            'High': close * 1.0005, 'Low': close * 0.9995, 'Close': close,
+            'Volume': rng.integers(1000, 50000, rows),
+        }, index=pd.date_range('2020-01-01', periods=rows, freq='min', name='Date') + pd.Timedelta(minutes=i * rows))
+
+
+def test_chunks_match_in_memory(symbol='SPY', chunk_sizes=(64, 96, 1024)):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+    expected = engineer_features(df, backend='numpy')[feature_cols].values
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for chunk_rows in chunk_sizes:
+            actual = engineer_features_chunked(df, output_dir, chunk_rows=chunk_rows).read()
+            assert actual.index.equals(df.index)
+            assert np.array_equal(actual[feature_cols].values, expected, equal_nan=True), chunk_rows
+
+        # input chunks of any size, from a csv and as float32 columns
+        cuts = [0, 5, 70, 71, 500, 2000, len(df)]
+        pieces = [df.iloc[a:b] for a, b in zip(cuts[:-1], cuts[1:])]
+        actual = engineer_features_chunked(pieces, output_dir, chunk_rows=64).read()
+        assert np.array_equal(actual[feature_cols].values, expected, equal_nan=True)
+
+        csv_path = os.path.join(output_dir, 'input.csv')
+        df.to_csv(csv_path)
+        output = engineer_features_chunked(csv_path, output_dir, chunk_rows=128, dtype='float32')
+        actual = output.read()
+        assert (actual.dtypes == np.float32).all()
+        assert np.array_equal(actual.values, expected.astype(np.float32), equal_nan=True)
+        assert os.path.getsize(output.path('rsi', 'float32')) == len(df) * 4
+
+        window = FeatureColumns(output_dir).read('2024-11-02', '2024-12-31', columns=['rsi'])
+        assert window.index.equals(df.loc['2024-11-02':'2024-12-31'].index)
+
+
+def test_memory_does_not_grow_with_input(chunk_rows=4096):
+    # the traced peak of 8 and 32 chunks of minute bars is the same, a step only holds its chunk
+    peaks = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for chunks in (8, 32):
+            tracemalloc.start()
+            engineer_features_chunked(minute_bars(chunks, chunk_rows), output_dir, chunk_rows=chunk_rows, dtype='float32')
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        assert FeatureColumns(output_dir).meta()['rows'] == 32 * chunk_rows
+    assert peaks[1] < peaks[0] * 1.1, peaks
+
+    expected = engineer_features(pd.concat(minute_bars(32, chunk_rows)), backend='numpy')[get_feature_columns()].values
+    with tempfile.TemporaryDirectory() as output_dir:
+        actual = engineer_features_chunked(minute_bars(32, chunk_rows), output_dir, chunk_rows=chunk_rows * 2).read()
+    assert np.array_equal(actual.values, expected, equal_nan=True)
+
+
+def test_rejects_misaligned_chunks_and_unsorted_input(symbol='SPY'):
+    df = load_market(symbol)
+    with tempfile.TemporaryDirectory() as output_dir:
+        for kwargs in ({'chunk_rows': 100}, {'chunk_rows': 32}, {'dtype': 'float16'}):
+            try:
+                engineer_features_chunked(df, output_dir, **kwargs)
+                assert False, kwargs
+            except ValueError:
+                pass
+        try:
+            engineer_features_chunked([df.iloc[500:600], df.iloc[:500]], output_dir, chunk_rows=64)
+            assert False, 'out of order'
+        except ValueError as e:
+            assert 'date order' in str(e)
+
+
+if __name__ == "__main__":
+    test_chunks_match_in_memory()
+    test_memory_does_not_grow_with_input()
+    test_rejects_misaligned_chunks_and_unsorted_input()
+    print("chunked feature tests passed")
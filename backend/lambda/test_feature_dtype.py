@@ -0,0 +1,74 @@
+import pickle
+import tracemalloc
+import numpy as np
+import pandas as pd
+from feature_utils import engineer_features, get_feature_columns
+from feature_kernels import FLOAT32_MAX_RELATIVE_ERROR
+from market_store import load_market
+
+
+def test_float32_within_documented_error(symbol='SPY', model_path='../models/xgboost_tuned.pkl'):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+    expected = engineer_features(df, backend='numpy')[feature_cols].values
+    features = engineer_features(df, backend='numpy', dtype=np.float32)
+    actual = features[feature_cols].to_numpy()
+
+    # one float32 block, on pandas 3 the model input is a view of it
+    assert actual.dtype == np.float32 and actual.flags.f_contiguous
+    assert np.shares_memory(actual, features['returns'].to_numpy())
+    assert np.array_equal(np.isnan(actual), np.isnan(expected))
+
+    mask = ~np.isnan(expected)
+    error = np.abs(actual[mask].astype(np.float64) - expected[mask])
+    assert np.all(error <= FLOAT32_MAX_RELATIVE_ERROR * np.abs(expected[mask]))
+
+    # xgboost rounds the float64 matrix to the same float32 values
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    rows = mask.all(axis=1)
+    assert np.array_equal(model.predict_proba(expected[rows]), model.predict_proba(actual[rows]))
+
+
+def test_pandas_downcast_leaves_input(symbol='SPY'):
+    df = load_market(symbol).tail(500).copy()
+    feature_cols = get_feature_columns()
+    expected = engineer_features(df)[feature_cols].to_numpy().astype(np.float32)
+    assert 'returns' not in df
+
+    result = engineer_features(df, dtype=np.float32, copy=False)
+    assert np.array_equal(result[feature_cols].to_numpy(), expected, equal_nan=True)
+    assert list(result.columns) == list(df.columns) + feature_cols
+    # with a dtype the caller's frame is never written to, float64 copy=False computes on it
+    assert 'returns' not in df
+    engineer_features(df, copy=False)
+    assert 'macd_histogram' in df
+
+    tail = engineer_features(load_market(symbol), backend='numpy', tail=5, dtype=np.float32)
+    assert len(tail) == 5 and (tail[feature_cols].dtypes == np.float32).all()
+
+
+def test_pandas_downcast_peak_memory(rows=200_000):
+    # the float32 block plus the temporaries of one step, the float64 features and a float32 copy
+    # of them (1.5x float64_bytes) never exist at the same time
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    df = pd.DataFrame({'High': close * 1.01, 'Low': close * 0.99, 'Close': close, 'Volume': rng.integers(1, 10**6, rows)},
+                      index=pd.date_range('1900-01-01', periods=rows, name='Date'))
+    float64_bytes = rows * len(get_feature_columns()) * 8
+
+    peaks = {}
+    for dtype in (None, np.float32):
+        tracemalloc.start()
+        features = engineer_features(df, dtype=dtype)
+        peaks[dtype] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del features
+    assert peaks[np.float32] < min(peaks[None], 1.2 * float64_bytes), peaks
+
+
+if __name__ == "__main__":
+    test_float32_within_documented_error()
+    test_pandas_downcast_leaves_input()
+    test_pandas_downcast_peak_memory()
+    print("float32 feature tests passed")
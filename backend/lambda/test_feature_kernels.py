@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from feature_utils import engineer_features, get_feature_columns
+from market_store import load_market
+
+# numpy backend vs pandas: the kernels sum in a different order, values agree to about 1e-9
+# relative (macd_histogram, a difference of emas, is the loosest). atol is scaled by the
+# column's largest value so features that cross zero are compared at their own magnitude
+RTOL = 1e-8
+ATOL = 1e-12
+
+
+def random_walk(rows, seed=11, start=50_000.0):
+    rng = np.random.default_rng(seed)
+    close = start * np.exp(np.cumsum(rng.normal(0.0002, 0.01, rows)))
+    return pd.DataFrame({
+        'Open': close, 'High': close * (1 + rng.uniform(0, 0.01, rows)),
+        'Low': close * (1 - rng.uniform(0, 0.01, rows)), 'Close': close,
+        'Volume': rng.integers(0, 10_000_000, rows),
+    }, index=pd.date_range('1990-01-01', periods=rows, freq='D', name='Date'))
+
+
+def assert_backends_match(df):
+    feature_cols = get_feature_columns()
+    expected = engineer_features(df)
+    actual = engineer_features(df, backend='numpy')
+    assert actual.index.equals(expected.index)
+    assert list(actual.columns) == list(expected.columns)
+
+    expected, actual = expected[feature_cols].to_numpy(), actual[feature_cols].to_numpy()
+    assert np.array_equal(np.isnan(actual), np.isnan(expected))
+    assert np.array_equal(np.isinf(actual), np.isinf(expected))
+    finite = np.isfinite(expected)
+    scale = np.nanmax(np.where(finite, np.abs(expected), np.nan), axis=0, initial=0.0)
+    error = np.abs(np.where(finite, actual - expected, 0.0))
+    bad = error > RTOL * np.abs(np.where(finite, expected, 0.0)) + ATOL * scale
+    assert not bad.any(), [feature_cols[i] for i in np.unique(np.nonzero(bad)[1])]
+
+
+def test_numpy_matches_pandas(symbol='SPY'):
+    assert_backends_match(load_market(symbol))
+    # fewer rows than the longest window, prices far from spy's and zero volume days
+    assert_backends_match(load_market(symbol).head(40))
+    assert_backends_match(random_walk(20_000))
+
+
+if __name__ == "__main__":
+    test_numpy_matches_pandas()
+    print("numpy/pandas feature parity test passed")
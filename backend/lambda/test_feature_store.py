@@ -0,0 +1,60 @@
+import os
+import tempfile
+import numpy as np
+from feature_utils import engineer_features, get_feature_columns
+from feature_store import FeatureStore
+from market_store import load_market
+
+
+def test_appended_rows_match_full_run(symbol='SPY', splits=(1000, 1001, 1100, 2500)):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+    expected = engineer_features(df, backend='numpy')[feature_cols].values
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = FeatureStore(store_dir)
+        for n in splits + (len(df),):
+            actual = store.load(df.iloc[:n])
+            # bit for bit, the tail continues the stored ema state on a block boundary
+            assert np.array_equal(actual[feature_cols].values, expected[:n], equal_nan=True), n
+
+        features_path = store.paths('SPY')['features']
+        assert os.path.getsize(features_path) == len(df) * len(feature_cols) * 8
+
+        # unchanged data is served from the memory map without writing
+        mtime = os.stat(features_path).st_mtime_ns
+        again = store.load(df)
+        assert os.stat(features_path).st_mtime_ns == mtime
+        assert np.array_equal(again[feature_cols].values, expected, equal_nan=True)
+
+
+def test_revised_history_rebuilds(symbol='SPY'):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = FeatureStore(store_dir)
+        held = store.load(df.iloc[:2000])
+        held_expected = engineer_features(df.iloc[:2000], backend='numpy')[feature_cols].values
+
+        # a split adjusted download changes old closes, the stored prefix no longer applies
+        revised = df.copy()
+        revised.iloc[:500, revised.columns.get_loc('Close')] *= 0.5
+        actual = store.load(revised)
+        expected = engineer_features(revised, backend='numpy')[feature_cols].values
+        assert np.array_equal(actual[feature_cols].values, expected, equal_nan=True)
+
+        # a rebuild to fewer rows, frames loaded before keep their own rows
+        store.load(revised.iloc[:300])
+        assert np.array_equal(held[feature_cols].values, held_expected, equal_nan=True)
+        assert np.array_equal(actual[feature_cols].values, expected, equal_nan=True)
+
+        # so does a change to the feature code
+        store.version = 'other'
+        assert store.read_manifest('SPY') is None
+
+
+if __name__ == "__main__":
+    test_appended_rows_match_full_run()
+    test_revised_history_rebuilds()
+    print("feature store tests passed")
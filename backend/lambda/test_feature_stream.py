@@ -0,0 +1,110 @@
+import json
+import numpy as np
+import pandas as pd
+from feature_utils import engineer_features, get_feature_columns
+from feature_stream import StreamingFeatureEngine, stream_features
+from market_store import load_market
+
+
+def assert_close(actual, expected, rtol=1e-9, atol=1e-12):
+    assert (np.isnan(actual) == np.isnan(expected)).all(), "nan layout differs"
+    mask = ~np.isnan(expected)
+    assert np.allclose(actual[mask], expected[mask], rtol=rtol, atol=atol)
+
+
+def test_stream_matches_pandas(symbol='SPY'):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+
+    expected = engineer_features(df)[feature_cols].values
+    actual, _ = stream_features(df)
+
+    assert_close(actual[feature_cols].values, expected)
+
+
+def test_stream_matches_features_csv(symbol='SPY', features_path='../data/SPY_features.csv'):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+
+    saved = pd.read_csv(features_path, index_col='Date', parse_dates=True)
+    actual, _ = stream_features(df)
+
+    assert_close(actual.loc[saved.index, feature_cols].values, saved[feature_cols].values, rtol=1e-8)
+
+
+def test_snapshot_restore(symbol='SPY', split=2000):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+
+    full, _ = stream_features(df)
+
+    engine = StreamingFeatureEngine()
+    engine.update_frame(df.iloc[:split])
+    # the snapshot has to survive a json round trip, that is how the daily job stores it
+    state = json.loads(json.dumps(engine.snapshot()))
+
+    restored = StreamingFeatureEngine.from_snapshot(state)
+    resumed = restored.update_frame(df.iloc[split:], include_previous=True)
+
+    assert resumed.index[0] == df.index[split - 1]
+    assert_close(resumed[feature_cols].values[1:], full[feature_cols].values[split:], rtol=1e-12)
+
+
+def test_overlapping_rows_are_skipped(symbol='SPY', split=200):
+    df = load_market(symbol)
+    feature_cols = get_feature_columns()
+    full, _ = stream_features(df.iloc[:split + 10])
+
+    _, state = stream_features(df.iloc[:split])
+    # a retried push that overlaps the snapshot, the known rows are not counted again
+    restored = StreamingFeatureEngine.from_snapshot(json.loads(json.dumps(state)))
+    resumed = restored.update_frame(df.iloc[split - 10:split + 10], include_previous=True)
+
+    assert restored.bars == split + 10
+    assert resumed.index.is_unique and resumed.index[0] == df.index[split - 1]
+    assert_close(resumed[feature_cols].values[1:], full[feature_cols].values[split:], rtol=1e-12)
+
+    # the same push again changes nothing
+    again = restored.update_frame(df.iloc[split - 10:split + 10])
+    assert len(again) == 0 and restored.bars == split + 10
+
+
+def test_zero_volume_days(symbol='SPY'):
+    # zero volume gives inf and nan in the batch path, the stream divides the same way
+    df = load_market(symbol).iloc[:400].copy()
+    volume = df['Volume'].to_numpy().copy()
+    volume[[100, 101, 150]] = 0
+    volume[200:225] = 0
+    df['Volume'] = volume
+    feature_cols = get_feature_columns()
+
+    expected = engineer_features(df)[feature_cols].values
+    actual, _ = stream_features(df)
+    actual = actual[feature_cols].values
+    assert np.isinf(expected).any() and np.array_equal(np.isinf(actual), np.isinf(expected))
+    assert_close(actual, expected)
+
+
+def test_lambda_rejects_a_push_without_new_bars(symbol='SPY', model_path='../models/xgboost_tuned.npz'):
+    from lambda_handler import lambda_handler
+    from market_store import to_records
+
+    data = to_records(load_market(symbol).iloc[-200:])
+    first = lambda_handler({'local_model_path': model_path, 'data': data, 'return_feature_state': True}, None)
+    assert first['statusCode'] == 200
+    state = json.loads(first['body'])['feature_state']
+
+    retried = lambda_handler({'local_model_path': model_path, 'data': data[-5:], 'feature_state': state}, None)
+    body = json.loads(retried['body'])
+    assert retried['statusCode'] == 409 and body['error'] == 'no new bars'
+    assert body['last_date'] == data[-1]['Date'][:10] and body['feature_state'] == state
+
+
+if __name__ == "__main__":
+    test_stream_matches_pandas()
+    test_stream_matches_features_csv()
+    test_snapshot_restore()
+    test_overlapping_rows_are_skipped()
+    test_zero_volume_days()
+    test_lambda_rejects_a_push_without_new_bars()
+    print("streaming features match the pandas path")
@@ -0,0 +1,70 @@
+import json
+from lambda_handler import lambda_handler
+from market_store import load_market, to_records
+
+
+def test_batch_matches_single_row(symbol='SPY', model_path='../models/xgboost_tuned.pkl',
+                                  start_date='2024-11-01', end_date='2024-12-31'):
+    data = to_records(load_market(symbol))
+    dates = [row['Date'] for row in data]
+
+    result = lambda_handler({
+        'local_model_path': model_path,
+        'data': data,
+        'start_date': start_date,
+        'end_date': end_date
+    }, None)
+    assert result['statusCode'] == 200
+
+    body = json.loads(result['body'])
+    expected_dates = [date for date in dates if start_date <= date <= end_date]
+    assert [p['date'] for p in body['predictions']] == expected_dates
+
+    # each batch row has to be identical to a single-row call that ends on that date
+    for batch_prediction in body['predictions']:
+        position = dates.index(batch_prediction['date'])
+        single = lambda_handler({'local_model_path': model_path, 'data': data[:position + 1]}, None)
+        assert json.loads(single['body']) == batch_prediction
+
+
+def test_batch_skips_dates_without_history(symbol='SPY', model_path='../models/xgboost_tuned.pkl'):
+    data = to_records(load_market(symbol))
+
+    result = lambda_handler({
+        'local_model_path': model_path,
+        'data': data,
+        'dates': [data[10]['Date'], data[-1]['Date']]
+    }, None)
+    body = json.loads(result['body'])
+
+    assert body['skipped'] == [{'date': data[10]['Date'], 'reason': 'not enough history'}]
+    assert [p['date'] for p in body['predictions']] == [data[-1]['Date']]
+
+
+def test_batch_reports_dates_not_in_data(symbol='SPY', model_path='../models/xgboost_tuned.pkl'):
+    data = to_records(load_market(symbol))
+    # a weekend and a day after the last bar have no row
+    weekend = next(date for date in ('2024-12-07', '2024-12-08') if date not in {row['Date'] for row in data})
+
+    result = lambda_handler({
+        'local_model_path': model_path,
+        'data': data,
+        'dates': [data[-1]['Date'], weekend, '2099-01-02']
+    }, None)
+    assert result['statusCode'] == 200
+    body = json.loads(result['body'])
+
+    assert body['skipped'] == [{'date': weekend, 'reason': 'not in data'}, {'date': '2099-01-02', 'reason': 'not in data'}]
+    assert [p['date'] for p in body['predictions']] == [data[-1]['Date']]
+
+    # nothing left to score is still an error, with the reasons
+    result = lambda_handler({'local_model_path': model_path, 'data': data, 'dates': ['2099-01-02']}, None)
+    assert result['statusCode'] == 400
+    assert json.loads(result['body'])['skipped'] == [{'date': '2099-01-02', 'reason': 'not in data'}]
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_row()
+    test_batch_skips_dates_without_history()
+    test_batch_reports_dates_not_in_data()
+    print("batch predictions match the single-row path")
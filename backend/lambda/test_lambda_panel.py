@@ -0,0 +1,96 @@
+import os
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import json
+import math
+import boto3
+import numpy as np
+import pandas as pd
+from moto import mock_aws
+from unittest.mock import patch
+import dynamodb_helper
+from dynamodb_helper import query_predictions
+from accuracy_summary import check_summary
+from migrate_predictions_table import create_predictions_table
+from lambda_handler import lambda_handler
+from market_store import load_market, to_records
+from feature_utils import engineer_features, get_feature_columns
+from feature_kernels import engineer_panel_features
+
+
+def build_panel(symbol='SPY', days=300):
+    # SPY and scaled copies of it that start later, plus one symbol with too little history
+    df = load_market(symbol).iloc[-days:]
+    panel = {}
+    for name, scale, start in (('SPY', 1.0, 0), ('AAA', 0.5, 40), ('BBB', 3.0, 120), ('NEW', 1.0, days - 20)):
+        rows = df.iloc[start:].copy()
+        rows[['Open', 'High', 'Low', 'Close']] *= scale
+        panel[name] = to_records(rows)
+    return panel
+
+
+def panel_event(panel, model_path, end=None):
+    data = [{'Symbol': name, **row} for name, rows in panel.items() for row in rows[:end]]
+    return {'local_model_path': model_path, 'data': data}
+
+
+def test_panel_features_match_per_symbol(symbol='SPY'):
+    # different start dates, a gap in one history and shuffled rows, nothing leaks between symbols
+    df = load_market(symbol)
+    parts = {}
+    for i, (name, start, stop) in enumerate((('AAA', 0, len(df)), ('BBB', 100, 1500), ('CCC', 700, len(df)))):
+        rows = df.iloc[start:stop].copy()
+        rows[['Open', 'High', 'Low', 'Close']] *= 1 + i
+        if name == 'CCC':
+            rows = rows.drop(rows.index[50:60])
+        parts[name] = rows
+    long = pd.concat([rows.assign(Symbol=name) for name, rows in parts.items()]).sample(frac=1, random_state=1)
+
+    panel = engineer_panel_features(long)
+    feature_cols = get_feature_columns()
+    for name, rows in parts.items():
+        expected = engineer_features(rows, backend='numpy')[feature_cols].values
+        assert np.array_equal(panel.loc[name][feature_cols].values, expected, equal_nan=True), name
+
+
+def test_panel_matches_single_symbol(model_path='../models/xgboost_tuned.npz'):
+    panel = build_panel()
+    with patch.dict(os.environ, {'DYNAMODB_TABLE': ''}):
+        result = lambda_handler(panel_event(panel, model_path), None)
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert body['skipped'] == ['NEW']
+
+        for prediction in body['predictions']:
+            single = json.loads(lambda_handler({'local_model_path': model_path, 'data': panel[prediction['symbol']]}, None)['body'])
+            assert prediction['date'] == single['date'] and prediction['prediction'] == single['prediction']
+            # the single symbol path runs its emas through pandas, they agree to rounding
+            assert math.isclose(prediction['confidence_score'], single['confidence_score'], rel_tol=1e-9)
+            for name, value in single['key_features'].items():
+                assert math.isclose(prediction['key_features'][name], value, rel_tol=1e-9)
+
+
+def test_panel_persists_per_symbol(model_path='../models/xgboost_tuned.npz', table_name='VolatilityPredictionsPanel'):
+    panel = build_panel()
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        table = create_predictions_table(boto3.resource('dynamodb'), table_name)
+
+        # yesterday's run, then today's verifies it for every symbol
+        first = json.loads(lambda_handler(panel_event(panel, model_path, end=-1), None)['body'])
+        second = json.loads(lambda_handler(panel_event(panel, model_path), None)['body'])
+        assert first['persisted']['ok'] and first['persisted']['verified'] == 0
+        assert second['persisted']['written'] == 3 and second['persisted']['verified'] == 3
+
+        for prediction in second['predictions']:
+            items = query_predictions(table, symbol=prediction['symbol'], ascending=True)
+            assert [item['date'] for item in items] == [panel[prediction['symbol']][-2]['Date'], prediction['date']]
+            assert 'is_correct' in items[0] and 'is_correct' not in items[1]
+            assert check_summary(table, prediction['symbol'])
+
+
+if __name__ == "__main__":
+    test_panel_features_match_per_symbol()
+    test_panel_matches_single_symbol()
+    test_panel_persists_per_symbol()
+    print("panel predictions ok")
@@ -1,13 +1,14 @@
 import json
-import pandas as pd
 from lambda_handler import lambda_handler
+from market_store import load_market, to_records
+from profiling import profiled
 
-def test_lambda_with_csv(csv_path='../data/SPY_raw.csv', model_path='../models/xgboost_tuned.pkl'):
-    print(f"Loading data from {csv_path}")
+def test_lambda_with_csv(symbol='SPY', model_path='../models/xgboost_tuned.pkl'):
+    print(f"Loading {symbol} from the market store")
 
-    df = pd.read_csv(csv_path)
+    df = load_market(symbol)
     df = df.tail(100)
-    data = df.to_dict('records')
+    data = to_records(df)
 
     print(f"Testing with {len(data)} days of data")
     print(f"Date range: {data[0]['Date']} to {data[-1]['Date']}")
@@ -18,7 +19,9 @@ def test_lambda_with_csv(csv_path='../data/SPY_raw.csv', model_path='../models/x
     }
 
     print("\nInvoking lambda handler...")
-    result = lambda_handler(event, None)
+    # FEATURE_PROFILE=cprofile or sample profiles the invocation
+    with profiled('test_lambda_with_csv', len(data)):
+        result = lambda_handler(event, None)
 
     print("\n=== RESULT ===")
     print(f"Status: {result['statusCode']}")
@@ -34,8 +37,8 @@ def test_lambda_with_csv(csv_path='../data/SPY_raw.csv', model_path='../models/x
     else:
         body = json.loads(result['body'])
         print(f"Error: {body.get('error', 'Unknown error')}")
-        if 'nan_features' in body:
-            print(f"NaN features: {body['nan_features']}")
+        if 'missing_lookback' in body:
+            print(f"Missing lookback: {body['missing_lookback']}")
 
 if __name__ == "__main__":
     test_lambda_with_csv()
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from aiohttp import web
+from market_store import load_market
+from market_fetcher import MarketDataFetcher, TokenBucket, FetchError
+
+
+class StandInServer:
+    # answers TIME_SERIES_DAILY like alpha vantage from the local SPY history, every symbol is SPY
+    # scaled by its position in `symbols`. `failures` lists what a symbol gets before a real answer:
+    # an http status, 'note' or 'limit' for the 200 rate limit messages, 'premium' for an answer
+    # that never turns into data
+    def __init__(self, symbols, failures=None, port=0):
+        self.port = port
+        history = load_market('SPY')
+        self.series = {}
+        for scale, symbol in enumerate(symbols, start=1):
+            self.series[symbol] = {
+                date.strftime('%Y-%m-%d'): {
+                    '1. open': f"{row.Open * scale:.4f}", '2. high': f"{row.High * scale:.4f}",
+                    '3. low': f"{row.Low * scale:.4f}", '4. close': f"{row.Close * scale:.4f}", '5. volume': str(int(row.Volume))
+                }
+                for date, row in history.iterrows()
+            }
+        self.failures = failures or {}
+        self.requests = []
+        self.connections = set()
+
+    async def handle(self, request):
+        symbol = request.query['symbol']
+        self.requests.append((symbol, request.query['outputsize'], request.headers.get('If-None-Match')))
+        self.connections.add(request.transport.get_extra_info('peername'))
+        assert request.query['apikey'] == 'test-key'
+
+        if self.failures.get(symbol):
+            failure = self.failures[symbol].pop(0)
+            if failure == 'note':
+                return web.json_response({'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute'})
+            if failure == 'limit':
+                return web.json_response({'Information': 'Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day.'})
+            if failure == 'premium':
+                return web.json_response({'Information': 'Thank you for using Alpha Vantage! This is a premium endpoint.'})
+            return web.Response(status=failure, headers={'Retry-After': '0'} if failure == 429 else {})
+
+        dates = sorted(self.series[symbol], reverse=True)
+        if request.query['outputsize'] == 'compact':
+            dates = dates[:100]
+        body = json.dumps({'Meta Data': {'2. Symbol': symbol}, 'Time Series (Daily)': {d: self.series[symbol][d] for d in dates}}).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/query', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}/query"
+        return self
+
+    async def __aexit__(self, *args):
+        await self.runner.cleanup()
+
+
+async def no_sleep(delays, seconds):
+    delays.append(seconds)
+
+
+def test_concurrent_fetch_with_retries(symbols=('SPY', 'QQQ', 'IWM', 'DIA', 'EFA', 'EEM')):
+    expected = load_market('SPY')
+
+    async def run(cache_dir):
+        delays = []
+        failures = {'QQQ': [503, 503], 'IWM': ['note'], 'DIA': [429]}
+        async with StandInServer(symbols, failures) as server:
+            async with MarketDataFetcher('test-key', base_url=server.url, calls_per_minute=600, max_connections=2,
+                                         cache_dir=cache_dir, sleep=lambda s: no_sleep(delays, s)) as fetcher:
+                queries = [(symbol, '2024-06-03', '2024-09-30') for symbol in symbols]
+                # a second window of SPY rides on the same request
+                queries.append(('SPY', '2024-10-01', None))
+                results = await fetcher.fetch_many(queries)
+            return server, fetcher, results, delays
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server, fetcher, results, delays = asyncio.run(run(cache_dir))
+
+    for scale, symbol in enumerate(symbols, start=1):
+        df = results[(symbol, '2024-06-03', '2024-09-30')]
+        assert list(df.index) == list(expected.loc['2024-06-03':'2024-09-30'].index), symbol
+        assert abs(df['Close'].iloc[-1] - expected.loc['2024-09-30', 'Close'] * scale) < 1e-3
+    assert results[('SPY', '2024-10-01', None)].index[0] == expected.loc['2024-10-01':].index[0]
+
+    # one good answer per symbol, two 503s, a note and a 429 retried, the spy windows share one request
+    assert fetcher.counters['retries'] == 4 and len(delays) == 4
+    assert fetcher.counters['requests'] == len(symbols) + 4 == len(server.requests)
+    assert fetcher.counters['coalesced'] == 1
+    # older than the last 100 days, so the full history is asked for
+    assert all(outputsize == 'full' for _, outputsize, _ in server.requests)
+    assert len(server.connections) <= 2
+
+
+def test_disk_cache_and_conditional_refresh(symbols=('SPY', 'QQQ')):
+    async def run(cache_dir, max_age, port=0):
+        # the cache is keyed by url, later runs come back on the same port
+        async with StandInServer(symbols, port=port) as server:
+            async with MarketDataFetcher('test-key', base_url=server.url, cache_dir=cache_dir, max_age=max_age) as fetcher:
+                results = await fetcher.fetch_many(list(symbols))
+            return server, fetcher, results
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server, fetcher, first = asyncio.run(run(cache_dir, 3600))
+        assert fetcher.counters['requests'] == 2 and fetcher.counters['cache_hits'] == 0
+
+        # fresh entries never reach the server
+        server, fetcher, cached = asyncio.run(run(cache_dir, 3600, server.port))
+        assert fetcher.counters['cache_hits'] == 2 and server.requests == []
+
+        # stale entries are revalidated with their etag, the 304 keeps the cached body
+        server, fetcher, refreshed = asyncio.run(run(cache_dir, 0, server.port))
+        assert fetcher.counters['not_modified'] == 2
+        assert all(etag is not None for _, _, etag in server.requests)
+        for key in first:
+            assert first[key].equals(cached[key]) and first[key].equals(refreshed[key])
+        assert len(first[('SPY', None, None)]) == 100
+
+        # the api key stays out of the cache
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'rb') as f:
+                assert b'test-key' not in f.read()
+
+
+def test_provider_messages_and_stale_cache(symbols=('SPY', 'QQQ')):
+    async def run(cache_dir, failures, max_age, port=0):
+        delays = []
+        async with StandInServer(symbols, failures, port=port) as server:
+            async with MarketDataFetcher('test-key', base_url=server.url, cache_dir=cache_dir, max_age=max_age, max_attempts=3,
+                                         sleep=lambda s: no_sleep(delays, s)) as fetcher:
+                results = await fetcher.fetch_many(list(symbols))
+            return server, fetcher, results, delays
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # the daily quota message is retried, a premium answer fails at once and is not cached
+        server, fetcher, results, delays = asyncio.run(run(cache_dir, {'SPY': ['limit'], 'QQQ': ['premium']}, 3600))
+        assert not results[('SPY', None, None)].attrs['stale']
+        error = results[('QQQ', None, None)]
+        assert isinstance(error, FetchError) and 'premium endpoint' in str(error) and 'test-key' not in str(error)
+        assert fetcher.counters['retries'] == 1 and fetcher.counters['requests'] == 3
+        assert len(os.listdir(cache_dir)) == 2
+
+        # every attempt fails, the expired spy entry is served and flagged
+        server, fetcher, results, delays = asyncio.run(run(cache_dir, {'SPY': [503] * 3}, 0, server.port))
+        stale = results[('SPY', None, None)]
+        assert stale.attrs['stale'] and len(stale) == 100
+        assert fetcher.counters['stale'] == 1 and fetcher.counters['retries'] == 2
+        assert not results[('QQQ', None, None)].attrs['stale']
+
+
+def test_token_bucket_spacing(calls_per_minute=5, calls=12):
+    now = [0.0]
+
+    async def fake_sleep(seconds):
+        now[0] += seconds
+
+    async def run():
+        bucket = TokenBucket(calls_per_minute / 60.0, calls_per_minute, clock=lambda: now[0], sleep=fake_sleep)
+        granted = []
+        for _ in range(calls):
+            await bucket.acquire()
+            granted.append(now[0])
+        return granted
+
+    granted = asyncio.run(run())
+    # a burst of one minute's quota, then one call every 12 seconds
+    assert granted[:calls_per_minute] == [0.0] * calls_per_minute
+    spacing = [b - a for a, b in zip(granted[calls_per_minute - 1:], granted[calls_per_minute:])]
+    assert all(abs(s - 60 / calls_per_minute) < 1e-9 for s in spacing)
+
+
+if __name__ == "__main__":
+    test_concurrent_fetch_with_retries()
+    test_disk_cache_and_conditional_refresh()
+    test_provider_messages_and_stale_cache()
+    test_token_bucket_spacing()
+    print("market fetcher tests passed")
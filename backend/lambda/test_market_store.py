@@ -0,0 +1,108 @@
+import os
+import tempfile
+import numpy as np
+from market_store import MarketStore, load_market, read_csv
+
+
+def test_store_round_trip_and_slicing(csv_path='../data/SPY_raw.csv'):
+    expected = read_csv(csv_path)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = MarketStore(store_dir)
+        store.write('SPY', expected)
+        df = store.read('SPY')
+
+        assert df.equals(expected)
+        assert df['Volume'].dtype == np.int64
+        assert isinstance(df['Close'].values, np.memmap)
+
+        # inclusive on both ends, dates that are not trading days fall between rows
+        window = store.read('SPY', '2024-11-02', '2024-12-31')
+        assert window.equals(expected.loc['2024-11-02':'2024-12-31'])
+        assert len(store.read('SPY', '2030-01-01')) == 0
+
+        # float32 prices keep about 7 significant digits
+        store.write('SPY32', expected, price_dtype='float32')
+        close = store.read('SPY32')['Close']
+        assert close.dtype == np.float32
+        assert np.max(np.abs(close.values / expected['Close'].values - 1)) < 2 ** -24
+
+
+def test_daily_append_and_csv_sync(csv_path='../data/SPY_raw.csv', split=2000):
+    expected = read_csv(csv_path)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        source = os.path.join(store_dir, 'SPY_raw.csv')
+        expected.iloc[:split].to_csv(source)
+        assert len(load_market('SPY', store_dir=store_dir, csv_path=source)) == split
+
+        # only rows after the last stored date are added
+        store = MarketStore(store_dir)
+        assert store.append('SPY', expected.iloc[split - 5:split + 10]) == 10
+        assert store.read('SPY').equals(expected.iloc[:split + 10])
+
+        # a longer csv is appended, a csv with revised history replaces the stored rows
+        expected.to_csv(source)
+        assert load_market('SPY', store_dir=store_dir, csv_path=source).equals(expected)
+
+        revised = expected.copy()
+        revised.iloc[0, revised.columns.get_loc('Close')] += 1
+        revised.to_csv(source)
+        os.utime(source, ns=(0, 0))
+        assert load_market('SPY', store_dir=store_dir, csv_path=source).equals(revised)
+
+
+def test_loaded_frame_survives_reimport(csv_path='../data/SPY_raw.csv'):
+    expected = read_csv(csv_path)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        source = os.path.join(store_dir, 'SPY_raw.csv')
+        expected.to_csv(source)
+        held = load_market('SPY', store_dir=store_dir, csv_path=source)
+        assert held.equals(expected)
+
+        # an edited csv is re-imported, then a shorter one, the frame loaded before keeps its rows
+        revised = expected.copy()
+        revised.iloc[0, revised.columns.get_loc('Close')] = 999.0
+        revised.to_csv(source)
+        os.utime(source, ns=(1, 1))
+        assert load_market('SPY', store_dir=store_dir, csv_path=source).equals(revised)
+
+        revised.iloc[:100].to_csv(source)
+        os.utime(source, ns=(2, 2))
+        assert load_market('SPY', store_dir=store_dir, csv_path=source).equals(revised.iloc[:100])
+
+        assert held.equals(expected)
+        assert float(held['Close'].sum()) == float(expected['Close'].sum())
+
+
+def test_volume_has_to_be_whole(csv_path='../data/SPY_raw.csv'):
+    expected = read_csv(csv_path)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = MarketStore(store_dir)
+        store.write('SPY', expected.iloc[:100])
+
+        # whole numbers in a float column are stored as they are
+        floats = expected.iloc[:200].astype({'Volume': np.float64})
+        store.append('SPY', floats)
+        assert store.read('SPY').equals(expected.iloc[:200])
+
+        # a fraction or a missing value is refused before any column is written
+        for bad in (0.5, np.nan, np.inf):
+            revised = expected.iloc[:300].astype({'Volume': np.float64})
+            revised.iloc[250, revised.columns.get_loc('Volume')] += bad
+            try:
+                store.append('SPY', revised)
+                assert False, "non integral volume was stored"
+            except ValueError as e:
+                assert revised.index[250].strftime('%Y-%m-%d') in str(e)
+            assert store.read('SPY').equals(expected.iloc[:200])
+
+
+if __name__ == "__main__":
+    test_store_round_trip_and_slicing()
+    test_daily_append_and_csv_sync()
+    test_loaded_frame_survives_reimport()
+    test_volume_has_to_be_whole()
+    print("market store tests passed")
@@ -0,0 +1,65 @@
+import io
+import json
+import tempfile
+import boto3
+import numpy as np
+from moto import mock_aws
+from lambda_handler import deserialize_model
+from model_registry import ModelRegistry
+from tree_model import save_tree_model
+
+
+def retrained(model_bytes):
+    # same trees under a new manifest, enough to give the object a new etag
+    with np.load(io.BytesIO(model_bytes)) as archive:
+        arrays = {name: archive[name] for name in archive.files if name != 'manifest'}
+        manifest = json.loads(str(archive['manifest']))
+    manifest['retrained'] = True
+    out = io.BytesIO()
+    save_tree_model(arrays, manifest, out)
+    return out.getvalue()
+
+
+def make_registry(s3, cache_dir, revalidate_seconds=60):
+    return ModelRegistry(deserialize_model, lambda: s3, max_models=2,
+                         revalidate_seconds=revalidate_seconds, cache_dir=cache_dir)
+
+
+def test_registry_revalidates_and_swaps(model_path='../models/xgboost_tuned.npz', bucket='model-registry-test',
+                                        key='models/xgboost_tuned.npz'):
+    with open(model_path, 'rb') as f:
+        model_bytes = f.read()
+
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=bucket)
+        s3.put_object(Bucket=bucket, Key=key, Body=model_bytes)
+        cache_dir = tempfile.mkdtemp()
+
+        registry = make_registry(s3, cache_dir)
+        first = registry.get_s3(bucket, key)
+        assert registry.get_s3(bucket, key) is first
+        assert registry.counters['misses'] == 1 and registry.counters['hits'] == 1
+
+        # past the ttl the etag is checked and the same object comes back
+        registry.revalidate_seconds = 0
+        assert registry.get_s3(bucket, key) is first
+        assert registry.counters['not_modified'] == 1
+
+        # a new object under the same key is loaded on the next check
+        s3.put_object(Bucket=bucket, Key=key, Body=retrained(model_bytes))
+        etag = s3.head_object(Bucket=bucket, Key=key)['ETag']
+        swapped = registry.get_s3(bucket, key)
+        assert swapped is not first and swapped.manifest['retrained']
+        assert registry.counters['swaps'] == 1
+        assert registry.versions[(bucket, key)][0] == etag
+
+        # a fresh container on the same sandbox loads from /tmp after a 304
+        restarted = make_registry(s3, cache_dir)
+        restarted.get_s3(bucket, key)
+        assert restarted.counters['disk_hits'] == 1 and restarted.counters['misses'] == 0
+
+
+if __name__ == "__main__":
+    test_registry_revalidates_and_swaps()
+    print("model registry ok")
@@ -0,0 +1,73 @@
+import os
+import pstats
+import tempfile
+from unittest.mock import patch
+from feature_utils import engineer_features
+from market_store import load_market
+from profiling import profiled, pstats_collapsed
+
+INDICATORS = [
+    'calculate_returns', 'calculate_volatility', 'calculate_moving_averages', 'calculate_rsi', 'calculate_atr',
+    'calculate_volume_indicators', 'calculate_price_momentum', 'calculate_bollinger_bands', 'calculate_macd'
+]
+
+
+def read_collapsed(path):
+    stacks = {}
+    with open(path) as f:
+        for line in f:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            stacks[stack] = int(count)
+    return stacks
+
+
+def test_cprofile_ranks_every_indicator(symbol='SPY', repeat=3):
+    df = load_market(symbol)
+    output_dir = tempfile.mkdtemp()
+    with profiled('test', len(df) * repeat, 'cprofile', output_dir) as result:
+        for _ in range(repeat):
+            engineer_features(df)
+
+    ranking = {row['function']: row for row in result['ranking']}
+    for name in INDICATORS:
+        assert ranking[name]['calls'] == repeat
+        assert 0 < ranking[name]['total_ms'] <= ranking['engineer_features']['total_ms']
+        assert abs(ranking[name]['ms_per_1k_rows'] - ranking[name]['total_ms'] / (len(df) * repeat) * 1000) < 1e-9
+    assert [row['total_ms'] for row in result['ranking']] == sorted((row['total_ms'] for row in result['ranking']), reverse=True)
+
+    # the pstats file loads, and the stacks rebuilt from it hold every indicator under engineer_features
+    stats = pstats.Stats(result['pstats']).stats
+    stacks = read_collapsed(result['collapsed'])
+    assert stacks == pstats_collapsed(stats)
+    for name in INDICATORS:
+        assert any(f'feature_utils.py:engineer_features;feature_utils.py:{name}' in stack for stack in stacks)
+    # the stacks account for most of the run, cProfile's own overhead is the rest
+    assert 0.5 * result['wall_ms'] < sum(stacks.values()) / 1000 <= result['wall_ms'] * 1.01
+    assert os.path.exists(result['summary'])
+
+
+def test_sampler_collects_real_stacks(symbol='SPY', repeat=10):
+    df = load_market(symbol)
+    with profiled('test', len(df) * repeat, 'sample', tempfile.mkdtemp()) as result:
+        for _ in range(repeat):
+            engineer_features(df, backend='pandas')
+
+    stacks = read_collapsed(result['collapsed'])
+    assert sum(stacks.values()) > 20
+    assert 'pstats' not in result
+    ranking = {row['function']: row for row in result['ranking']}
+    assert ranking['engineer_features']['share'] > 0.5
+    assert sum(1 for name in INDICATORS if name in ranking) >= 5
+
+
+def test_profiling_is_off_by_default():
+    with patch.dict(os.environ, {'FEATURE_PROFILE': ''}), profiled('test', 1) as result:
+        pass
+    assert result == {}
+
+
+if __name__ == "__main__":
+    test_cprofile_ranks_every_indicator()
+    test_sampler_collects_real_stacks()
+    test_profiling_is_off_by_default()
+    print("profiles check out")
@@ -0,0 +1,227 @@
+import os
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import json
+import boto3
+import pandas as pd
+from decimal import Decimal
+from moto import mock_aws
+from unittest.mock import patch
+import dynamodb_helper
+import reader_handler
+from accuracy_summary import check_summary, rebuild_summary
+from migrate_predictions_table import migrate
+
+
+class SmallPages:
+    # caps every query page so the LastEvaluatedKey loop gets exercised
+    def __init__(self, table, page_size):
+        self.table = table
+        self.page_size = page_size
+
+    def query(self, **kwargs):
+        kwargs['Limit'] = min(kwargs.get('Limit', self.page_size), self.page_size)
+        return self.table.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+
+def create_legacy_table(dynamodb, dates, table_name='VolatilityPredictions'):
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': 'date', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'date', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    for i, date in enumerate(dates):
+        table.put_item(Item={
+            'date': date,
+            'prediction': i % 2,
+            'confidence_score': Decimal('0.6'),
+            'confidence_level': 'medium',
+            'is_correct': i % 3 != 0
+        })
+    return table
+
+
+def request(path, headers=None, **params):
+    return reader_handler.lambda_handler({
+        'httpMethod': 'GET', 'path': path, 'queryStringParameters': params, 'headers': headers or {}
+    }, None)
+
+
+def get(path, **params):
+    response = request(path, **params)
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])
+
+
+def test_reader_queries_migrated_table(n_dates=120, page_size=7):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=n_dates)]
+
+    with mock_aws():
+        reader_handler.response_cache.clear()
+        reader_handler.version_cache.clear()
+        dynamodb = boto3.resource('dynamodb')
+        create_legacy_table(dynamodb, dates)
+        assert migrate('VolatilityPredictions', 'VolatilityPredictionsBySymbol') == n_dates
+
+        reader_handler.table = SmallPages(dynamodb.Table('VolatilityPredictionsBySymbol'), page_size)
+
+        assert get('/predictions/latest')['date'] == dates[-1]
+        assert [p['date'] for p in get('/predictions/all', limit='30')] == dates[::-1][:30]
+        assert [p['date'] for p in get('/predictions/range', start=dates[10], end=dates[50])] == dates[10:51]
+
+        metrics = get('/analytics/accuracy')
+        assert metrics['total_predictions'] == n_dates
+        assert metrics['correct_predictions'] == sum(1 for i in range(n_dates) if i % 3 != 0)
+        assert metrics['current_streak'] == n_dates - 1 - max(i for i in range(n_dates) if i % 3 == 0)
+
+
+def test_accuracy_summary_kept_on_write(n_dates=40, table_name='VolatilityPredictionsBySymbol'):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range(pd.Timestamp.now().normalize() - pd.Timedelta(days=70), periods=n_dates)]
+    outcomes = [i % 4 != 0 for i in range(n_dates)]
+    levels = ['high', 'medium', 'low']
+
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name}):
+        dynamodb_helper.dynamodb = None
+        dynamodb = boto3.resource('dynamodb')
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'symbol', 'KeyType': 'HASH'}, {'AttributeName': 'date', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'symbol', 'AttributeType': 'S'}, {'AttributeName': 'date', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table = dynamodb.Table(table_name)
+        reader_handler.table = table
+        reader_handler.response_cache.clear()
+        reader_handler.version_cache.clear()
+
+        for i, (date, correct) in enumerate(zip(dates, outcomes)):
+            dynamodb_helper.save_prediction_to_dynamodb(date, 1, 'volatility will increase', 0.6, levels[i % 3], {})
+            assert dynamodb_helper.update_prediction_accuracy(date, 0.1, 1 if correct else 0, correct)
+
+        # verifying the same day again must not count it twice
+        assert not dynamodb_helper.update_prediction_accuracy(dates[-1], 0.1, 1, outcomes[-1])
+
+        metrics = get('/analytics/accuracy')
+        assert metrics['total_predictions'] == n_dates
+        assert metrics['correct_predictions'] == sum(outcomes)
+        assert metrics['by_confidence']['high']['total'] == len(range(0, n_dates, 3))
+        assert check_summary(table)
+
+        # a late verification of an older date is still counted, the streak only follows newer dates.
+        # the newest prediction did not change, the summary revision moves the etag anyway
+        etag = request('/analytics/accuracy')['headers']['ETag']
+        late_date = (pd.Timestamp(dates[0]) - pd.offsets.BDay(1)).strftime('%Y-%m-%d')
+        dynamodb_helper.save_prediction_to_dynamodb(late_date, 1, 'volatility will increase', 0.6, 'low', {})
+        dynamodb_helper.update_prediction_accuracy(late_date, 0.1, 0, False)
+        # for VERSION_CACHE_SECONDS the cached version answers without reading dynamodb
+        cached = request('/analytics/accuracy', headers={'If-None-Match': etag})
+        assert cached['statusCode'] == 304
+        reader_handler.version_cache.clear()
+        response = request('/analytics/accuracy', headers={'If-None-Match': etag})
+        assert response['statusCode'] == 200 and response['headers']['X-Cache'] == 'miss'
+        assert json.loads(response['body'])['total_predictions'] == n_dates + 1
+        assert check_summary(table)
+
+        # so does a rebuild, which replaces the whole item
+        etag = response['headers']['ETag']
+        rebuild_summary(table)
+        reader_handler.version_cache.clear()
+        assert request('/analytics/accuracy', headers={'If-None-Match': etag})['statusCode'] == 200
+
+
+
+def test_reader_cache_follows_latest_prediction(n_dates=20):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=n_dates + 1)]
+
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb')
+        create_legacy_table(dynamodb, dates[:-1])
+        migrate('VolatilityPredictions', 'VolatilityPredictionsBySymbol')
+        table = dynamodb.Table('VolatilityPredictionsBySymbol')
+        reader_handler.table = table
+        reader_handler.response_cache.clear()
+        reader_handler.version_cache.clear()
+
+        first = request('/predictions/all', limit='5')
+        second = request('/predictions/all', limit='5')
+        assert (first['headers']['X-Cache'], second['headers']['X-Cache']) == ('miss', 'hit')
+        # the second request reused the version as well, it read nothing
+        assert float(first['headers']['X-Consumed-Capacity']) > 0 and float(second['headers']['X-Consumed-Capacity']) == 0
+        assert first['body'] == second['body'] and first['headers']['ETag'] == second['headers']['ETag']
+        assert 'max-age' in first['headers']['Cache-Control']
+
+        # a client that has the current version gets a 304, other params have their own etag
+        assert request('/predictions/all', headers={'if-none-match': first['headers']['ETag']}, limit='5')['statusCode'] == 304
+        assert request('/predictions/all', limit='6')['headers']['ETag'] != first['headers']['ETag']
+
+        # a backfilled older day changes /predictions/range without a new newest prediction
+        etag = request('/predictions/range', start=dates[0], end=dates[-1])['headers']['ETag']
+        dynamodb_helper.dynamodb = None
+        with dynamodb_helper.BatchPredictionWriter('VolatilityPredictionsBySymbol') as writer:
+            writer.put_prediction('2023-12-29', 1, 'volatility will increase', 0.6, 'medium', {})
+        reader_handler.version_cache.clear()
+        backfilled = request('/predictions/range', headers={'If-None-Match': etag}, start='2023-12-01', end=dates[-1])
+        assert json.loads(backfilled['body'])[0]['date'] == '2023-12-29'
+        assert request('/predictions/range', headers={'If-None-Match': etag}, start=dates[0], end=dates[-1])['statusCode'] == 200
+
+        # the next run's prediction changes the version
+        table.put_item(Item={'symbol': 'SPY', 'date': dates[-1], 'prediction': 1, 'timestamp': '2024-02-01T22:00:00'})
+        reader_handler.version_cache.clear()
+        fresh = request('/predictions/all', headers={'If-None-Match': first['headers']['ETag']}, limit='5')
+        assert fresh['statusCode'] == 200 and fresh['headers']['X-Cache'] == 'miss'
+        assert json.loads(fresh['body'])[0]['date'] == dates[-1]
+
+
+
+def test_reader_cursor_pages_and_fields(n_dates=50, page=12):
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=n_dates)]
+
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb')
+        create_legacy_table(dynamodb, dates)
+        migrate('VolatilityPredictions', 'VolatilityPredictionsBySymbol')
+        reader_handler.table = dynamodb.Table('VolatilityPredictionsBySymbol')
+        reader_handler.response_cache.clear()
+        reader_handler.version_cache.clear()
+
+        # walk /predictions/all newest first with a projection
+        seen = []
+        params = {'limit': str(page), 'fields': 'prediction,confidence_score'}
+        while True:
+            response = request('/predictions/all', **params)
+            assert response['statusCode'] == 200
+            assert float(response['headers']['X-Consumed-Capacity']) > 0
+            items = json.loads(response['body'])
+            assert all('is_correct' not in item for item in items)
+            seen.extend(item['date'] for item in items)
+            if 'X-Next-Cursor' not in response['headers']:
+                break
+            params['cursor'] = response['headers']['X-Next-Cursor']
+        assert seen == dates[::-1]
+
+        # the same on a range, oldest first
+        first = request('/predictions/range', start=dates[5], end=dates[30], limit='10')
+        rest = request('/predictions/range', start=dates[5], end=dates[30], cursor=first['headers']['X-Next-Cursor'])
+        assert [p['date'] for p in json.loads(first['body']) + json.loads(rest['body'])] == dates[5:31]
+        assert 'X-Next-Cursor' not in rest['headers']
+
+        # only the projected attributes come back, no defaults for the others
+        assert [set(p) for p in get('/predictions/all', fields='date', limit='3')] == [{'date'}] * 3
+        ranged = get('/predictions/range', start=dates[0], end=dates[3], fields='confidence_score')
+        assert [set(p) for p in ranged] == [{'date', 'confidence_score'}] * 4
+        assert all(p['confidence_score'] == 0.6 for p in ranged)
+
+        assert request('/predictions/all', cursor='not-a-cursor')['statusCode'] == 400
+        assert request('/predictions/all', fields='date,#bad')['statusCode'] == 400
+
+
+if __name__ == "__main__":
+    test_reader_queries_migrated_table()
+    test_accuracy_summary_kept_on_write()
+    test_reader_cache_follows_latest_prediction()
+    test_reader_cursor_pages_and_fields()
+    print("reader queries ok")
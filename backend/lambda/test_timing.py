@@ -0,0 +1,136 @@
+import os
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import contextlib
+import io
+import json
+import boto3
+from moto import mock_aws
+from unittest.mock import patch
+import dynamodb_helper
+import lambda_handler
+import timing
+from market_store import load_market, to_records
+from metrics_report import read_records, aggregate, metric_names
+from migrate_predictions_table import create_predictions_table
+
+
+def invoke(event):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        response = lambda_handler.lambda_handler(event, None)
+    records = read_records(output.getvalue().splitlines())
+    assert len(records) == 1, output.getvalue()
+    return response, records[0]
+
+
+def test_metrics_line_per_invocation(model_path='../models/xgboost_tuned.npz', table_name='VolatilityPredictionsMetrics'):
+    data = to_records(load_market('SPY').tail(100))
+
+    with mock_aws(), patch.dict(os.environ, {'DYNAMODB_TABLE': table_name, 'LAMBDA_PHASE_TIMING': '1'}):
+        dynamodb_helper.dynamodb = None
+        create_predictions_table(boto3.resource('dynamodb'), table_name)
+
+        response, record = invoke({'local_model_path': model_path, 'data': data})
+        assert response['statusCode'] == 200
+        assert (record['function'], record['mode'], record['status_code'], record['rows']) == ('predictor', 'single', 200, 100)
+
+        # every metric the emf directive names is on the line, with a unit
+        directive = record['_aws']['CloudWatchMetrics'][0]
+        assert directive['Dimensions'] == [['function'], ['function', 'mode']]
+        for name in metric_names(record):
+            assert isinstance(record[name], (int, float)), name
+        for phase in ('import', 'model_load', 'features', 'predict', 'persist'):
+            assert record[f'{phase}_ms'] >= 0
+        assert abs(record['total_ms'] - sum(record[f'{p}_ms'] for p in ('import', 'model_load', 'features', 'predict', 'persist'))) < 0.01
+
+        # the save and the summary item go through the instrumented client
+        # moto leaves ConsumedCapacity empty on transact_write_items, so the units are checked on
+        # the shape dynamodb answers a transaction with instead
+        assert record['dynamodb_calls'] >= 2
+        assert record['dynamodb_write_units'] >= 0
+        assert timing.consumed_units({'ConsumedCapacity': [{'TableName': table_name, 'CapacityUnits': 4.0}]}) == 4.0
+        assert record['persist_dynamodb_write_units'] == record['dynamodb_write_units']
+        assert 0 < record['dynamodb_ms'] <= record['persist_ms']
+
+        # batch mode and an error are reported too
+        _, batch = invoke({'local_model_path': model_path, 'data': data, 'dates': [data[-1]['Date']]})
+        assert batch['mode'] == 'batch'
+        response, failed = invoke({'local_model_path': '../models/missing.npz', 'data': data})
+        assert failed['status_code'] == response['statusCode'] == 500
+
+    # aws calls outside an invocation are not counted anywhere
+    assert timing.active is None
+
+
+def test_nested_phases_and_emf_shape():
+    # an inner phase resets the tracemalloc peak, the outer one still reports what it reached before
+    timer = timing.PhaseTimer(memory=True)
+    with timer.phase('outer'):
+        block = bytearray(4 * 1024 * 1024)
+        del block
+        with timer.phase('inner'):
+            small = bytearray(64 * 1024)
+            del small
+    assert timer.memory_peaks['outer'] >= 4 * 1024 > timer.memory_peaks['inner'] >= 64
+    assert timer.phases['outer'] >= timer.phases['inner']
+
+    timer.dimensions['mode'] = 'single'
+    timer.count('rows', 3)
+    output = io.StringIO()
+    with patch.dict(os.environ, {'LAMBDA_PHASE_TIMING': '1'}), contextlib.redirect_stdout(output):
+        timer.report('predictor', status_code=200)
+    import tracemalloc
+    tracemalloc.stop()
+    record, = read_records(output.getvalue().splitlines())
+    directive, = record['_aws']['CloudWatchMetrics']
+    assert directive['Namespace'] == timing.METRICS_NAMESPACE
+    assert directive['Dimensions'] == [['function'], ['function', 'mode']]
+    assert {m['Name']: m['Unit'] for m in directive['Metrics']} == {
+        'outer_ms': 'Milliseconds', 'inner_ms': 'Milliseconds', 'total_ms': 'Milliseconds', 'rows': 'Count',
+        'peak_rss_mb': 'Megabytes', 'outer_alloc_kb': 'Kilobytes', 'inner_alloc_kb': 'Kilobytes'
+    }
+    assert (record['function'], record['mode'], record['status_code'], record['rows']) == ('predictor', 'single', 200, 3)
+    assert 'top_allocations' in record and 'top_allocations' not in metric_names(record)
+
+
+def test_memory_profile_and_aggregate(model_path='../models/xgboost_tuned.npz', runs=5):
+    data = to_records(load_market('SPY').tail(100))
+    lines = []
+    with patch.dict(os.environ, {'DYNAMODB_TABLE': '', 'LAMBDA_PHASE_TIMING': '1', 'LAMBDA_MEMORY_PROFILE': '1'}):
+        for _ in range(runs):
+            _, record = invoke({'local_model_path': model_path, 'data': data})
+            assert record['peak_rss_mb'] > 0 and record['features_alloc_kb'] > 0
+            assert len(record['top_allocations']) == 5
+            # what a cloudwatch export looks like
+            lines.append(f"2024-12-31T21:00:00.000Z\tabc-123\tINFO\t{json.dumps(record)}")
+    import tracemalloc
+    tracemalloc.stop()
+
+    lines.append('START RequestId: abc-123 Version: $LATEST')
+    by, summary = aggregate(read_records(lines))
+    assert by == ['function', 'mode']
+    stats = summary[('predictor', 'single')]
+    assert stats['features_ms']['count'] == runs
+    assert stats['features_ms']['p50'] <= stats['features_ms']['p95'] <= stats['features_ms']['p99'] == stats['features_ms']['max']
+    assert 'persist_ms' not in stats
+
+
+def test_metrics_can_be_switched_off(model_path='../models/xgboost_tuned.npz'):
+    # off unless LAMBDA_PHASE_TIMING asks for it
+    data = to_records(load_market('SPY').tail(100))
+    for setting in ('0', None):
+        output = io.StringIO()
+        with patch.dict(os.environ, {'DYNAMODB_TABLE': '', 'LAMBDA_PHASE_TIMING': setting or ''}), contextlib.redirect_stdout(output):
+            if setting is None:
+                del os.environ['LAMBDA_PHASE_TIMING']
+            assert lambda_handler.lambda_handler({'local_model_path': model_path, 'data': data}, None)['statusCode'] == 200
+        assert read_records(output.getvalue().splitlines()) == []
+
+
+if __name__ == "__main__":
+    test_metrics_line_per_invocation()
+    test_nested_phases_and_emf_shape()
+    test_memory_profile_and_aggregate()
+    test_metrics_can_be_switched_off()
+    print("metrics lines check out")
@@ -0,0 +1,43 @@
+import pickle
+import numpy as np
+import pandas as pd
+from feature_utils import get_feature_columns
+from tree_model import compile_booster, TreeEnsembleModel
+
+
+def load_models(model_path):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    compiled = compile_booster(model.get_booster().save_raw('json'))
+    manifest = {'feature_names': get_feature_columns(), 'thresholds': {'decision': 0.5, 'high': 0.70, 'medium': 0.55}}
+    return model, TreeEnsembleModel(compiled, manifest)
+
+
+def test_tree_model_matches_xgboost(model_path='../models/xgboost_tuned.pkl', features_path='../data/SPY_features.csv'):
+    model, tree_model = load_models(model_path)
+
+    df_features = pd.read_csv(features_path, index_col='Date', parse_dates=True)
+    X = df_features[get_feature_columns()].values
+
+    # batch and single rows
+    assert np.abs(tree_model.predict_proba(X) - model.predict_proba(X)).max() < 1e-6
+    assert np.abs(tree_model.predict_proba(X[-1]) - model.predict_proba(X[-1:])).max() < 1e-6
+
+
+def test_tree_model_missing_values(model_path='../models/xgboost_tuned.pkl', features_path='../data/SPY_features.csv'):
+    model, tree_model = load_models(model_path)
+
+    df_features = pd.read_csv(features_path, index_col='Date', parse_dates=True)
+    X = df_features[get_feature_columns()].values[:500].copy()
+
+    # knock out a different feature in every row so the default branches get exercised
+    rows = np.arange(len(X))
+    X[rows, rows % X.shape[1]] = np.nan
+
+    assert np.abs(tree_model.predict_proba(X) - model.predict_proba(X)).max() < 1e-6
+
+
+if __name__ == "__main__":
+    test_tree_model_matches_xgboost()
+    test_tree_model_missing_values()
+    print("tree evaluator matches xgboost")
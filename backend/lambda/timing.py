@@ -0,0 +1,189 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'VolatilityTrading')
+# dynamodb operations billed as reads, everything else that returns capacity is a write
+READ_OPERATIONS = ('Query', 'Scan', 'GetItem', 'BatchGetItem', 'TransactGetItems')
+TOP_ALLOCATIONS = 5
+
+# the timer of the invocation in progress, the aws client hooks below add to it
+active = None
+
+
+def timing_enabled():
+    # opt-in, one log line per invocation
+    return os.environ.get('LAMBDA_PHASE_TIMING', '').lower() in ('1', 'true', 'yes')
+
+
+def memory_profile_enabled():
+    return os.environ.get('LAMBDA_MEMORY_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+
+def peak_rss_mb():
+    import resource
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PhaseTimer:
+    # wall clock milliseconds per named phase, repeated phases add up. time and dynamodb capacity
+    # of aws calls made while the timer is active are added per service. with LAMBDA_MEMORY_PROFILE
+    # every phase also records its tracemalloc peak and the report has peak rss and the top
+    # allocation sites
+
+    def __init__(self, memory=None):
+        self.phases = {}
+        self.counters = {}
+        self.current = None
+        self.memory = memory_profile_enabled() if memory is None else memory
+        self.memory_peaks = {}
+        # [base, peak so far] of every open phase, innermost last
+        self.memory_frames = []
+        # extra metric dimensions (e.g. mode) and log-only properties for the report
+        self.dimensions = {}
+        self.properties = {}
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        outer = self.current
+        self.current = name
+        if self.memory:
+            import tracemalloc
+            # the reset below starts this phase's peak, the open phases keep what they reached so far
+            current, peak = tracemalloc.get_traced_memory()
+            for frame in self.memory_frames:
+                frame[1] = max(frame[1], peak)
+            tracemalloc.reset_peak()
+            self.memory_frames.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+            if self.memory:
+                base, peak = self.memory_frames.pop()
+                peak = (max(peak, tracemalloc.get_traced_memory()[1]) - base) / 1024
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0.0), peak)
+            self.current = outer
+
+    def add(self, name, ms):
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def total(self):
+        return sum(self.phases.values())
+
+    def activate(self):
+        # aws calls count against this timer until its report
+        global active
+        active = self
+        return self
+
+    def top_allocations(self):
+        import tracemalloc
+        stats = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+        return [{'where': str(stat.traceback[0]), 'kb': round(stat.size / 1024, 1), 'count': stat.count} for stat in stats]
+
+    def report(self, function, **properties):
+        # one CloudWatch embedded metric format line: phases and counters are metrics under
+        # METRICS_NAMESPACE per function and per function + the timer's dimensions, properties
+        # are searchable in logs insights but not metrics
+        global active
+        if active is self:
+            active = None
+        if not timing_enabled():
+            return
+        dimensions = {'function': function, **self.dimensions}
+        properties = {**self.properties, **properties}
+        metrics = {f'{name}_ms': round(ms, 3) for name, ms in self.phases.items()}
+        metrics['total_ms'] = round(self.total(), 3)
+        for name, value in self.counters.items():
+            metrics[name] = round(value, 3)
+        if self.memory:
+            metrics['peak_rss_mb'] = round(peak_rss_mb(), 1)
+            for name, kb in self.memory_peaks.items():
+                metrics[f'{name}_alloc_kb'] = round(kb, 1)
+            properties['top_allocations'] = self.top_allocations()
+
+        units = {name: unit_for(name) for name in metrics}
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['function'], list(dimensions)] if len(dimensions) > 1 else [['function']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()]
+                }]
+            },
+            **dimensions,
+            **metrics,
+            **properties
+        }, default=str))
+
+
+def unit_for(name):
+    if name.endswith('_ms'):
+        return 'Milliseconds'
+    if name.endswith('_mb'):
+        return 'Megabytes'
+    if name.endswith('_kb'):
+        return 'Kilobytes'
+    return 'Count'
+
+
+def consumed_units(parsed):
+    # ConsumedCapacity is one dict for single item calls, a list (per table) for batches and transactions
+    consumed = parsed.get('ConsumedCapacity')
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(c.get('CapacityUnits', 0.0)) for c in consumed)
+
+
+def ask_for_capacity(params, model, **kwargs):
+    if 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def start_call(context, **kwargs):
+    context['instrumentation_start'] = time.perf_counter()
+
+
+def end_call(service):
+    def record(parsed, model, context, **kwargs):
+        timer = active
+        if timer is None or 'instrumentation_start' not in context:
+            return
+        timer.count(f'{service}_ms', (time.perf_counter() - context['instrumentation_start']) * 1000)
+        timer.count(f'{service}_calls')
+        if service == 'dynamodb':
+            units = consumed_units(parsed)
+            kind = 'read' if model.name in READ_OPERATIONS else 'write'
+            timer.count(f'dynamodb_{kind}_units', units)
+            if timer.current:
+                timer.count(f'{timer.current}_dynamodb_{kind}_units', units)
+    return record
+
+
+def instrument_client(client):
+    # time every call of a boto3 client (or a resource's client) against the active timer,
+    # dynamodb calls also ask for and count consumed capacity. registered once per client
+    if getattr(client, '_instrumented', False):
+        return client
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+    if service == 'dynamodb':
+        events.register('before-parameter-build.dynamodb.*', ask_for_capacity)
+    events.register(f'before-call.{service}.*', start_call)
+    events.register(f'after-call.{service}.*', end_call(service))
+    client._instrumented = True
+    return client
@@ -0,0 +1,125 @@
+import io
+import json
+import math
+import numpy as np
+
+TREE_MODEL_EXTENSION = '.npz'
+
+ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'default_left', 'is_leaf', 'value')
+
+
+def is_tree_model(path):
+    return path.endswith(TREE_MODEL_EXTENSION)
+
+
+def _parse_base_score(value):
+    # xgboost 2.x writes "4.7E-1", 3.x writes "[4.7E-1]"
+    return float(str(value).strip('[]'))
+
+
+def compile_booster(booster_json):
+    # flattens the trees of a binary:logistic booster (booster.save_raw('json')) into padded
+    # (n_trees, max_nodes) arrays, only json parsing is needed so xgboost is not imported here
+    model = json.loads(booster_json)
+    learner = model['learner']
+
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"unsupported booster objective: {objective}")
+
+    trees = learner['gradient_booster']['model']['trees']
+    if any(any(tree['split_type']) for tree in trees):
+        raise ValueError("categorical splits are not supported")
+
+    n_trees = len(trees)
+    max_nodes = max(len(tree['left_children']) for tree in trees)
+
+    compiled = {
+        'feature': np.zeros((n_trees, max_nodes), dtype=np.int32),
+        'threshold': np.zeros((n_trees, max_nodes), dtype=np.float32),
+        'left': np.zeros((n_trees, max_nodes), dtype=np.int32),
+        'right': np.zeros((n_trees, max_nodes), dtype=np.int32),
+        'default_left': np.zeros((n_trees, max_nodes), dtype=bool),
+        'is_leaf': np.ones((n_trees, max_nodes), dtype=bool),
+        'value': np.zeros((n_trees, max_nodes), dtype=np.float32),
+    }
+
+    max_depth = 0
+    for t, tree in enumerate(trees):
+        left = np.asarray(tree['left_children'], dtype=np.int32)
+        right = np.asarray(tree['right_children'], dtype=np.int32)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        is_leaf = left == -1
+        n = len(left)
+
+        compiled['feature'][t, :n] = np.where(is_leaf, 0, tree['split_indices'])
+        compiled['threshold'][t, :n] = np.where(is_leaf, 0, conditions)
+        # leaves point at themselves so extra traversal steps are no-ops
+        compiled['left'][t, :n] = np.where(is_leaf, np.arange(n), left)
+        compiled['right'][t, :n] = np.where(is_leaf, np.arange(n), right)
+        compiled['default_left'][t, :n] = np.asarray(tree['default_left'], dtype=bool)
+        compiled['is_leaf'][t, :n] = is_leaf
+        # a leaf keeps its value in split_conditions
+        compiled['value'][t, :n] = np.where(is_leaf, conditions, 0)
+
+        depth = np.zeros(n, dtype=np.int32)
+        for node in range(n):
+            if not is_leaf[node]:
+                depth[left[node]] = depth[node] + 1
+                depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+    base_score = _parse_base_score(learner['learner_model_param']['base_score'])
+    compiled['base_margin'] = np.float64(math.log(base_score / (1 - base_score)))
+    compiled['max_depth'] = np.int32(max_depth)
+    compiled['num_feature'] = np.int32(int(learner['learner_model_param']['num_feature']))
+    return compiled
+
+
+class TreeEnsembleModel:
+    # scores rows by walking every tree in lock step, one numpy step per tree level
+
+    def __init__(self, arrays, manifest):
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self.base_margin = float(arrays['base_margin'])
+        self.max_depth = int(arrays['max_depth'])
+        self.num_feature = int(arrays['num_feature'])
+        self.manifest = manifest
+        self.feature_names = manifest['feature_names']
+        self.thresholds = manifest['thresholds']
+        self.tree_index = np.arange(self.feature.shape[0])
+
+    def predict_margin(self, X):
+        # xgboost compares float32 feature values against float32 split conditions
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.num_feature)
+        node = np.zeros((X.shape[0], len(self.tree_index)), dtype=np.int32)
+        trees = self.tree_index
+
+        for _ in range(self.max_depth):
+            x = np.take_along_axis(X, self.feature[trees, node], axis=1)
+            go_left = np.where(np.isnan(x), self.default_left[trees, node], x < self.threshold[trees, node])
+            node = np.where(go_left, self.left[trees, node], self.right[trees, node])
+
+        return self.base_margin + self.value[trees, node].sum(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X):
+        class_one = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        return np.column_stack([1.0 - class_one, class_one])
+
+
+def save_tree_model(compiled, manifest, output_path):
+    # the manifest travels inside the archive so one s3 object is the whole model
+    np.savez_compressed(output_path, manifest=np.array(json.dumps(manifest)), **compiled)
+
+
+def load_tree_model(model_bytes):
+    from feature_utils import get_feature_columns
+
+    with np.load(io.BytesIO(model_bytes), allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files if name != 'manifest'}
+        manifest = json.loads(str(archive['manifest']))
+
+    if manifest.get('feature_names') != get_feature_columns():
+        raise ValueError("model manifest feature order does not match get_feature_columns()")
+    return TreeEnsembleModel(arrays, manifest)
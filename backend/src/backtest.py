@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from xgboost import XGBClassifier
+
+import sys
+sys.path.append('../lambda')
+from feature_utils import get_feature_columns
+from feature_store import load_features
+from market_store import load_market
+from feature_engineering import create_target_variable
+from lambda_handler import classify_probabilities, get_confidence_level, DEFAULT_THRESHOLDS
+from accuracy_summary import compute_accuracy_summary
+from dynamodb_helper import accuracy_metrics_from_summary
+
+RETRAIN_PERIODS = {'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def load_backtest_frame(symbol='SPY', horizon=20):
+    df = load_market(symbol)
+
+    # numpy backend features, what the predictor lambda runs, cached in the feature store
+    df_features = load_features(df, name=symbol)
+    df_features = create_target_variable(df_features, horizon=horizon)
+    # create_target_variable keeps the last rows with a 0 target, they have no future yet
+    df_features = df_features[df_features['future_volatility'].notna()]
+    return df_features.dropna(subset=get_feature_columns())
+
+
+def retrain_positions(index, first, every):
+    # row positions where a new model takes over: every n rows, or the first trading day of each period
+    if isinstance(every, int):
+        return list(range(first, len(index), every))
+    periods = index.to_period(RETRAIN_PERIODS[every])
+    starts = [p for p in range(first, len(index)) if p == first or periods[p] != periods[p - 1]]
+    return starts
+
+
+def walk_forward_folds(index, every='month', mode='expanding', window=756, min_train=504, horizon=20):
+    # (train_start, train_end, test_start, test_end) row ranges, end exclusive. a training label
+    # looks horizon rows ahead, so the last horizon rows before a test block are embargoed
+    starts = retrain_positions(index, min_train + horizon, every)
+    folds = []
+    for test_start, test_end in zip(starts, starts[1:] + [len(index)]):
+        train_end = test_start - horizon
+        train_start = max(0, train_end - window) if mode == 'rolling' else 0
+        folds.append((train_start, train_end, test_start, test_end))
+    return folds
+
+
+def fit_and_score(params, X_train, y_train, X_test):
+    # one fold, runs in a worker process
+    model = XGBClassifier(objective='binary:logistic', eval_metric='logloss', random_state=42, n_jobs=1, **params)
+    model.fit(X_train, y_train)
+    # one predict_proba call, the lambda's class and confidence rule run on its output
+    probabilities = model.predict_proba(X_test)
+    predictions, confidence_scores = classify_probabilities(model, probabilities)
+    return predictions, confidence_scores, probabilities[:, 1]
+
+
+def run_backtest(df_features, params, folds, workers=None):
+    feature_cols = get_feature_columns()
+    X = df_features[feature_cols].values
+    y = df_features['target'].values.astype(int)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(fit_and_score, params, X[train_start:train_end], y[train_start:train_end], X[test_start:test_end])
+            for train_start, train_end, test_start, test_end in folds
+        ]
+        scored = [future.result() for future in futures]
+
+    frames = []
+    for fold, ((train_start, train_end, test_start, test_end), (predictions, confidence_scores, p_increase)) in enumerate(zip(folds, scored)):
+        frames.append(pd.DataFrame({
+            'fold': fold,
+            'train_rows': train_end - train_start,
+            'prediction': predictions,
+            'confidence_score': confidence_scores,
+            'p_increase': p_increase,
+            'target': y[test_start:test_end],
+        }, index=df_features.index[test_start:test_end]))
+    results = pd.concat(frames)
+    results['confidence_level'] = [get_confidence_level(score, DEFAULT_THRESHOLDS) for score in results['confidence_score']]
+    results['target_correct'] = results['prediction'] == results['target']
+
+    # the dashboard checks each prediction against the next day's volatility_20d, the same rule as
+    # lambda_handler.evaluate_prediction over the whole column. the last day has nothing to check against
+    volatility = df_features['volatility_20d']
+    actual_change = (volatility.shift(-1) > volatility).astype(int).reindex(results.index)
+    has_next = volatility.shift(-1).notna().reindex(results.index)
+    results['is_correct'] = (actual_change == results['prediction']).where(has_next)
+    return results
+
+
+def calibration_table(results, bins=10):
+    # predicted probability of an increase vs how often it happened
+    edges = np.linspace(0, 1, bins + 1)
+    bucket = np.clip(np.digitize(results['p_increase'], edges) - 1, 0, bins - 1)
+    rows = []
+    for b in range(bins):
+        in_bucket = results[bucket == b]
+        if len(in_bucket):
+            rows.append({
+                'bin': f"{edges[b]:.1f}-{edges[b + 1]:.1f}",
+                'count': len(in_bucket),
+                'mean_predicted': float(in_bucket['p_increase'].mean()),
+                'observed_rate': float(in_bucket['target'].mean())
+            })
+    return rows
+
+
+def build_report(results, period='M', look_ahead=False):
+    # the /analytics/accuracy numbers (next-day check, same code as the summary item), accuracy
+    # against the 20-day target, brier score, calibration bins and accuracy per period
+    verified = results[results['is_correct'].notna()]
+    items = [
+        {'date': date.strftime('%Y-%m-%d'), 'is_correct': bool(row.is_correct), 'confidence_level': row.confidence_level}
+        for date, row in verified.iterrows()
+    ]
+    # same numbers /analytics/accuracy would show if these predictions were in the table
+    dashboard = accuracy_metrics_from_summary(compute_accuracy_summary(items, now=results.index[-1]), now=results.index[-1])
+
+    by_period = verified.groupby(verified.index.to_period(period)).agg(
+        count=('is_correct', 'size'), accuracy=('is_correct', 'mean'), target_accuracy=('target_correct', 'mean')
+    )
+
+    return {
+        # true when the hyperparameters were tuned on the test blocks, every number below is then
+        # an optimistic bound and not comparable with a walk-forward that tunes inside each fold
+        'optimistic': look_ahead,
+        'start': results.index[0].strftime('%Y-%m-%d'),
+        'end': results.index[-1].strftime('%Y-%m-%d'),
+        'folds': int(results['fold'].nunique()),
+        'dashboard_metrics': dashboard,
+        'target_accuracy': float(results['target_correct'].mean()),
+        'brier_score': float(((results['p_increase'] - results['target']) ** 2).mean()),
+        'calibration': calibration_table(results),
+        'by_period': [
+            {'period': str(p), 'count': int(r['count']), 'accuracy': float(r['accuracy']), 'target_accuracy': float(r['target_accuracy'])}
+            for p, r in by_period.iterrows()
+        ]
+    }
+
+
+def print_report(report):
+    metrics = report['dashboard_metrics']
+    label = ' (optimistic)' if report['optimistic'] else ''
+    print(f"\nBacktest {report['start']} to {report['end']} ({report['folds']} folds){label}")
+    if report['optimistic']:
+        print(f"  OPTIMISTIC: {report['hyperparameters']['note']}")
+    print(f"  {'next-day accuracy (dashboard)' + label + ':':<45}{metrics['accuracy_rate']:.1%} of {metrics['total_predictions']}")
+    print(f"  {'20-day target accuracy' + label + ':':<45}{report['target_accuracy']:.1%}")
+    print(f"  {'brier score' + label + ':':<45}{report['brier_score']:.4f}")
+    for level, bucket in metrics['by_confidence'].items():
+        print(f"  {level:<6} confidence: {bucket['rate']:.1%} of {bucket['total']}")
+    print("\n  calibration (p increase -> observed):")
+    for row in report['calibration']:
+        print(f"    {row['bin']}: {row['mean_predicted']:.2f} -> {row['observed_rate']:.2f} ({row['count']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='walk-forward backtest of the volatility model')
+    parser.add_argument('--symbol', default='SPY')
+    parser.add_argument('--params', default='../models/best_hyperparameters.json')
+    parser.add_argument('--retrain', default='month', help='week, month, quarter, year or a number of trading days')
+    parser.add_argument('--mode', choices=['expanding', 'rolling'], default='expanding')
+    parser.add_argument('--window', type=int, default=756, help='training rows in rolling mode')
+    parser.add_argument('--min-train', type=int, default=504)
+    parser.add_argument('--horizon', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='../models/backtest_report.json')
+    parser.add_argument('--predictions', default='../data/backtest_predictions.csv')
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        params = json.load(f)
+    every = int(args.retrain) if args.retrain.isdigit() else args.retrain
+
+    start = time.perf_counter()
+    df_features = load_backtest_frame(args.symbol, args.horizon)
+    folds = walk_forward_folds(df_features.index, every, args.mode, args.window, args.min_train, args.horizon)
+    print(f"Backtesting {len(df_features)} rows in {len(folds)} folds ({args.mode}, retrain every {args.retrain}, {args.workers} workers)")
+
+    results = run_backtest(df_features, params, folds, args.workers)
+    # every fold trains with the same parameters, tuned by feature_engineering.py on the whole
+    # history. that search saw the test blocks, so the numbers are optimistic by whatever it learned
+    report = build_report(results, look_ahead=True)
+    report['hyperparameters'] = {
+        'path': args.params,
+        'look_ahead': True,
+        'note': 'hyperparameters were tuned on the full history, test blocks included, scores carry that look-ahead and are not walk-forward estimates'
+    }
+    print_report(report)
+
+    results.to_csv(args.predictions)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {args.output}, predictions to {args.predictions}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
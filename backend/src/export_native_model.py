@@ -0,0 +1,27 @@
+import pickle
+import pandas as pd
+
+import sys
+sys.path.append('../lambda')
+from feature_utils import get_feature_columns
+from feature_engineering import export_native_model, export_tree_model
+
+
+def main(model_path='../models/xgboost_tuned.pkl', features_path='../data/SPY_features.csv',
+         output_path='../models/xgboost_tuned.ubj', tree_output_path='../models/xgboost_tuned.npz'):
+    # converts an already trained pickle, the training data hash comes from the saved feature csv
+    print(f"Loading model from {model_path}")
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+
+    df_features = pd.read_csv(features_path, index_col='Date', parse_dates=True)
+    feature_cols = get_feature_columns()
+    X = df_features[feature_cols].values
+    y = df_features['target'].values
+
+    export_native_model(model, feature_cols, X, y, output_path)
+    export_tree_model(model, feature_cols, X, y, tree_output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
+import hashlib
+import json
+import os
+import xgboost
 from skopt import BayesSearchCV
 from skopt.space import Real, Integer
 from xgboost import XGBClassifier
@@ -9,10 +14,15 @@ from sklearn.model_selection import TimeSeriesSplit
 import sys
 sys.path.append('../lambda')
 from feature_utils import engineer_features, get_feature_columns
+from feature_store import load_features
+from market_store import load_market
+from native_model import manifest_path_for
+from tree_model import compile_booster, save_tree_model
 
 
-def create_target_variable(df, horizon=20):
-    df = df.copy()
+def create_target_variable(df, horizon=20, copy=True):
+    if copy:
+        df = df.copy()
 
     df['future_volatility'] = df['volatility_20d'].shift(-horizon)
     df['target'] = (df['future_volatility'] > df['volatility_20d']).astype(int)
@@ -74,47 +84,148 @@ def save_feature_importance(model, feature_names, output_path='../models/feature
     print(importances.head(10).to_string(index=False))
 
 
+# decision cut and confidence levels the predictor applies to the class-1 probability
+MODEL_THRESHOLDS = {'decision': 0.5, 'high': 0.70, 'medium': 0.55}
+
+
+def training_data_hash(X, y):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def build_model_manifest(booster, feature_names, X, y, model_format, model_file):
+    return {
+        'format': model_format,
+        'model_file': model_file,
+        # what the booster was trained with, the lambda refuses anything but binary:logistic
+        'objective': json.loads(booster.save_config())['learner']['objective']['name'],
+        'feature_names': list(feature_names),
+        'thresholds': MODEL_THRESHOLDS,
+        'num_boosted_rounds': booster.num_boosted_rounds(),
+        'training_rows': int(len(y)),
+        'training_data_sha256': training_data_hash(X, y),
+        'xgboost_version': xgboost.__version__,
+    }
+
+
+def export_native_model(model, feature_names, X, y, output_path='../models/xgboost_tuned.ubj'):
+    # native booster file (ubj or json, picked from the extension) plus a manifest the lambda
+    # loader checks before it serves the model
+    model_format = os.path.splitext(output_path)[1].lstrip('.')
+    if model_format not in ('ubj', 'json'):
+        raise ValueError(f"native model must end in .ubj or .json, got {output_path}")
+
+    booster = model.get_booster()
+    booster.save_model(output_path)
+
+    manifest = build_model_manifest(booster, feature_names, X, y, model_format, os.path.basename(output_path))
+    manifest_path = manifest_path_for(output_path)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Native model saved to {output_path} (manifest: {manifest_path})")
+    return manifest
+
+
+def export_tree_model(model, feature_names, X, y, output_path='../models/xgboost_tuned.npz'):
+    # flat numpy arrays for the xgboost-free evaluator in lambda/tree_model.py
+    booster = model.get_booster()
+    compiled = compile_booster(booster.save_raw('json'))
+
+    manifest = build_model_manifest(booster, feature_names, X, y, 'trees', os.path.basename(output_path))
+    save_tree_model(compiled, manifest, output_path)
+
+    print(f"Tree model saved to {output_path} ({compiled['feature'].shape[0]} trees, depth {int(compiled['max_depth'])})")
+    return manifest
+
+
 def main():
+    parser = argparse.ArgumentParser(description='engineer features and train the volatility model')
+    parser.add_argument('--search', choices=['halving', 'bayes'], default='halving',
+                        help='halving: tuning.py (shared fold matrices, early stopping, pruning), bayes: BayesSearchCV')
+    parser.add_argument('--n-iter', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--profile', choices=['cprofile', 'sample'],
+                        help='profile the feature and target computation, files go to backend/data/profiles')
+    parser.add_argument('--profile-backend', choices=['pandas', 'numpy'], default='pandas',
+                        help='feature backend while profiling, pandas has one calculate_* function per indicator')
+    parser.add_argument('--profile-only', action='store_true', help='stop after the profiled feature computation')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='float32: one float32 feature block from the numpy backend, about half the memory')
+    args = parser.parse_args()
+
     print("Loading SPY data...")
-    df = pd.read_csv('../data/SPY_raw.csv')
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.set_index('Date')
+    # memory mapped columns, SPY_raw.csv is imported when it changed
+    df = load_market('SPY')
 
     print(f"Loaded {len(df)} rows from {df.index[0]} to {df.index[-1]}")
 
-    print("\nEngineering features...")
-    df_features = engineer_features(df)
-
-    print("Creating target variable...")
-    df_features = create_target_variable(df_features, horizon=20)
+    if args.profile:
+        from profiling import profiled
+
+        # computed from scratch, the feature store would only show a cache hit
+        print(f"\nEngineering features and target ({args.profile_backend} backend, {args.profile} profile)...")
+        with profiled('feature_engineering', len(df), args.profile):
+            df_features = engineer_features(df, backend=args.profile_backend)
+            df_features = create_target_variable(df_features, horizon=20)
+        if args.profile_only:
+            return
+    elif args.dtype == 'float32':
+        # the feature store keeps float64 rows (its appends continue from the stored emas), the
+        # float32 block is computed here and neither step copies the frame. about half the memory
+        # for long histories (memory section of backend/benchmarks/README.md), and xgboost casts its
+        # input to float32 itself, so it trains on the same values either way
+        print("\nEngineering features (float32)...")
+        df_features = engineer_features(df, backend='numpy', dtype=np.float32, copy=False)
+
+        print("Creating target variable...")
+        df_features = create_target_variable(df_features, horizon=20, copy=False)
+    else:
+        print("\nEngineering features...")
+        # cached under data/feature_store, only new rows are computed after a data update
+        df_features = load_features(df)
+
+        print("Creating target variable...")
+        df_features = create_target_variable(df_features, horizon=20)
 
     feature_cols = get_feature_columns()
     df_features = df_features.dropna(subset=feature_cols)
 
     print(f"\nFinal dataset: {len(df_features)} rows with {len(feature_cols)} features")
 
-    output_csv = '../data/SPY_features.csv'
+    # SPY_features.csv is the float64 reference the parity tests and export_native_model.py read,
+    # a float32 run keeps it and writes its own file
+    output_csv = '../data/SPY_features.csv' if args.dtype == 'float64' else f'../data/SPY_features_{args.dtype}.csv'
     df_features.to_csv(output_csv)
     print(f"Saved features to {output_csv}")
 
-    X = df_features[feature_cols].values
+    # a view of the feature block on pandas 3 (copy on write), pandas 2 copies the selected columns
+    X = df_features[feature_cols].to_numpy()
     y = df_features['target'].values
 
     print(f"\nTarget distribution:")
     print(f"  Volatility will increase: {y.sum()} ({y.mean():.1%})")
     print(f"  Volatility will decrease: {len(y) - y.sum()} ({(1-y.mean()):.1%})")
 
-    model, best_params, cv_score = train_model_with_tuning(X, y, n_iter=40)
+    if args.search == 'halving':
+        from tuning import tune_model
+        model, best_params, cv_score = tune_model(X, y, n_iter=args.n_iter, workers=args.workers)
+    else:
+        model, best_params, cv_score = train_model_with_tuning(X, y, n_iter=args.n_iter)
 
     model_path = '../models/xgboost_tuned.pkl'
     with open(model_path, 'wb') as f:
         pickle.dump(model, f)
     print(f"\nModel saved to {model_path}")
 
+    export_native_model(model, feature_cols, X, y)
+    export_tree_model(model, feature_cols, X, y)
+
     save_feature_importance(model, feature_cols)
 
     params_path = '../models/best_hyperparameters.json'
-    import json
     with open(params_path, 'w') as f:
         json.dump(best_params, f, indent=2)
     print(f"Best parameters saved to {params_path}")
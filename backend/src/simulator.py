@@ -0,0 +1,210 @@
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import sys
+sys.path.append('../lambda')
+from market_store import load_market
+
+TRADING_DAYS = 252
+LEVEL_CODES = {'low': 0, 'medium': 1, 'high': 2}
+
+
+def load_prices(symbol='SPY'):
+    return load_market(symbol)
+
+
+def load_backtest_predictions(csv_path='../data/backtest_predictions.csv'):
+    # written by backtest.py
+    return pd.read_csv(csv_path, index_col='Date', parse_dates=True)[['prediction', 'p_increase', 'confidence_level']]
+
+
+def load_dynamodb_predictions():
+    # stored predictions only keep the winning class probability, p_increase is rebuilt from it
+    from dynamodb_helper import get_table, query_predictions
+
+    items = query_predictions(get_table(), ascending=True, fields=['date', 'prediction', 'confidence_score', 'confidence_level'])
+    df = pd.DataFrame(items)
+    df['Date'] = pd.to_datetime(df['date'])
+    df['prediction'] = df['prediction'].astype(int)
+    confidence = df['confidence_score'].astype(float)
+    df['p_increase'] = np.where(df['prediction'] == 1, confidence, 1 - confidence)
+    return df.set_index('Date')[['prediction', 'p_increase', 'confidence_level']]
+
+
+def build_market(prices, predictions):
+    # arrays over the prediction days. a signal from the close of day t trades the return
+    # from t to the next trading day, nothing after the close of t is used for the position
+    close = prices['Close']
+    returns = close.pct_change()
+    next_return = (close.shift(-1) / close - 1)
+    # expected absolute daily move under a normal at the trailing 20 day volatility, the straddle premium
+    expected_move = returns.rolling(20).std() * np.sqrt(2 / np.pi)
+
+    dates = predictions.index.intersection(close.index[:-1])
+    predictions = predictions.loc[dates]
+    return {
+        'dates': dates.values,
+        'next_return': next_return.loc[dates].values,
+        'expected_move': expected_move.loc[dates].fillna(0).values,
+        'prediction': predictions['prediction'].values.astype(np.int8),
+        'p_increase': predictions['p_increase'].values.astype(np.float64),
+        'level': predictions['confidence_level'].map(LEVEL_CODES).fillna(0).values.astype(np.int8),
+    }
+
+
+# every strategy maps a (P,) column of each parameter onto (P, T) arrays of daily exposure and
+# gross return, one row per parameter combination
+
+
+def derisk_strategy(market, params):
+    # long SPY, cut to `floor` on days the model gives an increase more than `threshold`
+    threshold = params['threshold'][:, None]
+    floor = params['floor'][:, None]
+    exposure = np.where(market['p_increase'][None, :] > threshold, floor, 1.0)
+    return exposure, exposure * market['next_return'][None, :]
+
+
+def confidence_strategy(market, params):
+    # long SPY, the exposure on volatility-up days depends on how confident the model is
+    by_level = np.stack([params['up_low'], params['up_medium'], params['up_high']], axis=1)
+    up_exposure = by_level[:, market['level']]
+    exposure = np.where(market['prediction'][None, :] == 1, up_exposure, 1.0)
+    return exposure, exposure * market['next_return'][None, :]
+
+
+def straddle_strategy(market, params):
+    # one day straddle proxy: long pays |move| - premium, the premium is premium_mult times the
+    # expected move. long above `threshold`, short below 1 - threshold when allow_short is set
+    p = market['p_increase'][None, :]
+    threshold = params['threshold'][:, None]
+    side = np.where(p >= threshold, 1.0, 0.0)
+    side = np.where((p <= 1 - threshold) & (params['allow_short'][:, None] > 0), -1.0, side)
+    exposure = side * params['size'][:, None]
+    payoff = np.abs(market['next_return'])[None, :] - params['premium_mult'][:, None] * market['expected_move'][None, :]
+    return exposure, exposure * payoff
+
+
+STRATEGIES = {
+    'derisk': derisk_strategy,
+    'confidence': confidence_strategy,
+    'straddle': straddle_strategy,
+}
+
+DEFAULT_GRIDS = {
+    'derisk': {'threshold': np.linspace(0.40, 0.80, 41), 'floor': np.linspace(0.0, 1.0, 21)},
+    'confidence': {'up_low': np.linspace(0, 1, 11), 'up_medium': np.linspace(0, 1, 11), 'up_high': np.linspace(0, 1, 11)},
+    'straddle': {
+        'threshold': np.linspace(0.50, 0.70, 21), 'premium_mult': np.linspace(0.8, 1.3, 11),
+        'size': np.array([0.25, 0.5, 1.0, 2.0, 4.0]), 'allow_short': np.array([0.0, 1.0])
+    },
+}
+
+
+def param_grid(ranges):
+    # every combination as one column per parameter
+    names = list(ranges)
+    combos = np.array(list(itertools.product(*(ranges[name] for name in names))), dtype=np.float64)
+    return {name: combos[:, i] for i, name in enumerate(names)}
+
+
+def performance(exposure, gross, cost_bps=1.0):
+    # per row metrics of (P, T) arrays (cagr, sharpe, max drawdown, turnover, exposure), computed
+    # column-wise for every combination at once, trading costs on every change in exposure
+    turnover = np.abs(np.diff(exposure, axis=1, prepend=0.0))
+    net = gross - turnover * cost_bps / 1e4
+
+    equity = np.cumprod(1 + net, axis=1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+    years = net.shape[1] / TRADING_DAYS
+    mean = net.mean(axis=1)
+    std = net.std(axis=1)
+
+    return {
+        'total_return': equity[:, -1] - 1,
+        'cagr': np.sign(equity[:, -1]) * np.abs(equity[:, -1]) ** (1 / years) - 1,
+        'ann_vol': std * np.sqrt(TRADING_DAYS),
+        'sharpe': np.divide(mean, std, out=np.zeros_like(mean), where=std > 0) * np.sqrt(TRADING_DAYS),
+        'max_drawdown': drawdown.min(axis=1),
+        'turnover': turnover.mean(axis=1),
+        'avg_exposure': np.abs(exposure).mean(axis=1),
+    }
+
+
+def simulate_chunk(strategy, market, params, cost_bps):
+    exposure, gross = STRATEGIES[strategy](market, params)
+    return performance(exposure, gross, cost_bps)
+
+
+def sweep(strategy, market, grid, cost_bps=1.0, workers=None, chunk_size=512):
+    # chunks keep each (P, T) block small, the chunks run on a process pool
+    n = len(next(iter(grid.values())))
+    chunks = [{name: values[i:i + chunk_size] for name, values in grid.items()} for i in range(0, n, chunk_size)]
+
+    if workers == 1:
+        results = [simulate_chunk(strategy, market, chunk, cost_bps) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_chunk, [strategy] * len(chunks), [market] * len(chunks), chunks, [cost_bps] * len(chunks)))
+
+    table = pd.DataFrame({name: values for name, values in grid.items()})
+    for metric in results[0]:
+        table[metric] = np.concatenate([r[metric] for r in results])
+    table.insert(0, 'strategy', strategy)
+    return table
+
+
+def equity_curve(strategy, market, params, cost_bps=1.0):
+    # one combination as a dated series, params are plain numbers
+    exposure, gross = STRATEGIES[strategy](market, {name: np.array([value], dtype=np.float64) for name, value in params.items()})
+    turnover = np.abs(np.diff(exposure, axis=1, prepend=0.0))
+    net = gross - turnover * cost_bps / 1e4
+    return pd.Series(np.cumprod(1 + net[0]), index=pd.DatetimeIndex(market['dates']), name=strategy)
+
+
+def buy_and_hold(market, cost_bps=1.0):
+    exposure = np.ones((1, len(market['next_return'])))
+    return {name: float(value[0]) for name, value in performance(exposure, exposure * market['next_return'][None, :], cost_bps).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='strategy sweep over the model predictions')
+    parser.add_argument('--symbol', default='SPY')
+    parser.add_argument('--predictions', default='../data/backtest_predictions.csv', help="backtest csv, or 'dynamodb' for the stored predictions")
+    parser.add_argument('--strategy', choices=list(STRATEGIES) + ['all'], default='all')
+    parser.add_argument('--cost-bps', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--output', default='../data/simulation_sweep.csv')
+    args = parser.parse_args()
+
+    if args.predictions == 'dynamodb':
+        predictions = load_dynamodb_predictions()
+    else:
+        predictions = load_backtest_predictions(args.predictions)
+    market = build_market(load_prices(args.symbol), predictions)
+    print(f"Simulating {len(market['dates'])} days from {pd.Timestamp(market['dates'][0]).date()} to {pd.Timestamp(market['dates'][-1]).date()}")
+
+    benchmark = buy_and_hold(market, args.cost_bps)
+    print(f"buy and hold: sharpe {benchmark['sharpe']:.2f}, cagr {benchmark['cagr']:.1%}, max drawdown {benchmark['max_drawdown']:.1%}")
+
+    strategies = list(STRATEGIES) if args.strategy == 'all' else [args.strategy]
+    tables = []
+    for strategy in strategies:
+        grid = param_grid(DEFAULT_GRIDS[strategy])
+        start = time.perf_counter()
+        table = sweep(strategy, market, grid, args.cost_bps, args.workers)
+        print(f"\n{strategy}: {len(table)} combinations in {time.perf_counter() - start:.2f}s")
+        print(table.sort_values('sharpe', ascending=False).head(args.top).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        tables.append(table)
+
+    pd.concat(tables, ignore_index=True).to_csv(args.output, index=False)
+    print(f"\nSweep saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from backtest import walk_forward_folds, retrain_positions, run_backtest, build_report
+from feature_utils import get_feature_columns
+
+
+def business_days(rows, start='2020-01-01'):
+    return pd.bdate_range(start, periods=rows, name='Date')
+
+
+def test_folds_embargo_and_windows(rows=900, min_train=504, horizon=20, window=300):
+    index = business_days(rows)
+    expanding = walk_forward_folds(index, 'month', 'expanding', window, min_train, horizon)
+    rolling = walk_forward_folds(index, 'month', 'rolling', window, min_train, horizon)
+
+    # test blocks tile everything after the first min_train + horizon rows, one per month
+    assert expanding[0][2] == min_train + horizon
+    assert expanding[-1][3] == rows
+    for (_, _, _, end), (_, _, start, _) in zip(expanding, expanding[1:]):
+        assert end == start
+    for _, _, test_start, test_end in expanding:
+        months = index[test_start:test_end].to_period('M')
+        assert (months == months[0]).all()
+        if test_start > min_train + horizon:
+            assert index[test_start - 1].month != index[test_start].month
+
+    for (e_start, e_end, e_test, e_test_end), (r_start, r_end, r_test, r_test_end) in zip(expanding, rolling):
+        assert (e_test, e_test_end) == (r_test, r_test_end)
+        # the last training label looks horizon rows ahead, it ends right before the test block
+        assert e_end == r_end == e_test - horizon
+        assert e_end + horizon - 1 < e_test
+        assert e_start == 0
+        assert r_start == max(0, r_end - window) and r_end - r_start <= window
+    assert rolling[-1][1] - rolling[-1][0] == window
+
+
+def test_retrain_every_n_rows(rows=700, first=524):
+    index = business_days(rows)
+    assert retrain_positions(index, first, 50) == list(range(first, rows, 50))
+    folds = walk_forward_folds(index, 50, 'expanding', min_train=504, horizon=20)
+    assert [f[2] for f in folds] == list(range(first, rows, 50))
+    assert all(test_end - test_start <= 50 for _, _, test_start, test_end in folds)
+
+
+def test_predictions_come_from_their_fold(rows=640, min_train=504, horizon=20):
+    # random features, the target is the sign of one of them. every row is scored by its own fold's model
+    rng = np.random.default_rng(3)
+    index = business_days(rows)
+    feature_cols = get_feature_columns()
+    df = pd.DataFrame(rng.normal(size=(rows, len(feature_cols))), columns=feature_cols, index=index)
+    df['volatility_20d'] = np.abs(df['volatility_20d'])
+    df['target'] = (df['returns'] > 0).astype(int)
+
+    folds = walk_forward_folds(index, 'quarter', 'expanding', min_train=min_train, horizon=horizon)
+    results = run_backtest(df, {'n_estimators': 5, 'max_depth': 2}, folds, workers=1)
+    assert results.index.equals(index[folds[0][2]:])
+    assert list(results['fold'].unique()) == list(range(len(folds)))
+    for fold, (train_start, train_end, _, _) in enumerate(folds):
+        assert (results.loc[results['fold'] == fold, 'train_rows'] == train_end - train_start).all()
+    assert results['is_correct'].isna().sum() == 1
+
+    # class and confidence come from the same probabilities as p_increase
+    assert (results['prediction'] == (results['p_increase'] > 0.5)).all()
+    assert np.allclose(results['confidence_score'], np.maximum(results['p_increase'], 1 - results['p_increase']))
+    assert build_report(results, look_ahead=True)['optimistic'] and not build_report(results)['optimistic']
+
+
+if __name__ == "__main__":
+    test_folds_embargo_and_windows()
+    test_retrain_every_n_rows()
+    test_predictions_come_from_their_fold()
+    print("backtest fold tests passed")
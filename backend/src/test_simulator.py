@@ -0,0 +1,104 @@
+import math
+import numpy as np
+import pandas as pd
+from simulator import TRADING_DAYS, build_market, param_grid, sweep, equity_curve
+
+
+def synthetic_market(days=300, seed=5):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2022-01-03', periods=days + 1, name='Date')
+    prices = pd.DataFrame({'Close': 400 * np.cumprod(1 + rng.normal(0.0003, 0.012, days + 1))}, index=dates)
+    p_increase = rng.uniform(0.2, 0.8, days)
+    predictions = pd.DataFrame({
+        'prediction': (p_increase > 0.5).astype(int),
+        'p_increase': p_increase,
+        'confidence_level': rng.choice(['low', 'medium', 'high'], days),
+    }, index=dates[:-1])
+    return prices, build_market(prices, predictions)
+
+
+def exposure_on(strategy, params, market, t):
+    # the strategies written out for one day
+    p = market['p_increase'][t]
+    if strategy == 'derisk':
+        return params['floor'] if p > params['threshold'] else 1.0
+    if strategy == 'confidence':
+        if market['prediction'][t] != 1:
+            return 1.0
+        return params[['up_low', 'up_medium', 'up_high'][market['level'][t]]]
+    side = 1.0 if p >= params['threshold'] else 0.0
+    if p <= 1 - params['threshold'] and params['allow_short'] > 0:
+        side = -1.0
+    return side * params['size']
+
+
+def loop_reference(strategy, params, market, cost_bps):
+    net, exposures, turnovers = [], [], []
+    previous = 0.0
+    for t in range(len(market['dates'])):
+        exposure = exposure_on(strategy, params, market, t)
+        move = market['next_return'][t]
+        if strategy == 'straddle':
+            move = abs(move) - params['premium_mult'] * market['expected_move'][t]
+        turnover = abs(exposure - previous)
+        net.append(exposure * move - turnover * cost_bps / 1e4)
+        exposures.append(exposure)
+        turnovers.append(turnover)
+        previous = exposure
+
+    equity, peak, max_drawdown = 1.0, 1.0, 0.0
+    for r in net:
+        equity *= 1 + r
+        peak = max(peak, equity)
+        max_drawdown = min(max_drawdown, equity / peak - 1)
+    mean = sum(net) / len(net)
+    std = math.sqrt(sum((r - mean) ** 2 for r in net) / len(net))
+    years = len(net) / TRADING_DAYS
+    return {
+        'total_return': equity - 1,
+        'cagr': math.copysign(abs(equity) ** (1 / years), equity) - 1,
+        'ann_vol': std * math.sqrt(TRADING_DAYS),
+        'sharpe': mean / std * math.sqrt(TRADING_DAYS) if std > 0 else 0.0,
+        'max_drawdown': max_drawdown,
+        'turnover': sum(turnovers) / len(turnovers),
+        'avg_exposure': sum(abs(e) for e in exposures) / len(exposures),
+    }
+
+
+def test_grid_rows_match_a_daily_loop(cost_bps=2.0):
+    _, market = synthetic_market()
+    grids = {
+        'derisk': {'threshold': np.array([0.45, 0.6]), 'floor': np.array([0.0, 0.5])},
+        'confidence': {'up_low': np.array([1.0]), 'up_medium': np.array([0.5, 0.8]), 'up_high': np.array([0.0, 0.25])},
+        'straddle': {'threshold': np.array([0.55, 0.65]), 'premium_mult': np.array([0.9]),
+                     'size': np.array([0.5, 2.0]), 'allow_short': np.array([0.0, 1.0])},
+    }
+    for strategy, ranges in grids.items():
+        # chunk_size 3 splits the grid, every chunk has to line up with its parameters
+        table = sweep(strategy, market, param_grid(ranges), cost_bps, workers=1, chunk_size=3)
+        assert len(table) == np.prod([len(v) for v in ranges.values()])
+        for _, row in table.iterrows():
+            params = {name: row[name] for name in ranges}
+            expected = loop_reference(strategy, params, market, cost_bps)
+            for metric, value in expected.items():
+                assert math.isclose(row[metric], value, rel_tol=1e-9, abs_tol=1e-12), (strategy, params, metric)
+
+        params = {name: values[-1] for name, values in ranges.items()}
+        curve = equity_curve(strategy, market, params, cost_bps)
+        assert math.isclose(curve.iloc[-1] - 1, loop_reference(strategy, params, market, cost_bps)['total_return'], rel_tol=1e-9)
+
+
+def test_signal_trades_the_next_close():
+    prices, market = synthetic_market(days=50)
+    close = prices['Close']
+    # the last price day has no next close, it is never traded
+    assert len(market['dates']) == len(prices) - 1
+    for t in (0, 20, 48):
+        assert math.isclose(market['next_return'][t], close.iloc[t + 1] / close.iloc[t] - 1)
+    assert (market['expected_move'][:20] == 0).all() and (market['expected_move'][20:] > 0).all()
+
+
+if __name__ == "__main__":
+    test_grid_rows_match_a_daily_loop()
+    test_signal_trades_the_next_close()
+    print("simulator tests passed")
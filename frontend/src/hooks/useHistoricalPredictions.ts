@@ -4,7 +4,7 @@ import { predictionService } from '@/services/api';
 export const useHistoricalPredictions = (days = 90) => {
   return useQuery({
     queryKey: ['predictions', 'historical', days],
-    queryFn: () => predictionService.getAll(days),
+    queryFn: () => predictionService.getHistory(days),
     staleTime: 1000 * 60 * 60 * 24,
     refetchOnWindowFocus: false,
   });
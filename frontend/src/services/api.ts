@@ -51,6 +51,24 @@ function normalizePrediction(data: Record<string, unknown>): Prediction {
   };
 }
 
+// what HistoricalChart draws, the reader skips the key features and verification fields
+const HISTORY_FIELDS = ['date', 'prediction', 'prediction_text', 'confidence_score', 'confidence_level'];
+const HISTORY_PAGE_SIZE = 30;
+
+interface PredictionPage {
+  items: Prediction[];
+  nextCursor?: string;
+}
+
+// newest first, the next page's cursor comes back in the X-Next-Cursor header
+const getPredictionPage = (limit: number, fields?: string[], cursor?: string): Promise<PredictionPage> =>
+  api.get('/predictions/all', {
+    params: { limit, fields: fields?.join(','), cursor },
+  }).then(res => ({
+    items: (res.data as Record<string, unknown>[]).map(normalizePrediction),
+    nextCursor: res.headers['x-next-cursor'] || undefined,
+  }));
+
 export const predictionService = {
   getLatest: () =>
     api.get('/predictions/latest').then(res => normalizePrediction(res.data)),
@@ -59,6 +77,21 @@ export const predictionService = {
     api.get(`/predictions/all?limit=${limit}`).then(res =>
       (res.data as Record<string, unknown>[]).map(normalizePrediction)
     ),
+
+  getPage: getPredictionPage,
+
+  getHistory: async (days = 90): Promise<Prediction[]> => {
+    const predictions: Prediction[] = [];
+    let cursor: string | undefined;
+    do {
+      const page = await getPredictionPage(
+        Math.min(HISTORY_PAGE_SIZE, days - predictions.length), HISTORY_FIELDS, cursor
+      );
+      predictions.push(...page.items);
+      cursor = page.nextCursor;
+    } while (cursor && predictions.length < days);
+    return predictions;
+  },
 };
 
 export const analyticsService = {
@@ -1,11 +1,14 @@
-import requests
 import pandas as pd
 import numpy as np
+import os
 import pickle
 from xgboost import XGBClassifier
 import sys
 sys.path.append('backend/lambda')
-from feature_utils import engineer_features, get_feature_columns
+from feature_utils import get_feature_columns
+from feature_store import load_features
+from market_store import MarketStore, source_stat
+from market_fetcher import fetch_daily_frames
 
 print("QUICK SETUP - Get data and train model")
 print("=" * 50)
@@ -15,45 +18,23 @@ API_KEY = input("enter your alpha vantage api key: ").strip()
 
 # download data
 print("\n1. downloading SPY data (100 days)...")
-url = "https://www.alphavantage.co/query"
-params = {
-    'function': 'TIME_SERIES_DAILY',
-    'symbol': 'SPY',
-    'outputsize': 'compact',
-    'apikey': API_KEY,
-    'datatype': 'csv'
-}
-
-response = requests.get(url, params=params)
-
-if response.status_code != 200:
-    print(f"error downloading data: {response.status_code}")
-    print(response.text)
-    exit(1)
+# rate limited, retried and cached under backend/data/http_cache
+results = fetch_daily_frames(API_KEY, ['SPY'], cache_dir='backend/data/http_cache')
+df = results[('SPY', None, None)]
 
-# save and process data
-with open('backend/data/SPY_raw.csv', 'w') as f:
-    f.write(response.text)
+if isinstance(df, Exception):
+    print(f"error downloading data: {df}")
+    exit(1)
 
-df = pd.read_csv('backend/data/SPY_raw.csv')
-df = df.rename(columns={
-    'timestamp': 'Date',
-    'open': 'Open',
-    'high': 'High',
-    'low': 'Low',
-    'close': 'Close',
-    'volume': 'Volume'
-})
-df = df.sort_values('Date')
-df.to_csv('backend/data/SPY_raw.csv', index=False)
+# store it as typed columns and keep a csv copy
+df.to_csv('backend/data/SPY_raw.csv')
+MarketStore().write('SPY', df, source=source_stat('backend/data/SPY_raw.csv'))
 
-print(f"   downloaded {len(df)} rows ({df['Date'].min()} to {df['Date'].max()})")
+print(f"   downloaded {len(df)} rows ({df.index.min().date()} to {df.index.max().date()})")
 
 # engineer features
 print("\n2. engineering features...")
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.set_index('Date')
-df_features = engineer_features(df)
+df_features = load_features(df)
 
 # create target (simple: will volatility increase tomorrow?)
 df_features['future_vol'] = df_features['volatility_20d'].shift(-1)
@@ -85,21 +66,28 @@ with open(model_path, 'wb') as f:
 
 print(f"   model saved to {model_path}")
 
+# the lambda serves the compiled numpy trees, not the pickle
+sys.path.append('backend/src')
+from feature_engineering import export_tree_model
+tree_model_path = 'backend/models/xgboost_tuned.npz'
+export_tree_model(model, feature_cols, X, y, tree_model_path)
+
 # upload to s3
 print("\n4. uploading to s3...")
 import boto3
 s3 = boto3.client('s3')
 try:
-    s3.upload_file(
-        model_path,
-        'volatility-trading-models-1767821459',
-        'models/xgboost_tuned.pkl'
-    )
-    print("   ✓ uploaded to s3://volatility-trading-models-1767821459/models/xgboost_tuned.pkl")
+    for path in (model_path, tree_model_path):
+        s3.upload_file(
+            path,
+            'volatility-trading-models-1767821459',
+            f'models/{os.path.basename(path)}'
+        )
+        print(f"   ✓ uploaded to s3://volatility-trading-models-1767821459/models/{os.path.basename(path)}")
 except Exception as e:
     print(f"   error uploading to s3: {e}")
     print("   you can upload manually with:")
-    print("   aws s3 cp backend/models/xgboost_tuned.pkl s3://volatility-trading-models-1767821459/models/")
+    print("   aws s3 cp backend/models/xgboost_tuned.npz s3://volatility-trading-models-1767821459/models/")
 
 print("\n" + "=" * 50)
 print("✓ SETUP COMPLETE!")
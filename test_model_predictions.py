@@ -1,22 +1,30 @@
 import pickle
+import numpy as np
 import pandas as pd
 import sys
 sys.path.append('backend/lambda')
 from feature_utils import engineer_features, get_feature_columns
+from feature_store import load_features
+from market_store import load_market
+from profiling import profiled
 
 # load model
 with open('backend/models/xgboost_tuned.pkl', 'rb') as f:
     model = pickle.load(f)
 
 # load SPY data
-df = pd.read_csv('backend/data/SPY_raw.csv')
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.set_index('Date')
+df = load_market('SPY')
 
-# engineer features
-df_features = engineer_features(df)
+# engineer features for the last 10 days only. FEATURE_PROFILE=cprofile or sample profiles it
+with profiled('test_model_predictions', len(df)):
+    df_features = engineer_features(df, tail=10)
 feature_cols = get_feature_columns()
 
+# the feature store has to give the same rows, only new days are computed there
+stored = load_features(df).iloc[-10:]
+assert stored.index.equals(df_features.index)
+assert np.allclose(stored[feature_cols].values, df_features[feature_cols].values, rtol=1e-9, atol=1e-9, equal_nan=True)
+
 # test predictions on last 10 days
 print("Testing model predictions on last 10 days:\n")
 for i in range(-10, 0):
@@ -37,4 +45,4 @@ for i in range(-10, 0):
     print(f"{row.name.date()}: {pred_text:8} confidence: {level:4} ({conf:.1%})")
 
 print(f"\nModel has {len(feature_cols)} features")
-print(f"Dataset has {len(df_features)} days of history")
+print(f"Dataset has {len(df)} days of history")